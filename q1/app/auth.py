@@ -1,9 +1,12 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from app.config import settings
 from app.schemas import TokenData
+from app.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -24,15 +27,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
+def token_claims(user) -> dict:
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value,
+        "active": user.is_active,
+        "ver": user.token_version or 0
+    }
+
+# Clients send the same access token with every request until it expires, so
+# its decoded claims are kept by digest rather than checking the signature
+# again each time. Entries never outlive the token's exp.
+decoded_tokens = TTLCache(settings.access_token_expire_minutes * 60, maxsize=settings.token_cache_size, lru=True)
+
 def verify_token(token: str, credentials_exception) -> TokenData:
+    digest = hashlib.sha256(token.encode()).digest()
+    token_data = decoded_tokens.get(digest)
+    if token_data is not None:
+        return token_data
+    
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
+        username = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(
+            username=username,
+            user_id=payload.get("uid"),
+            role=payload.get("role"),
+            is_active=payload.get("active"),
+            token_version=payload.get("ver")
+        )
     except JWTError:
         raise credentials_exception
+    
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        decoded_tokens.set(digest, token_data, ttl_seconds=expires_in)
     return token_data
 
 def create_token_response(user, access_token: str) -> dict:
@@ -6,6 +6,11 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     bcrypt_rounds: int = 12
+    password_hash_workers: int = 2  # bcrypt thread pool size; 0 hashes inline
+    password_hash_max_queue: int = 64  # logins waiting beyond this get 503
+    user_cache_ttl: int = 60  # seconds an authenticated user is served from the cache
+    user_cache_size: int = 10000
+    token_cache_size: int = 10000  # verified access tokens kept decoded until they expire; 0 disables
     
     class Config:
         env_file = ".env"
@@ -1,9 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import create_tables
 from app.routers import auth, users
+from app.user_cache import user_cache
+from app.auth import decoded_tokens
+from app.passwords import password_pool
+from app.workers import worker_pools
 
-Base.metadata.create_all(bind=engine)
+create_tables()
 
 app = FastAPI(
     title="Secure Authentication API",
@@ -22,6 +26,25 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 
+@app.on_event("startup")
+async def start_worker_pools():
+    for pool in worker_pools:
+        pool.start()
+
+@app.on_event("shutdown")
+async def stop_worker_pools():
+    for pool in worker_pools:
+        pool.shutdown()
+
 @app.get("/")
 async def root():
-    return {"message": "Secure Authentication API", "version": "1.0.0"} 
\ No newline at end of file
+    return {"message": "Secure Authentication API", "version": "1.0.0"}
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "healthy",
+        "password_hashing": password_pool.stats() if password_pool else None,
+        "user_cache": user_cache.stats(),
+        "token_cache": decoded_tokens.stats()
+    } 
\ No newline at end of file
@@ -4,7 +4,8 @@ from datetime import timedelta
 from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserLogin, TokenResponse, UserResponse
-from app.auth import get_password_hash, verify_password, create_access_token, create_token_response
+from app.auth import create_access_token, create_token_response, token_claims
+from app.passwords import hash_password, check_password
 from app.dependencies import get_current_active_user
 from app.config import settings
 
@@ -24,7 +25,9 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -36,7 +39,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": db_user.username, "role": db_user.role.value},
+        data=token_claims(db_user),
         expires_delta=access_token_expires
     )
     
@@ -45,8 +48,10 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 @router.post("/login", response_model=TokenResponse)
 async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == user_credentials.username).first()
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user or not await check_password(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -61,7 +66,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role.value},
+        data=token_claims(user),
         expires_delta=access_token_expires
     )
     
@@ -4,13 +4,13 @@ from typing import List
 from app.database import get_db
 from app.models import User, UserRole
 from app.schemas import UserResponse, RoleUpdate, UserUpdate
-from app.dependencies import require_admin, get_current_active_user
+from app.dependencies import Principal, require_admin, get_current_active_user
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserResponse])
 async def get_all_users(
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100
@@ -21,7 +21,7 @@ async def get_all_users(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -36,7 +36,7 @@ async def get_user(
 async def update_user_role(
     user_id: int,
     role_update: RoleUpdate,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -61,7 +61,7 @@ async def update_user_role(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -91,7 +91,7 @@ async def update_user(
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -60,6 +60,10 @@ class TokenResponse(BaseModel):
 # Token Data Schema
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    token_version: Optional[int] = None
 
 # Role Update Schema
 class RoleUpdate(BaseModel):
@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
@@ -16,4 +19,31 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def create_tables():
+    Base.metadata.create_all(bind=engine)
+    upgrade_tables(Base.metadata)
+
+def upgrade_tables(metadata):
+    """Add columns and indexes that ``create_all`` skips on tables that already exist.
+
+    Only nullable columns, or ones with a constant default, can be added this
+    way; foreign keys on added columns are not enforced.
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                connection.execute(text(ddl))
+                logger.warning("Added missing column %s.%s", table.name, column.name)
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
\ No newline at end of file
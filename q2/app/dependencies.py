@@ -1,29 +1,54 @@
+from typing import NamedTuple
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User, UserRole
 from app.auth import verify_token
+from app.user_cache import current_token_version, get_user_by_username
 from app.security import get_client_ip
 
 security = HTTPBearer()
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+class Principal(NamedTuple):
+    """The authenticated caller, as stated by a verified access token."""
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
     token = credentials.credentials
-    token_data = verify_token(token, credentials_exception)
+    token_data = verify_token(token, _credentials_exception())
+    
+    if token_data.token_version is None:
+        # Issued before tokens carried claims; expires within access_token_expire_minutes
+        user = get_user_by_username(db, token_data.username)
+        if user is None:
+            raise _credentials_exception()
+        return Principal(user.id, user.username, user.role, user.is_active)
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    if current_token_version(db, token_data.user_id, token_data.username) != token_data.token_version:
+        raise _credentials_exception()
+    return Principal(token_data.user_id, token_data.username, UserRole(token_data.role), token_data.is_active)
+
+def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    user = get_user_by_username(db, principal.username)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -34,7 +59,12 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
         )
     return current_user
 
-def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
+def require_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    if not current_user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
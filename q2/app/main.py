@@ -8,9 +8,10 @@ from slowapi.errors import RateLimitExceeded
 from datetime import datetime
 import time
 
-from app.database import engine, Base
+from app.database import create_tables
 from app.routers import auth, users, health
 from app.config import settings
+from app.workers import worker_pools
 from app.exceptions import (
     http_exception_handler,
     validation_exception_handler,
@@ -20,7 +21,7 @@ from app.exceptions import (
     RateLimitException
 )
 
-Base.metadata.create_all(bind=engine)
+create_tables()
 
 limiter = Limiter(key_func=get_remote_address)
 
@@ -81,6 +82,16 @@ app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(health.router, prefix="", tags=["Health"])
 
+@app.on_event("startup")
+async def start_worker_pools():
+    for pool in worker_pools:
+        pool.start()
+
+@app.on_event("shutdown")
+async def stop_worker_pools():
+    for pool in worker_pools:
+        pool.shutdown()
+
 @app.get("/")
 async def root():
     return {
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text
+from sqlalchemy import event, inspect, Column, Integer, String, Boolean, DateTime, Enum, Text
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -16,12 +16,23 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.USER, nullable=False)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, default=0)  # bumped to revoke every token issued so far
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     def __repr__(self):
         return f"<User(username='{self.username}', email='{self.email}', role='{self.role.value}')>"
 
+# Changes that revoke every token issued before them
+_REVOKING_FIELDS = ("role", "is_active", "hashed_password")
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _REVOKING_FIELDS):
+        # Incremented by the UPDATE itself, since a cached user's token_version may be stale
+        target.token_version = func.coalesce(User.token_version, 0) + 1
+
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
     
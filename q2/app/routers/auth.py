@@ -8,7 +8,7 @@ from app.schemas import (
     RefreshTokenRequest, PasswordResetRequest, PasswordResetConfirm, MessageResponse
 )
 from app.auth import (
-    get_password_hash, verify_password, create_access_token, create_token_response,
+    create_access_token, create_token_response, token_claims,
     create_refresh_token, store_refresh_token, verify_refresh_token, 
     revoke_refresh_token, revoke_all_user_tokens, create_password_reset_token,
     verify_password_reset_token, use_password_reset_token
@@ -20,6 +20,7 @@ from app.rate_limiting import (
     password_reset_rate_limit, check_rate_limit
 )
 from app.security import sanitize_string
+from app.passwords import hash_password, check_password
 
 router = APIRouter()
 
@@ -46,7 +47,9 @@ async def register(
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -58,7 +61,7 @@ async def register(
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": db_user.username, "role": db_user.role.value},
+        data=token_claims(db_user),
         expires_delta=access_token_expires
     )
     
@@ -78,8 +81,10 @@ async def login(
     user_credentials.username = sanitize_string(user_credentials.username)
     
     user = db.query(User).filter(User.username == user_credentials.username).first()
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user or not await check_password(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -94,7 +99,7 @@ async def login(
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role.value},
+        data=token_claims(user),
         expires_delta=access_token_expires
     )
     
@@ -132,7 +137,7 @@ async def refresh_token(
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role.value},
+        data=token_claims(user),
         expires_delta=access_token_expires
     )
     
@@ -199,7 +204,7 @@ async def reset_password(
             detail="Invalid or expired password reset token"
         )
     
-    hashed_password = get_password_hash(reset_confirm.new_password)
+    hashed_password = await hash_password(reset_confirm.new_password)
     user.hashed_password = hashed_password
     
     use_password_reset_token(db, reset_confirm.token)
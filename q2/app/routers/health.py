@@ -4,6 +4,9 @@ from datetime import datetime
 from app.database import get_db
 from app.schemas import HealthCheckResponse
 from app.rate_limiting import get_redis_client
+from app.user_cache import user_cache
+from app.auth import decoded_tokens
+from app.passwords import password_pool
 import sqlalchemy
 
 router = APIRouter()
@@ -37,7 +40,10 @@ async def health_check(db: Session = Depends(get_db)):
         timestamp=datetime.utcnow(),
         version="2.0.0",
         database=database_status,
-        redis=redis_status
+        redis=redis_status,
+        password_hashing=password_pool.stats() if password_pool else None,
+        user_cache=user_cache.stats(),
+        token_cache=decoded_tokens.stats()
     )
     
     if overall_status == "unhealthy":
@@ -4,7 +4,7 @@ from typing import List
 from app.database import get_db
 from app.models import User, UserRole
 from app.schemas import UserResponse, RoleUpdate, UserUpdate
-from app.dependencies import require_admin, get_current_active_user, security_middleware
+from app.dependencies import Principal, require_admin, get_current_active_user, security_middleware
 from app.security import sanitize_string
 
 router = APIRouter()
@@ -12,7 +12,7 @@ router = APIRouter()
 @router.get("/", response_model=List[UserResponse])
 async def get_all_users(
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     security: object = Depends(security_middleware),
     skip: int = 0,
@@ -28,7 +28,7 @@ async def get_all_users(
 async def get_user(
     user_id: int,
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     security: object = Depends(security_middleware)
 ):
@@ -45,7 +45,7 @@ async def update_user_role(
     user_id: int,
     role_update: RoleUpdate,
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     security: object = Depends(security_middleware)
 ):
@@ -72,7 +72,7 @@ async def update_user(
     user_id: int,
     user_update: UserUpdate,
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     security: object = Depends(security_middleware)
 ):
@@ -106,7 +106,7 @@ async def update_user(
 async def delete_user(
     user_id: int,
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
     security: object = Depends(security_middleware)
 ):
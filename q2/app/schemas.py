@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime
 from app.models import UserRole
 import re
@@ -56,6 +56,10 @@ class TokenResponse(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    token_version: Optional[int] = None
 
 class RoleUpdate(BaseModel):
     role: UserRole
@@ -94,6 +98,9 @@ class HealthCheckResponse(BaseModel):
     version: str
     database: str
     redis: str
+    password_hashing: Optional[Dict[str, Any]] = None
+    user_cache: Optional[Dict[str, Any]] = None
+    token_cache: Optional[Dict[str, Any]] = None
 
 class MessageResponse(BaseModel):
     message: str 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+from sqlalchemy import DateTime, Enum, event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.cache import TTLCache
+from app.config import settings
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# Every authenticated request resolves its user. The user's columns are cached
+# by username, and a hit is rebuilt into a User attached to the request's
+# session without a SELECT, so routes can still modify current_user and commit.
+# Any change to a user committed by this process drops its entry; changes made by
+# other processes show up after user_cache_ttl, or at once with
+# USER_CACHE_BACKEND=redis, where every process shares the cache.
+
+# Left out of the cache; loaded on access by the few routes that need it
+_UNCACHED_COLUMNS = {"hashed_password"}
+_CACHED_COLUMNS = [column for column in User.__table__.columns if column.key not in _UNCACHED_COLUMNS]
+
+def _encode(values: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = dict(values)
+    for column in _CACHED_COLUMNS:
+        value = encoded.get(column.key)
+        if value is None:
+            continue
+        if isinstance(column.type, DateTime):
+            encoded[column.key] = value.isoformat()
+        elif isinstance(column.type, Enum):
+            encoded[column.key] = value.value
+    return encoded
+
+def _decode(encoded: Dict[str, Any]) -> Dict[str, Any]:
+    values = dict(encoded)
+    for column in _CACHED_COLUMNS:
+        value = values.get(column.key)
+        if value is None:
+            continue
+        if isinstance(column.type, DateTime):
+            values[column.key] = datetime.fromisoformat(value)
+        elif isinstance(column.type, Enum):
+            values[column.key] = column.type.enum_class(value)
+    return values
+
+class RedisUserCache:
+    """User cache shared by every app process through Redis; same interface as ``TTLCache``.
+
+    Redis errors count as misses, so an unavailable Redis costs a database
+    query per request rather than failing it.
+    """
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("USER_CACHE_BACKEND=redis needs the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return f"user_cache:{key}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception:
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return _decode(json.loads(raw))
+
+    def set(self, key: Hashable, value: Any) -> None:
+        try:
+            self.client.set(self._key(key), json.dumps(_encode(value)), ex=self.ttl_seconds)
+        except Exception:
+            self.errors += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            self.client.delete(self._key(key))
+        except Exception:
+            self.errors += 1
+            logger.warning("Could not invalidate cached user %s", key, exc_info=True)
+        return default
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+user_cache = (
+    RedisUserCache(settings.redis_url, settings.user_cache_ttl)
+    if settings.user_cache_backend == "redis"
+    else TTLCache(settings.user_cache_ttl, maxsize=settings.user_cache_size)
+)
+
+# Bumped on every invalidation, so a lookup that raced with a change does not cache the old row
+_generation = 0
+
+def _attach(db: Session, values: Dict[str, Any]) -> User:
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    """The user named ``username``, from the cache when possible, attached to ``db``."""
+    values = user_cache.get(username)
+    if values is not None:
+        return _attach(db, values)
+    return _load_user(db, username)
+
+def _load_user(db: Session, username: str) -> Optional[User]:
+    generation = _generation
+    user = db.query(User).filter(User.username == username).first()
+    if user is not None and generation == _generation:
+        user_cache.set(username, {column.key: getattr(user, column.key) for column in _CACHED_COLUMNS})
+    return user
+
+def current_token_version(db: Session, user_id: int, username: str) -> Optional[int]:
+    """User ``user_id``'s token_version from the cached user, or None if the user is gone."""
+    values = user_cache.get(username)
+    if values is None:
+        user = _load_user(db, username)
+        values = {"id": user.id, "token_version": user.token_version} if user is not None else None
+    if values is None or values["id"] != user_id:
+        return None
+    return values["token_version"] or 0
+
+def invalidate_user(*usernames: Optional[str]) -> None:
+    global _generation
+    _generation += 1
+    for username in usernames:
+        if username:
+            user_cache.pop(username)
+
+# Users changed in a session are dropped from the cache when it commits, not
+# at flush: until then other sessions still read, and could re-cache, the old row.
+_CHANGED_USERNAMES = "user_cache_changed_usernames"
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    state = inspect(target)
+    if state.session is None:
+        return
+    # A renamed user is cached under its old name
+    changed = state.session.info.setdefault(_CHANGED_USERNAMES, set())
+    changed.add(state.dict.get("username"))
+    changed.update(state.attrs.username.history.deleted)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    changed = session.info.pop(_CHANGED_USERNAMES, None)
+    if changed:
+        invalidate_user(*changed)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_users(session):
+    session.info.pop(_CHANGED_USERNAMES, None)
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Sequence
+
+# CPU-heavy work (image decoding, OCR) runs in process pools so it never holds
+# the event loop or the GIL. Pools are started with the application, before
+# request handling spins up other threads, so workers fork from a quiet process.
+# Functions sent to a pool must be importable module-level callables. Work
+# that releases the GIL, like bcrypt, can use threads instead (threads=True).
+
+def _noop() -> None:
+    return None
+
+def _percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """p50/p99/max of durations in seconds, as milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "p50": round(ordered[len(ordered) // 2] * 1000, 1),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1)
+    }
+
+class WorkerPoolBusy(Exception):
+    """Raised by ``WorkerPool.run`` when its wait queue is full."""
+
+class WorkerPool:
+    """A named process (or thread) pool that callers await with bounded concurrency.
+
+    ``run`` admits at most ``max_workers`` jobs at a time; callers beyond
+    that wait in the event loop rather than queueing inside the pool, and
+    with ``max_queue`` set, callers beyond that many waiting are turned away
+    with ``WorkerPoolBusy``. A pool whose worker died is replaced on next use.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: Optional[int] = None, threads: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.threads = threads
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        # Metrics for jobs awaited through run()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._timings = deque(maxlen=1000)  # (queue wait, run time) of recent jobs, seconds
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.threads:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                    else:
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _discard(self, executor: Executor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """Start the worker processes now rather than on first use."""
+        self._get_executor().submit(_noop).result()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Submit ``fn(*args)`` without a concurrency limit, for callers on worker threads."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+            return self._get_executor().submit(fn, *args)
+
+    async def run(self, fn: Callable, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self.max_queue is not None and self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise WorkerPoolBusy(self.name)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.running += 1
+        try:
+            executor = self._get_executor()
+            try:
+                result = await asyncio.wrap_future(self.submit(fn, *args))
+            except BrokenProcessPool:
+                self._discard(executor)
+                raise
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+        self.completed += 1
+        self._timings.append((started_at - queued_at, time.perf_counter() - started_at))
+        return result
+
+    def stats(self) -> Dict:
+        """Queue depth, job counts and recent wait/run latency, for health checks."""
+        timings = list(self._timings)
+        return {
+            "workers": self.max_workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_ms": _percentiles([wait for wait, _ in timings]),
+            "run_ms": _percentiles([run for _, run in timings])
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Pools started on application startup and shut down on exit
+worker_pools: List[WorkerPool] = []
+
+def register_worker_pool(
+    name: str,
+    max_workers: int,
+    max_queue: Optional[int] = None,
+    threads: bool = False
+) -> WorkerPool:
+    pool = WorkerPool(name, max_workers, max_queue, threads)
+    worker_pools.append(pool)
+    return pool
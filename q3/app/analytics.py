@@ -0,0 +1,350 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, event, func, inspect, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import (
+    ArchivedOrder, ArchivedOrderItem, Category, CategoryRollup, Medicine,
+    Order, OrderItem, OrderRollup, OrderStatus
+)
+
+GRANULARITIES = ("hour", "day")
+_BUCKET_STEP = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Order columns whose change moves an order between rollup rows
+_TRACKED_ORDER_COLUMNS = ("status", "is_emergency", "total_amount")
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour or day containing ``moment``."""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def iter_buckets(start: datetime, end: datetime, granularity: str):
+    """Bucket starts covering ``[start, end)``."""
+    current = bucket_start(start, granularity)
+    step = _BUCKET_STEP[granularity]
+    while current < end:
+        yield current
+        current += step
+
+def to_naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _bump(connection, model, key: dict, deltas: dict) -> None:
+    """Atomically add ``deltas`` to the rollup row identified by ``key``, creating it if needed."""
+    table = model.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        insert_for_dialect = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        statement = insert_for_dialect(table).values(**key, **deltas)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + statement.excluded[column] for column in deltas}
+        )
+        connection.execute(statement)
+        return
+
+    result = connection.execute(
+        update(table)
+        .where(*[table.c[column] == value for column, value in key.items()])
+        .values(**{column: table.c[column] + delta for column, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**key, **deltas))
+
+def _bump_order(connection, created_at: datetime, status: OrderStatus, is_emergency: bool, sign: int, revenue: float) -> None:
+    for granularity in GRANULARITIES:
+        _bump(connection, OrderRollup, {
+            "granularity": granularity,
+            "bucket_start": bucket_start(created_at, granularity),
+            "status": status,
+            "is_emergency": bool(is_emergency)
+        }, {"order_count": sign, "revenue": sign * (revenue or 0.0)})
+
+def _bump_category(
+    connection,
+    created_at: datetime,
+    status: OrderStatus,
+    is_emergency: bool,
+    category_id: Optional[int],
+    sign: int,
+    quantity: int,
+    price: float
+) -> None:
+    for granularity in GRANULARITIES:
+        _bump(connection, CategoryRollup, {
+            "granularity": granularity,
+            "bucket_start": bucket_start(created_at, granularity),
+            "category_id": category_id or 0,
+            "status": status,
+            "is_emergency": bool(is_emergency)
+        }, {"item_count": sign * (quantity or 0), "revenue": sign * (quantity or 0) * (price or 0.0)})
+
+def _previous_value(state, attribute: str):
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[attribute].value
+
+def _order_created_at(connection, state, order_id: int) -> datetime:
+    created_at = state.dict.get("created_at")
+    if created_at is None:
+        created_at = connection.execute(
+            select(Order.created_at).where(Order.id == order_id)
+        ).scalar()
+    return created_at or datetime.utcnow()
+
+@event.listens_for(Order.status, "set", active_history=True)
+@event.listens_for(Order.is_emergency, "set", active_history=True)
+@event.listens_for(Order.total_amount, "set", active_history=True)
+def _load_previous_value(target, value, oldvalue, initiator):
+    # active_history loads the old value on assignment so after_update can move the order
+    pass
+
+@event.listens_for(Order, "after_insert")
+def _order_inserted(mapper, connection, target):
+    _bump_order(
+        connection,
+        target.created_at or datetime.utcnow(),
+        target.status or OrderStatus.PENDING,
+        target.is_emergency,
+        1,
+        target.total_amount
+    )
+
+@event.listens_for(Order, "after_update")
+def _order_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[column].history.has_changes() for column in _TRACKED_ORDER_COLUMNS):
+        return
+
+    created_at = _order_created_at(connection, state, target.id)
+    old_status = _previous_value(state, "status")
+    old_is_emergency = _previous_value(state, "is_emergency")
+
+    _bump_order(connection, created_at, old_status, old_is_emergency, -1, _previous_value(state, "total_amount"))
+    _bump_order(connection, created_at, target.status, target.is_emergency, 1, target.total_amount)
+
+    if old_status == target.status and bool(old_is_emergency) == bool(target.is_emergency):
+        return
+
+    items = connection.execute(
+        select(OrderItem.quantity, OrderItem.price, Medicine.category_id)
+        .outerjoin(Medicine, OrderItem.medicine_id == Medicine.id)
+        .where(OrderItem.order_id == target.id)
+    ).all()
+    for quantity, price, category_id in items:
+        _bump_category(connection, created_at, old_status, old_is_emergency, category_id, -1, quantity, price)
+        _bump_category(connection, created_at, target.status, target.is_emergency, category_id, 1, quantity, price)
+
+@event.listens_for(OrderItem, "after_insert")
+def _order_item_inserted(mapper, connection, target):
+    order = connection.execute(
+        select(Order.created_at, Order.status, Order.is_emergency).where(Order.id == target.order_id)
+    ).first()
+    if order is None:
+        return
+    category_id = connection.execute(
+        select(Medicine.category_id).where(Medicine.id == target.medicine_id)
+    ).scalar()
+    _bump_category(
+        connection,
+        order.created_at or datetime.utcnow(),
+        order.status or OrderStatus.PENDING,
+        order.is_emergency,
+        category_id,
+        1,
+        target.quantity,
+        target.price
+    )
+
+def rebuild_rollups(db: Session) -> Dict[str, int]:
+    """Recompute every rollup row from the hot and archived order tables.
+
+    Only needed to backfill existing history or repair drift; the rollups are
+    otherwise maintained incrementally as orders are written.
+    """
+    order_totals: Dict[Tuple, List] = defaultdict(lambda: [0, 0.0])
+    category_totals: Dict[Tuple, List] = defaultdict(lambda: [0, 0.0])
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders = db.query(
+            order_model.created_at, order_model.status, order_model.is_emergency, order_model.total_amount
+        ).yield_per(1000)
+        for created_at, status, is_emergency, total_amount in orders:
+            created_at = created_at or datetime.utcnow()
+            for granularity in GRANULARITIES:
+                totals = order_totals[(granularity, bucket_start(created_at, granularity), status, bool(is_emergency))]
+                totals[0] += 1
+                totals[1] += total_amount or 0.0
+
+        items = db.query(
+            order_model.created_at, order_model.status, order_model.is_emergency,
+            Medicine.category_id, item_model.quantity, item_model.price
+        ).join(order_model, item_model.order_id == order_model.id).outerjoin(
+            Medicine, item_model.medicine_id == Medicine.id
+        ).yield_per(1000)
+        for created_at, status, is_emergency, category_id, quantity, price in items:
+            created_at = created_at or datetime.utcnow()
+            for granularity in GRANULARITIES:
+                totals = category_totals[(
+                    granularity, bucket_start(created_at, granularity), category_id or 0, status, bool(is_emergency)
+                )]
+                totals[0] += quantity or 0
+                totals[1] += (quantity or 0) * (price or 0.0)
+
+    db.query(OrderRollup).delete()
+    db.query(CategoryRollup).delete()
+    if order_totals:
+        db.execute(insert(OrderRollup), [
+            {
+                "granularity": granularity, "bucket_start": start, "status": status,
+                "is_emergency": is_emergency, "order_count": count, "revenue": revenue
+            }
+            for (granularity, start, status, is_emergency), (count, revenue) in order_totals.items()
+        ])
+    if category_totals:
+        db.execute(insert(CategoryRollup), [
+            {
+                "granularity": granularity, "bucket_start": start, "category_id": category_id,
+                "status": status, "is_emergency": is_emergency, "item_count": count, "revenue": revenue
+            }
+            for (granularity, start, category_id, status, is_emergency), (count, revenue) in category_totals.items()
+        ])
+    db.commit()
+
+    return {"order_rollups": len(order_totals), "category_rollups": len(category_totals)}
+
+def _rollup_filters(model, granularity, start, end, status, is_emergency) -> list:
+    filters = [
+        model.granularity == granularity,
+        model.bucket_start >= bucket_start(start, granularity),
+        model.bucket_start < end
+    ]
+    if status is not None:
+        filters.append(model.status == status)
+    if is_emergency is not None:
+        filters.append(model.is_emergency == is_emergency)
+    return filters
+
+def _booked_revenue(model, status: Optional[OrderStatus]):
+    """Summed revenue, leaving out cancelled orders unless they were asked for by status."""
+    if status is not None:
+        return func.sum(model.revenue)
+    return func.sum(case((model.status == OrderStatus.CANCELLED, 0.0), else_=model.revenue))
+
+def order_analytics(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    status: Optional[OrderStatus] = None,
+    is_emergency: Optional[bool] = None
+) -> dict:
+    """Order counts and revenue per bucket and per status, read from ``order_rollups``.
+
+    Bucket and total revenue leave out cancelled orders, which are reported
+    separately, unless ``status`` selects them.
+    """
+    filters = _rollup_filters(OrderRollup, granularity, start, end, status, is_emergency)
+
+    per_bucket = {
+        bucket: (count, revenue)
+        for bucket, count, revenue in db.query(
+            OrderRollup.bucket_start,
+            func.sum(OrderRollup.order_count),
+            _booked_revenue(OrderRollup, status)
+        ).filter(*filters).group_by(OrderRollup.bucket_start)
+    }
+
+    by_status = []
+    emergency_orders = 0
+    emergency_revenue = 0.0
+    for row_status, row_is_emergency, count, revenue in db.query(
+        OrderRollup.status,
+        OrderRollup.is_emergency,
+        func.sum(OrderRollup.order_count),
+        func.sum(OrderRollup.revenue)
+    ).filter(*filters).group_by(OrderRollup.status, OrderRollup.is_emergency):
+        by_status.append((row_status, count, revenue))
+        if row_is_emergency:
+            emergency_orders += count
+            if status is not None or row_status != OrderStatus.CANCELLED:
+                emergency_revenue += revenue
+
+    status_totals: Dict[OrderStatus, List] = defaultdict(lambda: [0, 0.0])
+    for row_status, count, revenue in by_status:
+        status_totals[row_status][0] += count
+        status_totals[row_status][1] += revenue
+
+    series = []
+    for bucket in iter_buckets(start, end, granularity):
+        count, revenue = per_bucket.get(bucket, (0, 0.0))
+        series.append({"bucket_start": bucket, "order_count": count, "revenue": round(revenue, 2)})
+
+    return {
+        "granularity": granularity,
+        "start": bucket_start(start, granularity),
+        "end": end,
+        "total_orders": sum(point["order_count"] for point in series),
+        "total_revenue": round(sum(revenue for _, revenue in per_bucket.values()), 2),
+        "emergency_orders": emergency_orders,
+        "emergency_revenue": round(emergency_revenue, 2),
+        "cancelled_orders": status_totals[OrderStatus.CANCELLED][0],
+        "cancelled_revenue": round(status_totals[OrderStatus.CANCELLED][1], 2),
+        "series": series,
+        "by_status": [
+            {"status": row_status.value, "order_count": count, "revenue": round(revenue, 2)}
+            for row_status, (count, revenue) in status_totals.items()
+            if count
+        ]
+    }
+
+def category_analytics(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    status: Optional[OrderStatus] = None,
+    is_emergency: Optional[bool] = None
+) -> dict:
+    """Units sold and item revenue per category, read from ``category_rollups``.
+
+    Cancelled orders are left out unless ``status`` selects them.
+    """
+    filters = _rollup_filters(CategoryRollup, granularity, start, end, status, is_emergency)
+    if status is None:
+        filters.append(CategoryRollup.status != OrderStatus.CANCELLED)
+    
+    rows = db.query(
+        CategoryRollup.category_id,
+        Category.name,
+        func.sum(CategoryRollup.item_count),
+        func.sum(CategoryRollup.revenue)
+    ).outerjoin(
+        Category, CategoryRollup.category_id == Category.id
+    ).filter(*filters).group_by(CategoryRollup.category_id, Category.name).all()
+
+    categories = [
+        {
+            "category_id": category_id or None,
+            "category_name": name or "Uncategorised",
+            "item_count": count,
+            "revenue": round(revenue, 2)
+        }
+        for category_id, name, count, revenue in rows
+        if count
+    ]
+    categories.sort(key=lambda category: category["revenue"], reverse=True)
+
+    return {
+        "granularity": granularity,
+        "start": bucket_start(start, granularity),
+        "end": end,
+        "categories": categories
+    }
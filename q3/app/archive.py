@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.background import register_periodic_task
+from app.config import settings
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus
+
+ARCHIVABLE_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+AnyOrder = Union[Order, ArchivedOrder]
+
+def _shared_columns(source, target) -> List[str]:
+    """Columns of ``target`` that ``source`` also has, so hot-only columns are not copied."""
+    return [column.name for column in target.columns if column.name in source.c]
+
+def archive_order_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Move one batch of finished orders last updated before ``cutoff`` into the archive tables.
+
+    Orders and their items are copied and deleted in a single transaction.
+    """
+    orders = Order.__table__
+    items = OrderItem.__table__
+    archived_orders = ArchivedOrder.__table__
+    archived_items = ArchivedOrderItem.__table__
+
+    # SQLite reuses the highest rowid once it is deleted; keeping the newest
+    # order hot guarantees archived ids are never handed out again.
+    newest_id = db.query(func.max(Order.id)).scalar()
+
+    order_ids = [
+        order_id for order_id, in db.query(Order.id).filter(
+            Order.status.in_(ARCHIVABLE_STATUSES),
+            Order.updated_at < cutoff,
+            Order.id != newest_id
+        ).order_by(Order.id).limit(batch_size).with_for_update(skip_locked=True)
+    ]
+    if not order_ids:
+        db.rollback()
+        return 0
+
+    order_columns = _shared_columns(orders, archived_orders)
+    item_columns = _shared_columns(items, archived_items)
+    try:
+        db.execute(insert(archived_orders).from_select(
+            order_columns + ["archived_at"],
+            select(
+                *[orders.c[name] for name in order_columns],
+                literal(datetime.utcnow(), DateTime)
+            ).where(orders.c.id.in_(order_ids))
+        ))
+        db.execute(insert(archived_items).from_select(
+            item_columns,
+            select(*[items.c[name] for name in item_columns]).where(items.c.order_id.in_(order_ids))
+        ))
+        db.execute(delete(items).where(items.c.order_id.in_(order_ids)))
+        db.execute(delete(orders).where(orders.c.id.in_(order_ids)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(order_ids)
+
+def archive_orders(db: Session) -> int:
+    """Archive finished orders older than ``order_archive_after_days``, batch by batch."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.order_archive_after_days)
+    total = 0
+    for _ in range(settings.order_archive_max_batches):
+        archived = archive_order_batch(db, cutoff, settings.order_archive_batch_size)
+        total += archived
+        if archived < settings.order_archive_batch_size:
+            break
+    return total
+
+def find_order(db: Session, order_id: int) -> Optional[AnyOrder]:
+    """Look an order up in ``orders``, falling back to the archive."""
+    order = db.query(Order).filter(Order.id == order_id).first()
+    if order is None:
+        order = db.query(ArchivedOrder).filter(ArchivedOrder.id == order_id).first()
+    return order
+
+def find_order_by_tracking_number(db: Session, tracking_number: str) -> Optional[AnyOrder]:
+    order = db.query(Order).filter(Order.tracking_number == tracking_number).first()
+    if order is None:
+        order = db.query(ArchivedOrder).filter(ArchivedOrder.tracking_number == tracking_number).first()
+    return order
+
+def load_order_items(db: Session, order: AnyOrder) -> list:
+    """Items of a hot or archived order, with their medicines loaded."""
+    item_model = ArchivedOrderItem if isinstance(order, ArchivedOrder) else OrderItem
+    return db.query(item_model).options(
+        joinedload(item_model.medicine)
+    ).filter(item_model.order_id == order.id).all()
+
+def user_order_history(db: Session, user_id: int) -> List[AnyOrder]:
+    """A user's hot and archived orders, newest first, with items and medicines loaded."""
+    orders = []
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders.extend(db.query(order_model).options(
+            selectinload(order_model.order_items).joinedload(item_model.medicine)
+        ).filter(order_model.user_id == user_id).all())
+    orders.sort(key=lambda order: order.created_at or datetime.min, reverse=True)
+    return orders
+
+register_periodic_task("order_archival", archive_orders, settings.order_archive_interval_seconds)
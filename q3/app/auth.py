@@ -1,9 +1,13 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from app.config import settings
 from app.schemas import TokenData
+from app.cache import TTLCache
+from app.ids import get_generator, format_order_number, format_tracking_number
 import secrets
 import string
 
@@ -29,16 +33,46 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
+def token_claims(user) -> dict:
+    """Claims that let requests be authorized without loading the user."""
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value,
+        "active": user.is_active,
+        "ver": user.token_version or 0
+    }
+
+# Clients send the same access token with every request until it expires, so
+# its decoded claims are kept by digest rather than checking the signature
+# again each time. Entries never outlive the token's exp.
+decoded_tokens = TTLCache(settings.access_token_expire_minutes * 60, maxsize=settings.token_cache_size, lru=True)
+
 def verify_token(token: str, credentials_exception) -> TokenData:
     """Verify JWT token and extract token data."""
+    digest = hashlib.sha256(token.encode()).digest()
+    token_data = decoded_tokens.get(digest)
+    if token_data is not None:
+        return token_data
+    
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(
+            username=username,
+            user_id=payload.get("uid"),
+            role=payload.get("role"),
+            is_active=payload.get("active"),
+            token_version=payload.get("ver")
+        )
     except JWTError:
         raise credentials_exception
+    
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        decoded_tokens.set(digest, token_data, ttl_seconds=expires_in)
     return token_data
 
 def create_token_response(user, access_token: str) -> dict:
@@ -63,6 +97,8 @@ def create_token_response(user, access_token: str) -> dict:
             "city": user.city,
             "state": user.state,
             "zip_code": user.zip_code,
+            "latitude": user.latitude,
+            "longitude": user.longitude,
             "created_at": user.created_at,
             "updated_at": user.updated_at
         }
@@ -73,18 +109,19 @@ def generate_phone_verification_code() -> str:
     return ''.join(secrets.choice(string.digits) for _ in range(6))
 
 def generate_order_number() -> str:
-    """Generate unique order number."""
-    prefix = "ORD"
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    random_suffix = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(4))
-    return f"{prefix}{timestamp}{random_suffix}"
+    """Generate unique order number (ORD + UTC timestamp + worker/sequence suffix)."""
+    generator = get_generator()
+    return format_order_number(generator.next_id(), generator)
 
 def generate_tracking_number() -> str:
-    """Generate unique tracking number."""
-    prefix = "TRK"
-    timestamp = datetime.now().strftime("%Y%m%d")
+    """Generate unique tracking number (TRK + UTC date + worker/sequence suffix + 8 random chars).
+
+    Tracking numbers work as bearer secrets on the public lookup, so the
+    random part keeps them from being enumerated from the date and sequence.
+    """
+    generator = get_generator()
     random_suffix = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-    return f"{prefix}{timestamp}{random_suffix}"
+    return format_tracking_number(generator.next_id(), generator) + random_suffix
 
 def calculate_delivery_fee(distance: float, is_emergency: bool = False) -> float:
     """Calculate delivery fee based on distance and emergency status."""
@@ -153,11 +190,3 @@ def sanitize_input(input_string: str) -> str:
     cleaned = re.sub(r'<[^>]+>', '', input_string)
     cleaned = re.sub(r'[<>"\';]', '', cleaned)
     return cleaned.strip()
-
-def is_emergency_medicine(medicine_name: str) -> bool:
-    """Check if medicine is available for emergency delivery."""
-    emergency_medicines = [
-        'insulin', 'epinephrine', 'albuterol', 'nitroglycerin', 
-        'aspirin', 'ibuprofen', 'paracetamol', 'acetaminophen'
-    ]
-    return any(med in medicine_name.lower() for med in emergency_medicines) 
\ No newline at end of file
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """Runs ``job(db)`` every ``interval_seconds`` in a worker thread with its own session.
+
+    With ``run_on_stop`` the job runs one last time on shutdown, for jobs
+    that flush in-memory state.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        job: Callable[[Session], object],
+        interval_seconds: float,
+        run_on_stop: bool = False
+    ):
+        self.name = name
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self.run_on_stop = run_on_stop
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> None:
+        db = SessionLocal()
+        try:
+            self.job(db)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Background job %s failed", self.name)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.run_on_stop:
+            await asyncio.to_thread(self.run_once)
+
+# Jobs started on application startup and stopped on shutdown
+periodic_tasks: List[PeriodicTask] = []
+
+def register_periodic_task(
+    name: str,
+    job: Callable[[Session], object],
+    interval_seconds: float,
+    run_on_stop: bool = False
+) -> PeriodicTask:
+    task = PeriodicTask(name, job, interval_seconds, run_on_stop)
+    periodic_tasks.append(task)
+    return task
@@ -15,13 +15,115 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
     
+    # Password hashing - bcrypt runs in a process pool; 0 workers hashes on the event loop
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 64  # logins waiting beyond this get 503
+    
     # File Upload
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    upload_dir: str = "uploads"
+    max_upload_overhead: int = 64 * 1024  # form fields and multipart framing around the file
+    upload_chunk_size: int = 64 * 1024
+    upload_dir: str = "uploads"  # local storage, staging and preview cache
+    # Upload storage - "local" (upload_dir) or "s3" (any S3-compatible service, needs boto3)
+    storage_backend: str = "local"
+    s3_bucket: Optional[str] = None
+    s3_prefix: str = ""
+    s3_endpoint_url: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    s3_region: Optional[str] = None
+    s3_part_size: int = 8 * 1024 * 1024  # multipart upload part size, at least 5MB
+    s3_url_ttl: int = 300  # seconds a download link stays valid
+    # Internal location mapped to upload_dir by the reverse proxy, e.g. "/protected-uploads/".
+    # When set, prescription files are served via X-Accel-Redirect instead of by the app.
+    upload_accel_redirect_prefix: Optional[str] = None
+    upload_cache_max_age: int = 3600  # seconds, private caches only
+    
+    # Image processing - previews are rendered in a process pool
+    image_workers: int = 2
+    preview_thumb_size: int = 256  # longest side, pixels
+    preview_review_size: int = 1600
+    preview_quality: int = 80
+    preview_max_pending: int = 32  # background jobs beyond this are left to on-demand generation
+    
+    # Upload normalization - photos are downscaled, stripped of EXIF and recompressed to JPEG
+    normalize_uploads: bool = False
+    normalize_max_dimension: int = 2400  # longest side, pixels
+    normalize_quality: int = 85
+    keep_original_uploads: bool = False
+    
+    # Prescription OCR - "stub" or "package.module:EngineClass"
+    extraction_engine: str = "stub"
+    extraction_workers: int = 1
+    extraction_batch_size: int = 4  # jobs claimed per dispatch round
+    extraction_interval_seconds: int = 5
+    extraction_lease_seconds: int = 300  # must exceed the slowest expected job
+    extraction_max_attempts: int = 3
+    max_extraction_batch: int = 200  # prescriptions per batch submission
+    
+    # Id generation - WORKER_ID (0-1023) must be distinct per process across hosts;
+    # leave it unset to lease a free id from the database instead
+    worker_id: Optional[int] = None
+    worker_id_lease_seconds: int = 300  # renewed after half of this
     
     # Delivery Settings
     default_delivery_time: int = 30  # minutes
     emergency_delivery_time: int = 10  # minutes
+    partner_index_cell_deg: float = 0.01  # ~1.1km grid cells
+    max_partner_results: int = 50
+    pharmacy_search_radius_km: float = 10.0
+    default_delivery_distance_km: float = 5.0  # used when the user has no stored location
+    delivery_service_radius_km: float = 15.0
+    delivery_quote_geohash_precision: int = 6  # ~1.2km x 0.6km cells
+    delivery_quote_cache_ttl: int = 300  # seconds
+    max_batch_quotes: int = 500
+    
+    # Route batching
+    route_batch_interval_seconds: int = 60
+    route_max_stops: int = 6
+    route_cluster_radius_km: float = 3.0
+    route_two_opt_passes: int = 10
+    
+    # GPS ingestion
+    gps_flush_interval_seconds: int = 5
+    max_location_pings: int = 1000
+    
+    # Pharmacist order queue
+    order_claim_lease_seconds: int = 300
+    max_queue_batch: int = 20
+    
+    # Prescription line matching - rebuilt on catalog changes, and at least this often
+    catalog_matcher_max_age: int = 300  # seconds
+    
+    # Pharmacist prescription verification queue
+    prescription_claim_lease_seconds: int = 600
+    max_prescription_queue_batch: int = 50
+    
+    # Authenticated user cache - per process, or shared by all processes through Redis
+    user_cache_ttl: int = 60  # seconds
+    user_cache_size: int = 10000
+    user_cache_redis_url: Optional[str] = None  # e.g. redis://localhost:6379/0, needs the redis package
+    
+    # Token revocation - current token versions are re-read from the database this often
+    token_version_ttl: int = 30  # seconds
+    token_version_cache_size: int = 100000
+    
+    # Verified access tokens, kept decoded until they expire; 0 disables
+    token_cache_size: int = 10000
+    
+    # Order tracking - per-process cache, also dropped whenever the order changes
+    tracking_cache_ttl: int = 15  # seconds
+    tracking_cache_size: int = 50000
+    tracking_lookup_rate_limit: int = 20  # public lookups by tracking number per client IP per minute
+    
+    # Order archival - finished orders move to the archive tables after this many days
+    order_archive_after_days: int = 90
+    order_archive_batch_size: int = 500
+    order_archive_max_batches: int = 20  # per run
+    order_archive_interval_seconds: int = 3600
+    
+    # Admin analytics
+    analytics_default_hours: int = 48  # range used for hourly queries without a start
+    analytics_default_days: int = 30  # range used for daily queries without a start
+    analytics_max_buckets: int = 2000
     
     # Pharmacy Settings
     pharmacy_name: str = "QuickMed Pharmacy"
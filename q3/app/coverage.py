@@ -0,0 +1,114 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from app.matching import catalog_matcher
+from app.models import CartItem, Prescription, PrescriptionMedicine, PrescriptionStatus
+
+# Which catalog medicines a verified prescription covers lives in
+# prescription_medicines, written at verification time, so cart and checkout
+# validation answer coverage with one indexed join instead of re-parsing and
+# re-matching the prescription's extracted text on every request.
+# Prescriptions verified before coverage was recorded have no
+# coverage_recorded_at and keep the old rule: verified covers any medicine.
+
+class Coverage(NamedTuple):
+    """What a user's prescription says about one medicine."""
+    prescription_status: Optional[PrescriptionStatus]  # None: no such prescription for this user
+    prescribed: bool
+    prescribed_quantity: Optional[int]  # None: no limit recorded
+
+    def problem(self, quantity: int) -> Optional[str]:
+        """Why the prescription does not cover ``quantity`` units, or None if it does."""
+        if self.prescription_status is None:
+            return "Prescription not found"
+        if self.prescription_status != PrescriptionStatus.VERIFIED:
+            return "Prescription not verified"
+        if not self.prescribed:
+            return "Medicine is not on this prescription"
+        if self.prescribed_quantity is not None and quantity > self.prescribed_quantity:
+            return f"Prescription covers only {self.prescribed_quantity} units"
+        return None
+
+def _coverage(status, recorded_at, medicine_id, quantity) -> Coverage:
+    if status == PrescriptionStatus.VERIFIED and recorded_at is None:
+        return Coverage(status, True, None)
+    return Coverage(status, medicine_id is not None, quantity)
+
+def prescription_coverage(db: Session, user_id: int, prescription_id: int, medicine_id: int) -> Coverage:
+    row = db.query(
+        Prescription.status, Prescription.coverage_recorded_at,
+        PrescriptionMedicine.medicine_id, PrescriptionMedicine.quantity
+    ).outerjoin(
+        PrescriptionMedicine,
+        and_(
+            PrescriptionMedicine.prescription_id == Prescription.id,
+            PrescriptionMedicine.medicine_id == medicine_id
+        )
+    ).filter(
+        Prescription.id == prescription_id,
+        Prescription.user_id == user_id
+    ).first()
+    return _coverage(*row) if row else Coverage(None, False, None)
+
+def cart_coverage(db: Session, user_id: int) -> Dict[int, Coverage]:
+    """Coverage of every item in the user's cart by its prescription, keyed by cart item id."""
+    rows = db.query(
+        CartItem.id, Prescription.status, Prescription.coverage_recorded_at,
+        PrescriptionMedicine.medicine_id, PrescriptionMedicine.quantity
+    ).outerjoin(
+        Prescription,
+        and_(Prescription.id == CartItem.prescription_id, Prescription.user_id == CartItem.user_id)
+    ).outerjoin(
+        PrescriptionMedicine,
+        and_(
+            PrescriptionMedicine.prescription_id == CartItem.prescription_id,
+            PrescriptionMedicine.medicine_id == CartItem.medicine_id
+        )
+    ).filter(CartItem.user_id == user_id)
+    return {cart_item_id: _coverage(*coverage) for cart_item_id, *coverage in rows}
+
+def matched_medicines(db: Session, extracted_medicines: Optional[str]) -> List[Tuple[int, Optional[int]]]:
+    """Catalog medicines named in a prescription's extracted lines, without quantities."""
+    try:
+        lines = json.loads(extracted_medicines) if extracted_medicines else []
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(lines, list):
+        return []
+    return [
+        (medicine.id, None)
+        for medicine, _ in catalog_matcher.resolve(db, [str(line) for line in lines])
+        if medicine is not None
+    ]
+
+def set_prescription_medicines(
+    db: Session,
+    prescription: Prescription,
+    medicines: Iterable[Tuple[int, Optional[int]]]
+) -> None:
+    """Replace the medicines a prescription covers with ``(medicine_id, quantity)`` pairs.
+
+    A medicine listed twice is covered for the sum of its quantities, or
+    without limit if either gives none. Marks the prescription's coverage as
+    recorded, so only the listed medicines are covered. Does not commit.
+    """
+    quantities: Dict[int, Optional[int]] = {}
+    for medicine_id, quantity in medicines:
+        if medicine_id in quantities:
+            previous = quantities[medicine_id]
+            quantity = None if previous is None or quantity is None else previous + quantity
+        quantities[medicine_id] = quantity
+
+    clear_prescription_medicines(db, prescription.id)
+    db.add_all(
+        PrescriptionMedicine(prescription_id=prescription.id, medicine_id=medicine_id, quantity=quantity)
+        for medicine_id, quantity in quantities.items()
+    )
+    prescription.coverage_recorded_at = datetime.utcnow()
+
+def clear_prescription_medicines(db: Session, prescription_id: int) -> None:
+    db.query(PrescriptionMedicine).filter(
+        PrescriptionMedicine.prescription_id == prescription_id
+    ).delete(synchronize_session=False)
@@ -0,0 +1,392 @@
+import re
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Collection, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, event, inspect, update
+from sqlalchemy.orm import Session
+from app.auth import calculate_delivery_fee, calculate_delivery_time
+from app.background import register_periodic_task
+from app.cache import TTLCache
+from app.config import settings
+from app.geo import GridIndex, bounding_box, geohash_center, geohash_encode, haversine_km
+from app.models import DeliveryPartner, Pharmacy
+
+# Available partners with a known position, keyed by DeliveryPartner.id
+partner_index = GridIndex(cell_size_deg=settings.partner_index_cell_deg)
+_partner_index_loaded = False
+_partner_index_lock = threading.Lock()
+
+# Every partner seen by this process: its index payload while available, else None.
+# GPS flushes bypass the ORM, so pings rely on this to index a partner's first position.
+_partner_payloads: Dict[int, Optional[dict]] = {}
+
+# Nearest serving pharmacy per geocell (None for unserviceable cells)
+_quote_cache = TTLCache(settings.delivery_quote_cache_ttl, maxsize=50000)
+_MISSING = object()
+
+class LocationBuffer:
+    """Coalesces GPS pings to the latest position per partner between database flushes."""
+
+    def __init__(self):
+        self._latest: Dict[int, Tuple[datetime, float, float]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def ingest(self, partner_id: int, pings: Iterable[Tuple[datetime, float, float]]) -> Optional[Tuple[datetime, float, float]]:
+        """Record ``(recorded_at, latitude, longitude)`` pings; returns the position if it moved."""
+        with self._lock:
+            current = self._latest.get(partner_id)
+            newest = current
+            for ping in pings:
+                if newest is None or ping[0] >= newest[0]:
+                    newest = ping
+            if newest is current:
+                return None
+            self._latest[partner_id] = newest
+            self._dirty.add(partner_id)
+            return newest
+
+    def get(self, partner_id: int) -> Optional[Tuple[datetime, float, float]]:
+        return self._latest.get(partner_id)
+
+    def flush(self, db: Session) -> int:
+        """Write every position that changed since the last flush in one bulk UPDATE."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            rows = [
+                {
+                    "partner_id": partner_id,
+                    "latitude": self._latest[partner_id][1],
+                    "longitude": self._latest[partner_id][2],
+                    "updated_at": self._latest[partner_id][0]
+                }
+                for partner_id in self._dirty
+            ]
+            self._dirty = set()
+        
+        table = DeliveryPartner.__table__
+        statement = update(table).where(
+            table.c.id == bindparam("partner_id")
+        ).values(
+            current_latitude=bindparam("latitude"),
+            current_longitude=bindparam("longitude"),
+            updated_at=bindparam("updated_at")
+        )
+        try:
+            db.execute(statement, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(row["partner_id"] for row in rows)
+            raise
+        return len(rows)
+
+location_buffer = LocationBuffer()
+register_periodic_task("gps_flush", location_buffer.flush, settings.gps_flush_interval_seconds, run_on_stop=True)
+_partner_ids_by_user: Dict[int, int] = {}
+
+def _to_naive_utc(moment: Optional[datetime]) -> datetime:
+    if moment is None:
+        return datetime.utcnow()
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def record_partner_pings(partner_id: int, pings: Iterable[Tuple[Optional[datetime], float, float]]) -> bool:
+    """Buffer a partner's pings and move them in the spatial index; returns whether the position changed."""
+    newest = location_buffer.ingest(
+        partner_id,
+        [(_to_naive_utc(recorded_at), latitude, longitude) for recorded_at, latitude, longitude in pings]
+    )
+    if newest is None:
+        return False
+    
+    payload = _partner_payloads.get(partner_id)
+    if payload is not None:
+        partner_index.upsert(partner_id, newest[1], newest[2], payload)
+    return True
+
+def known_partner_ids(db: Session, partner_ids: Collection[int]) -> Set[int]:
+    """The given ids that belong to existing partners, loading unseen ones in one query."""
+    unseen = [partner_id for partner_id in partner_ids if partner_id not in _partner_payloads]
+    if unseen:
+        for partner in db.query(DeliveryPartner).filter(DeliveryPartner.id.in_(unseen)).all():
+            _partner_payloads[partner.id] = _partner_payload(partner) if partner.is_available else None
+    return {partner_id for partner_id in partner_ids if partner_id in _partner_payloads}
+
+def partner_id_for_user(db: Session, user_id: int) -> Optional[int]:
+    """DeliveryPartner.id for a delivery partner's user account, memoised."""
+    partner_id = _partner_ids_by_user.get(user_id)
+    if partner_id is None:
+        partner = db.query(DeliveryPartner.id).filter(DeliveryPartner.user_id == user_id).first()
+        if partner is None:
+            return None
+        partner_id = _partner_ids_by_user[user_id] = partner.id
+    return partner_id
+
+def get_partner_position(db: Session, partner_id: int) -> Optional[Tuple[Optional[datetime], float, float]]:
+    """Latest known ``(recorded_at, latitude, longitude)``, from memory when possible."""
+    buffered = location_buffer.get(partner_id)
+    if buffered is not None:
+        return buffered
+    
+    partner = db.query(DeliveryPartner).filter(DeliveryPartner.id == partner_id).first()
+    if partner is None or partner.current_latitude is None or partner.current_longitude is None:
+        return None
+    return partner.updated_at, partner.current_latitude, partner.current_longitude
+
+def _partner_payload(partner: DeliveryPartner) -> dict:
+    return {
+        "id": partner.id,
+        "user_id": partner.user_id,
+        "vehicle_type": partner.vehicle_type,
+        "is_available": partner.is_available,
+        "rating": partner.rating or 0.0,
+    }
+
+def _partner_snapshot(partner: DeliveryPartner) -> Tuple[Optional[dict], Optional[float], Optional[float]]:
+    payload = _partner_payload(partner) if partner.is_available else None
+    return payload, partner.current_latitude, partner.current_longitude
+
+def _apply_partner(partner_id: int, payload: Optional[dict], latitude: Optional[float], longitude: Optional[float]) -> None:
+    buffered = location_buffer.get(partner_id)
+    if buffered is not None:
+        # Pings not yet flushed are newer than the row
+        latitude, longitude = buffered[1], buffered[2]
+    
+    _partner_payloads[partner_id] = payload
+    if payload is not None and latitude is not None and longitude is not None:
+        partner_index.upsert(partner_id, latitude, longitude, payload)
+    else:
+        partner_index.remove(partner_id)
+
+def sync_partner(partner: DeliveryPartner) -> None:
+    """Reflect a partner's availability and position in the spatial index."""
+    _apply_partner(partner.id, *_partner_snapshot(partner))
+
+def ensure_partner_index(db: Session) -> GridIndex:
+    """Load available partners into the spatial index on first use."""
+    global _partner_index_loaded
+    if _partner_index_loaded:
+        return partner_index
+
+    with _partner_index_lock:
+        if not _partner_index_loaded:
+            partners = db.query(DeliveryPartner).filter(
+                DeliveryPartner.is_available == True
+            ).all()
+            partner_index.clear()
+            for partner in partners:
+                sync_partner(partner)
+            _partner_index_loaded = True
+
+    return partner_index
+
+def find_nearest_partners(
+    db: Session,
+    latitude: float,
+    longitude: float,
+    k: int = 5,
+    max_distance_km: Optional[float] = None
+) -> List[Tuple[float, dict]]:
+    """Return the ``k`` nearest available partners as ``(distance_km, payload)``."""
+    index = ensure_partner_index(db)
+    return [
+        (distance, payload)
+        for distance, _, payload in index.nearest(latitude, longitude, k, max_distance_km)
+    ]
+
+_WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_ALWAYS_OPEN = {"24/7", "24x7", "24 hours", "always open"}
+_TIME_RANGE = re.compile(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})")
+_DAY_SPEC = re.compile(r"^(daily|[a-z]{3})(?:\s*-\s*([a-z]{3}))?\s+", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def parse_operating_hours(operating_hours: Optional[str]) -> Optional[Tuple[Tuple[FrozenSet[int], int, int], ...]]:
+    """Parse an operating hours string into ``(weekdays, open_minute, close_minute)`` windows.
+
+    Accepts ``24/7`` or ``;``-separated segments such as ``Mon-Fri 09:00-21:00``
+    or ``Sat 10:00-14:00, 16:00-20:00``. Segments without a day apply daily.
+    Returns ``None`` when the hours are missing or unrecognised.
+    """
+    if not operating_hours:
+        return None
+    
+    text = operating_hours.strip().lower()
+    if text in _ALWAYS_OPEN:
+        return ((frozenset(range(7)), 0, 24 * 60),)
+    
+    windows = []
+    for segment in text.split(";"):
+        segment = segment.strip()
+        if not segment:
+            continue
+        
+        days = frozenset(range(7))
+        day_match = _DAY_SPEC.match(segment)
+        if day_match:
+            first, last = day_match.group(1), day_match.group(2)
+            if first != "daily":
+                if first not in _WEEKDAYS or (last and last not in _WEEKDAYS):
+                    return None
+                start_day = _WEEKDAYS.index(first)
+                end_day = _WEEKDAYS.index(last) if last else start_day
+                span = (end_day - start_day) % 7
+                days = frozenset((start_day + offset) % 7 for offset in range(span + 1))
+            segment = segment[day_match.end():]
+        
+        ranges = _TIME_RANGE.findall(segment)
+        if not ranges:
+            return None
+        for open_h, open_m, close_h, close_m in ranges:
+            windows.append((days, int(open_h) * 60 + int(open_m), int(close_h) * 60 + int(close_m)))
+    
+    return tuple(windows) or None
+
+def is_open_at(operating_hours: Optional[str], moment: datetime) -> Optional[bool]:
+    """Check parsed operating hours against a moment; ``None`` if hours are unknown."""
+    windows = parse_operating_hours(operating_hours)
+    if windows is None:
+        return None
+    
+    weekday = moment.weekday()
+    minute = moment.hour * 60 + moment.minute
+    for days, opens, closes in windows:
+        if closes > opens:
+            if weekday in days and opens <= minute < closes:
+                return True
+        else:
+            # Overnight window, e.g. 20:00-02:00
+            if weekday in days and minute >= opens:
+                return True
+            if (weekday - 1) % 7 in days and minute < closes:
+                return True
+    return False
+
+def find_nearby_pharmacies(
+    db: Session,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: int = 5,
+    open_now: bool = False
+) -> List[Tuple[float, Pharmacy, Optional[bool]]]:
+    """Return active pharmacies within ``radius_km`` as ``(distance_km, pharmacy, is_open)``, closest first."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    candidates = db.query(Pharmacy).filter(
+        Pharmacy.is_active == True,
+        Pharmacy.latitude.between(min_lat, max_lat),
+        Pharmacy.longitude.between(min_lon, max_lon)
+    ).all()
+    
+    now = datetime.now()
+    results = []
+    for pharmacy in candidates:
+        distance = haversine_km(latitude, longitude, pharmacy.latitude, pharmacy.longitude)
+        if distance > radius_km:
+            continue
+        is_open = is_open_at(pharmacy.operating_hours, now)
+        if open_now and not is_open:
+            continue
+        results.append((distance, pharmacy, is_open))
+    
+    results.sort(key=lambda item: item[0])
+    return results[:limit]
+
+def nearest_serving_pharmacy(db: Session, latitude: float, longitude: float) -> Optional[dict]:
+    """Return the nearest active pharmacy serving a location's geocell, or ``None``.
+
+    Distances are measured from the geocell centre, so every address in a
+    cell gets the same quote and only the first lookup touches the database.
+    """
+    geocell = geohash_encode(latitude, longitude, settings.delivery_quote_geohash_precision)
+    cached = _quote_cache.get(geocell, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    
+    center_lat, center_lon = geohash_center(geocell)
+    nearby = find_nearby_pharmacies(
+        db, center_lat, center_lon, settings.delivery_service_radius_km, limit=1
+    )
+    serving = None
+    if nearby:
+        distance, pharmacy, _ = nearby[0]
+        serving = {"geocell": geocell, "pharmacy_id": pharmacy.id, "distance_km": round(distance, 2)}
+    
+    _quote_cache.set(geocell, serving)
+    return serving
+
+def estimate_delivery(
+    db: Session,
+    latitude: Optional[float],
+    longitude: Optional[float],
+    is_emergency: bool = False
+) -> Optional[dict]:
+    """Quote delivery fee and time for a location; ``None`` if no pharmacy serves it.
+
+    Locations without coordinates fall back to ``default_delivery_distance_km``.
+    """
+    if latitude is None or longitude is None:
+        serving = {
+            "geocell": None,
+            "pharmacy_id": None,
+            "distance_km": settings.default_delivery_distance_km
+        }
+    else:
+        serving = nearest_serving_pharmacy(db, latitude, longitude)
+        if serving is None:
+            return None
+    
+    distance = serving["distance_km"]
+    return {
+        **serving,
+        "delivery_fee": calculate_delivery_fee(distance, is_emergency),
+        "estimated_time": calculate_delivery_time(distance, is_emergency)
+    }
+
+def estimate_delivery_batch(db: Session, locations: List[Tuple[float, float, bool]]) -> List[Optional[dict]]:
+    """Quote many ``(latitude, longitude, is_emergency)`` locations, resolving each geocell once."""
+    return [
+        estimate_delivery(db, latitude, longitude, is_emergency)
+        for latitude, longitude, is_emergency in locations
+    ]
+
+@event.listens_for(Pharmacy, "after_insert")
+@event.listens_for(Pharmacy, "after_update")
+@event.listens_for(Pharmacy, "after_delete")
+def _pharmacy_changed(mapper, connection, target):
+    _quote_cache.clear()
+
+# Partner changes are snapshotted at flush and only reach the spatial index once
+# the session commits, so a rolled back availability or position change is never
+# offered for dispatch.
+_PENDING_PARTNERS = "partner_index_changes"
+_DELETED = object()
+
+def _pending_partners(target) -> dict:
+    return inspect(target).session.info.setdefault(_PENDING_PARTNERS, {})
+
+@event.listens_for(DeliveryPartner, "after_insert")
+@event.listens_for(DeliveryPartner, "after_update")
+def _partner_changed(mapper, connection, target):
+    _pending_partners(target)[target.id] = _partner_snapshot(target)
+
+@event.listens_for(DeliveryPartner, "after_delete")
+def _partner_deleted(mapper, connection, target):
+    _pending_partners(target)[target.id] = _DELETED
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_partners(session):
+    for partner_id, snapshot in session.info.pop(_PENDING_PARTNERS, {}).items():
+        if snapshot is _DELETED:
+            _partner_payloads.pop(partner_id, None)
+            partner_index.remove(partner_id)
+        else:
+            _apply_partner(partner_id, *snapshot)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_partners(session):
+    session.info.pop(_PENDING_PARTNERS, None)
@@ -5,32 +5,56 @@ from app.database import get_db
 from app.models import User, UserRole
 from app.auth import verify_token
 from app.schemas import TokenData
+from app.user_cache import get_user_by_username
+from app.principals import Principal, current_token_version
 
 security = HTTPBearer()
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """Authenticated caller from the token's claims, without loading the user."""
+    token_data = verify_token(credentials.credentials, _credentials_exception())
     
-    token_data = verify_token(credentials.credentials, credentials_exception)
-    user = db.query(User).filter(User.username == token_data.username).first()
-    
-    if user is None:
-        raise credentials_exception
+    if token_data.token_version is None:
+        # Issued before tokens carried claims; expires within access_token_expire_minutes
+        user = get_user_by_username(db, token_data.username)
+        if user is None:
+            raise _credentials_exception()
+        principal = Principal(user.id, user.username, user.role, user.is_active)
+    else:
+        if current_token_version(db, token_data.user_id) != token_data.token_version:
+            raise _credentials_exception()
+        principal = Principal(
+            token_data.user_id, token_data.username, UserRole(token_data.role), token_data.is_active
+        )
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
     
+    return principal
+
+def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user."""
+    user = get_user_by_username(db, principal.username)
+    
+    if user is None:
+        raise _credentials_exception()
+    
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -39,7 +63,7 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_admin_user(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Get current user with admin privileges."""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -48,7 +72,7 @@ def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
         )
     return current_user
 
-def get_pharmacist_user(current_user: User = Depends(get_current_user)) -> User:
+def get_pharmacist_user(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Get current user with pharmacist privileges."""
     if current_user.role not in [UserRole.PHARMACIST, UserRole.ADMIN]:
         raise HTTPException(
@@ -57,7 +81,7 @@ def get_pharmacist_user(current_user: User = Depends(get_current_user)) -> User:
         )
     return current_user
 
-def get_delivery_partner(current_user: User = Depends(get_current_user)) -> User:
+def get_delivery_partner(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Get current user with delivery partner privileges."""
     if current_user.role not in [UserRole.DELIVERY_PARTNER, UserRole.ADMIN]:
         raise HTTPException(
@@ -0,0 +1,120 @@
+import asyncio
+import os
+from email.utils import parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Optional
+from urllib.parse import quote
+import aiofiles.os
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from app.config import settings
+from app.storage_backends import StorageBackend
+
+# Headers a 304 must repeat from the full response (RFC 9110, 15.4.5)
+_NOT_MODIFIED_HEADERS = ("cache-control", "content-location", "etag", "expires", "vary")
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    weak_free = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == weak_free for tag in if_none_match.split(","))
+
+def is_not_modified(request: Request, response: Response) -> bool:
+    """Evaluate If-None-Match, or failing that If-Modified-Since, against a response."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response.headers.get("etag")
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = response.headers.get("last-modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _not_modified(response: Response) -> Response:
+    headers = {name: response.headers[name] for name in _NOT_MODIFIED_HEADERS if name in response.headers}
+    return Response(status_code=304, headers=headers)
+
+def _download_name(filename: str, path: str) -> str:
+    """Original file name, with the stored extension if the file was converted."""
+    if guess_type(filename)[0] == guess_type(path)[0]:
+        return filename
+    return os.path.splitext(filename)[0] + os.path.splitext(path)[1]
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"inline; filename*=utf-8''{quoted}"
+    return f'inline; filename="{filename}"'
+
+def _accel_redirect_path(path: str) -> Optional[str]:
+    relative_path = os.path.relpath(os.path.abspath(path), os.path.abspath(settings.upload_dir))
+    if relative_path.startswith(os.pardir):
+        return None
+    return settings.upload_accel_redirect_prefix.rstrip("/") + "/" + quote(relative_path.replace(os.sep, "/"))
+
+async def protected_file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    etag: Optional[str] = None
+) -> Optional[Response]:
+    """Serve an access-checked upload without copying it through Python.
+
+    With ``upload_accel_redirect_prefix`` set, the reverse proxy is told
+    which internal location to serve and handles ranges and validators
+    itself. Otherwise a ``FileResponse`` streams the file (sendfile where
+    the server supports it) with Range, ETag and Last-Modified support;
+    ``etag`` overrides the stat-based default. Returns None if the file is
+    missing.
+    """
+    try:
+        stat_result = await aiofiles.os.stat(path)
+    except OSError:
+        return None
+
+    headers = {
+        "Cache-Control": f"private, max-age={settings.upload_cache_max_age}",
+        "Content-Disposition": _content_disposition(_download_name(filename, path)),
+        "X-Content-Type-Options": "nosniff"
+    }
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+    media_type = guess_type(path)[0] or "application/octet-stream"
+
+    if settings.upload_accel_redirect_prefix:
+        internal_path = _accel_redirect_path(path)
+        if internal_path:
+            headers["X-Accel-Redirect"] = internal_path
+            return Response(media_type=media_type, headers=headers)
+
+    response = FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
+    if is_not_modified(request, response):
+        return _not_modified(response)
+    return response
+
+async def stored_file_response(
+    request: Request,
+    backend: StorageBackend,
+    key: str,
+    filename: str,
+    etag: Optional[str] = None
+) -> Optional[Response]:
+    """Serve a file from a storage backend without passing its bytes through Python.
+
+    Files on local disk go through ``protected_file_response``; remote
+    backends answer with a redirect to a short-lived signed URL. Returns
+    None if the file is missing.
+    """
+    path = backend.local_path(key)
+    if path is not None:
+        return await protected_file_response(request, path, filename, etag=etag)
+
+    if not await asyncio.to_thread(backend.exists, key):
+        return None
+    url = await asyncio.to_thread(backend.download_url, key, _download_name(filename, key))
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
@@ -0,0 +1,165 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models import Medicine
+
+# Attributes needed to decide eligibility and to build an emergency order line
+_SNAPSHOT_FIELDS = (
+    "id", "name", "generic_name", "brand_name", "price",
+    "stock_quantity", "is_available", "is_emergency_available"
+)
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join((name or "").lower().split())
+
+class EmergencyCatalog:
+    """In-memory index of medicines that can go out on an emergency order right now.
+
+    A medicine is listed while it is flagged ``is_emergency_available``, is
+    available and has stock. Entries are keyed by normalised name, generic
+    name and brand name, and kept current by mapper events on ``Medicine``,
+    applied once the change commits.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, dict] = {}
+        self._ids_by_name: Dict[str, Set[int]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Bumped on every applied change, so a load that raced with it is redone
+        self._generation = 0
+
+    @staticmethod
+    def _names(entry: dict) -> Set[str]:
+        names = {normalize_name(entry[field]) for field in ("name", "generic_name", "brand_name")}
+        names.discard("")
+        return names
+
+    def _remove_locked(self, medicine_id: int) -> None:
+        entry = self._entries.pop(medicine_id, None)
+        if entry is None:
+            return
+        for name in self._names(entry):
+            ids = self._ids_by_name.get(name)
+            if ids is not None:
+                ids.discard(medicine_id)
+                if not ids:
+                    del self._ids_by_name[name]
+
+    def _add_locked(self, entry: dict) -> None:
+        self._entries[entry["id"]] = entry
+        for name in self._names(entry):
+            self._ids_by_name.setdefault(name, set()).add(entry["id"])
+
+    @staticmethod
+    def snapshot(medicine: Medicine) -> Optional[dict]:
+        """The fields the catalog keeps for ``medicine``, or None if it is only partially loaded."""
+        loaded = inspect(medicine).dict
+        if any(field not in loaded for field in _SNAPSHOT_FIELDS):
+            return None
+        return {field: loaded[field] for field in _SNAPSHOT_FIELDS}
+
+    def apply(self, changes: Dict[int, Optional[dict]]) -> None:
+        """Reflect committed changes, given as medicine id to snapshot, or None if deleted."""
+        with self._lock:
+            self._generation += 1
+            for medicine_id, entry in changes.items():
+                self._remove_locked(medicine_id)
+                if entry and entry["is_emergency_available"] and entry["is_available"] and (entry["stock_quantity"] or 0) > 0:
+                    self._add_locked(entry)
+
+    def invalidate(self) -> None:
+        """Rebuild from the table on next use."""
+        with self._lock:
+            self._generation += 1
+            self._loaded = False
+
+    def ensure_loaded(self, db: Session) -> "EmergencyCatalog":
+        """Load the emergency catalog on first use, or after it was invalidated."""
+        if self._loaded:
+            return self
+
+        generation = self._generation
+        medicines = db.query(Medicine).filter(
+            Medicine.is_emergency_available == True,
+            Medicine.is_available == True,
+            Medicine.stock_quantity > 0
+        ).all()
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_name.clear()
+            for medicine in medicines:
+                self._add_locked({field: getattr(medicine, field) for field in _SNAPSHOT_FIELDS})
+            self._loaded = generation == self._generation
+        return self
+
+    def contains(self, medicine_id: int) -> bool:
+        return medicine_id in self._entries
+
+    def resolve(self, requested_names: Iterable[str]) -> Tuple[List[dict], List[str]]:
+        """Match requested names against the catalog in one pass.
+
+        Exact (normalised) name, generic or brand matches win; otherwise the
+        lowest-id medicine with a name containing the request is used. Returns
+        the matched entries, without duplicates, and the names that matched
+        nothing.
+        """
+        matched: List[dict] = []
+        unmatched: List[str] = []
+        seen: Set[int] = set()
+
+        with self._lock:
+            for requested in requested_names:
+                query = normalize_name(requested)
+                ids = self._ids_by_name.get(query) if query else None
+                if not ids and query:
+                    ids = set()
+                    for name, name_ids in self._ids_by_name.items():
+                        if query in name:
+                            ids |= name_ids
+                if not ids:
+                    unmatched.append(requested)
+                    continue
+
+                medicine_id = min(ids)
+                if medicine_id not in seen:
+                    seen.add(medicine_id)
+                    matched.append(dict(self._entries[medicine_id]))
+
+        return matched, unmatched
+
+emergency_catalog = EmergencyCatalog()
+
+# Changes are snapshotted at flush, while the instances are loaded, and only
+# applied once the session commits, so a rolled back stock or flag change never
+# reaches the catalog. A partially loaded medicine forces a rebuild instead.
+_PENDING_CHANGES = "emergency_catalog_changes"
+_STALE = "emergency_catalog_stale"
+
+@event.listens_for(Medicine, "after_insert")
+@event.listens_for(Medicine, "after_update")
+def _medicine_changed(mapper, connection, target):
+    session = inspect(target).session
+    entry = emergency_catalog.snapshot(target)
+    if entry is None:
+        session.info[_STALE] = True
+    else:
+        session.info.setdefault(_PENDING_CHANGES, {})[target.id] = entry
+
+@event.listens_for(Medicine, "after_delete")
+def _medicine_deleted(mapper, connection, target):
+    inspect(target).session.info.setdefault(_PENDING_CHANGES, {})[target.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_changes(session):
+    changes = session.info.pop(_PENDING_CHANGES, None)
+    if session.info.pop(_STALE, False):
+        emergency_catalog.invalidate()
+    elif changes:
+        emergency_catalog.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session):
+    session.info.pop(_PENDING_CHANGES, None)
+    session.info.pop(_STALE, None)
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import secrets
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+from app.background import register_periodic_task
+from app.config import settings
+from app.models import ExtractionJob, ExtractionStatus, Prescription, PrescriptionStatus
+from app.queueing import claim_batch
+from app.storage import file_location, local_copy
+from app.workers import register_worker_pool
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_EXTRACTION_STATUSES = (ExtractionStatus.QUEUED, ExtractionStatus.RUNNING)
+
+class ExtractionEngine(ABC):
+    """Reads medicine names off a prescription file.
+
+    ``extract`` runs in an extraction pool worker and must return a dict with
+    ``text`` (the raw OCR output), ``medicines`` (a list of names) and
+    ``confidence`` (0-1). Engines are created once per worker process with no
+    arguments; select one with ``EXTRACTION_ENGINE=package.module:ClassName``.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def extract(self, file_path: str) -> dict:
+        ...
+
+class StubEngine(ExtractionEngine):
+    """Offline engine for development and tests: the same file always yields the same result."""
+
+    name = "stub"
+    medicines = (
+        "Paracetamol 500mg", "Ibuprofen 400mg", "Amoxicillin 250mg", "Cetirizine 10mg",
+        "Omeprazole 20mg", "Metformin 500mg", "Azithromycin 500mg", "Pantoprazole 40mg"
+    )
+
+    def extract(self, file_path: str) -> dict:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for chunk in iter(lambda: source.read(64 * 1024), b""):
+                digest.update(chunk)
+        seed = digest.digest()
+
+        count = 1 + seed[0] % 3
+        picked: List[str] = []
+        for byte in seed[1:]:
+            name = self.medicines[byte % len(self.medicines)]
+            if name not in picked:
+                picked.append(name)
+                if len(picked) == count:
+                    break
+
+        return {
+            "text": "\n".join(f"{index}. {name}" for index, name in enumerate(picked, 1)),
+            "medicines": picked,
+            "confidence": round(0.6 + (seed[-1] % 40) / 100, 2)
+        }
+
+EXTRACTION_ENGINES = {StubEngine.name: StubEngine}
+
+# Engine instances live in the pool workers, one per process and engine spec
+_engines: Dict[str, ExtractionEngine] = {}
+
+def load_engine(spec: str) -> ExtractionEngine:
+    engine = _engines.get(spec)
+    if engine is None:
+        if spec in EXTRACTION_ENGINES:
+            engine_class = EXTRACTION_ENGINES[spec]
+        else:
+            module_name, _, class_name = spec.partition(":")
+            engine_class = getattr(importlib.import_module(module_name), class_name)
+        engine = _engines[spec] = engine_class()
+    return engine
+
+def run_engine(spec: str, file_path: str) -> dict:
+    """Pool entry point."""
+    result = load_engine(spec).extract(file_path)
+    return {
+        "text": result.get("text") or "",
+        "medicines": [str(name) for name in result.get("medicines") or []],
+        "confidence": result.get("confidence")
+    }
+
+extraction_pool = register_worker_pool("extraction", settings.extraction_workers)
+
+def submit_extraction(db: Session, prescription_id: int, requested_by: Optional[int]) -> ExtractionJob:
+    """Queue an extraction, or return the one already queued or running for the prescription."""
+    job = db.query(ExtractionJob).filter(
+        ExtractionJob.prescription_id == prescription_id,
+        ExtractionJob.status.in_(ACTIVE_EXTRACTION_STATUSES)
+    ).first()
+    if job is None:
+        job = ExtractionJob(
+            prescription_id=prescription_id,
+            requested_by=requested_by,
+            status=ExtractionStatus.QUEUED,
+            engine=settings.extraction_engine
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+    return job
+
+def submit_pending_extractions(db: Session, requested_by: Optional[int], limit: int) -> List[ExtractionJob]:
+    """Queue extractions for the oldest pending prescriptions that have never had one."""
+    has_job = exists().where(ExtractionJob.prescription_id == Prescription.id)
+    prescription_ids = [
+        prescription_id for prescription_id, in db.query(Prescription.id).filter(
+            Prescription.status == PrescriptionStatus.PENDING, ~has_job
+        ).order_by(Prescription.created_at.asc(), Prescription.id.asc()).limit(limit)
+    ]
+    jobs = [
+        ExtractionJob(
+            prescription_id=prescription_id,
+            requested_by=requested_by,
+            status=ExtractionStatus.QUEUED,
+            engine=settings.extraction_engine
+        )
+        for prescription_id in prescription_ids
+    ]
+    db.add_all(jobs)
+    db.commit()
+    for job in jobs:
+        db.refresh(job)
+    return jobs
+
+def latest_extraction(db: Session, prescription_id: int) -> Optional[ExtractionJob]:
+    return db.query(ExtractionJob).filter(
+        ExtractionJob.prescription_id == prescription_id
+    ).order_by(ExtractionJob.created_at.desc(), ExtractionJob.id.desc()).first()
+
+def _finish(job: ExtractionJob, status: ExtractionStatus, error: Optional[str] = None) -> None:
+    job.status = status
+    job.error = error
+    job.claimed_by = None
+    job.claim_expires_at = None
+    if status != ExtractionStatus.QUEUED:
+        job.completed_at = datetime.utcnow()
+
+def _job_failed(job: ExtractionJob, error: str) -> None:
+    if job.attempts < settings.extraction_max_attempts:
+        _finish(job, ExtractionStatus.QUEUED, error)
+    else:
+        _finish(job, ExtractionStatus.FAILED, error)
+
+def _job_completed(db: Session, job: ExtractionJob, result: dict) -> None:
+    job.extracted_text = result["text"]
+    job.extracted_medicines = json.dumps(result["medicines"])
+    job.confidence = result["confidence"]
+    _finish(job, ExtractionStatus.COMPLETED)
+
+    # Prefill the pharmacist's list; never overwrite a reviewed prescription
+    prescription = db.query(Prescription).filter(Prescription.id == job.prescription_id).first()
+    if prescription is not None and prescription.status == PrescriptionStatus.PENDING:
+        prescription.extracted_medicines = job.extracted_medicines
+
+def run_extraction_jobs(db: Session) -> int:
+    """Claim a batch of queued jobs and run them in the extraction pool.
+
+    Jobs are leased, so several app processes can dispatch from the same
+    table, and a job left running by a process that died is picked up again
+    once its lease lapses. Failed jobs are retried up to
+    ``extraction_max_attempts`` times. Returns the number of jobs run.
+    """
+    # A fresh claimant per round, so overlapping rounds never renew each other's leases
+    job_ids = claim_batch(
+        db,
+        ExtractionJob,
+        [ExtractionJob.status.in_(ACTIVE_EXTRACTION_STATUSES)],
+        [ExtractionJob.created_at, ExtractionJob.id],
+        secrets.randbits(31),
+        settings.extraction_batch_size,
+        settings.extraction_lease_seconds
+    )
+    if not job_ids:
+        return 0
+
+    rows = db.query(ExtractionJob, Prescription).outerjoin(
+        Prescription, Prescription.id == ExtractionJob.prescription_id
+    ).filter(ExtractionJob.id.in_(job_ids)).all()
+
+    now = datetime.utcnow()
+    futures = {}
+    with ExitStack() as local_files:
+        for job, prescription in rows:
+            if job.attempts >= settings.extraction_max_attempts:
+                # Its worker died mid-job on the last attempt
+                _finish(job, ExtractionStatus.FAILED, job.error or "Extraction did not finish")
+            elif prescription is None:
+                _finish(job, ExtractionStatus.FAILED, "Prescription not found")
+            else:
+                job.status = ExtractionStatus.RUNNING
+                job.engine = settings.extraction_engine
+                job.started_at = now
+                job.attempts = (job.attempts or 0) + 1
+                try:
+                    file_path = local_files.enter_context(local_copy(*file_location(prescription)))
+                except Exception as e:
+                    _job_failed(job, f"{type(e).__name__}: {e}")
+                    continue
+                futures[job.id] = extraction_pool.submit(run_engine, settings.extraction_engine, file_path)
+        db.commit()
+
+        for job, _ in rows:
+            future = futures.get(job.id)
+            if future is None:
+                continue
+            try:
+                result = future.result(timeout=settings.extraction_lease_seconds)
+            except Exception as e:
+                _job_failed(job, f"{type(e).__name__}: {e}")
+            else:
+                _job_completed(db, job, result)
+            db.commit()
+
+    return len(futures)
+
+extraction_task = register_periodic_task(
+    "prescription_extraction", run_extraction_jobs, settings.extraction_interval_seconds
+)
+
+async def dispatch_extractions() -> None:
+    """Run a dispatch round now instead of waiting for the next interval."""
+    try:
+        await asyncio.to_thread(extraction_task.run_once)
+    except Exception:
+        logger.exception("Background job %s failed", extraction_task.name)
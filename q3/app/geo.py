@@ -0,0 +1,229 @@
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Encode a coordinate as a geohash of ``precision`` characters."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bits = 0
+    even = True
+    while len(chars) < precision:
+        target, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (target[0] + target[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            target[0] = mid
+        else:
+            target[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            value = 0
+            bits = 0
+    return "".join(chars)
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """Return the ``(latitude, longitude)`` centre of a geohash cell."""
+    min_lat, max_lat, min_lon, max_lon = _geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+class GridIndex:
+    """In-memory spatial index bucketing points into fixed-size lat/long cells.
+
+    Nearest-neighbour queries walk outwards ring by ring from the query cell
+    and stop once no unvisited cell can hold a closer point.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.01):
+        self.cell_size_deg = cell_size_deg
+        self._cells: Dict[Tuple[int, int], Dict[Any, Tuple[float, float, Any]]] = {}
+        self._points: Dict[Any, Tuple[Tuple[int, int], float, float, Any]] = {}
+        # Occupied cell extent; only ever widened, which keeps searches correct
+        self._bounds: Optional[List[int]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._points
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            int(math.floor(latitude / self.cell_size_deg)),
+            int(math.floor(longitude / self.cell_size_deg)),
+        )
+
+    def upsert(self, key: Any, latitude: float, longitude: float, payload: Any = None) -> None:
+        """Insert a point or move an existing one."""
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            existing = self._points.get(key)
+            if existing and existing[0] != cell:
+                self._discard_from_cell(existing[0], key)
+            self._cells.setdefault(cell, {})[key] = (latitude, longitude, payload)
+            self._points[key] = (cell, latitude, longitude, payload)
+            if self._bounds is None:
+                self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+            else:
+                bounds = self._bounds
+                bounds[0] = min(bounds[0], cell[0])
+                bounds[1] = max(bounds[1], cell[0])
+                bounds[2] = min(bounds[2], cell[1])
+                bounds[3] = max(bounds[3], cell[1])
+
+    def remove(self, key: Any) -> None:
+        """Remove a point if present."""
+        with self._lock:
+            existing = self._points.pop(key, None)
+            if existing:
+                self._discard_from_cell(existing[0], key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._bounds = None
+
+    def get(self, key: Any) -> Optional[Tuple[float, float, Any]]:
+        """Return ``(latitude, longitude, payload)`` for a key."""
+        entry = self._points.get(key)
+        if entry is None:
+            return None
+        return entry[1], entry[2], entry[3]
+
+    def _discard_from_cell(self, cell: Tuple[int, int], key: Any) -> None:
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, center: Tuple[int, int], radius: int):
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for dj in range(-radius, radius + 1):
+            yield (ci - radius, cj + dj)
+            yield (ci + radius, cj + dj)
+        for di in range(-radius + 1, radius):
+            yield (ci + di, cj - radius)
+            yield (ci + di, cj + radius)
+
+    def _ring_clearance_km(self, latitude: float, radius: int) -> float:
+        """Lower bound on the distance to any point outside rings 0..radius."""
+        if radius == 0:
+            return 0.0
+        span = radius * self.cell_size_deg
+        worst_lat = min(89.9, abs(latitude) + span + self.cell_size_deg)
+        return span * KM_PER_DEGREE * math.cos(math.radians(worst_lat))
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 5,
+        max_distance_km: Optional[float] = None,
+    ) -> List[Tuple[float, Any, Any]]:
+        """Return up to ``k`` ``(distance_km, key, payload)`` tuples, closest first."""
+        with self._lock:
+            if not self._points or k <= 0:
+                return []
+            center = self._cell(latitude, longitude)
+            min_row, max_row, min_col, max_col = self._bounds
+            max_radius = max(
+                abs(center[0] - min_row), abs(center[0] - max_row),
+                abs(center[1] - min_col), abs(center[1] - max_col),
+            )
+
+            found: List[Tuple[float, Any, Any]] = []
+            radius = 0
+            while radius <= max_radius:
+                if 8 * radius > len(self._cells):
+                    # Sparse grid: scanning every point beats walking empty rings
+                    return self._scan(latitude, longitude, k, max_distance_km)
+                for cell in self._ring(center, radius):
+                    bucket = self._cells.get(cell)
+                    if not bucket:
+                        continue
+                    for key, (lat, lon, payload) in bucket.items():
+                        distance = haversine_km(latitude, longitude, lat, lon)
+                        if max_distance_km is None or distance <= max_distance_km:
+                            found.append((distance, key, payload))
+
+                clearance = self._ring_clearance_km(latitude, radius)
+                if max_distance_km is not None and clearance > max_distance_km:
+                    break
+                if len(found) >= k:
+                    found.sort(key=lambda item: item[0])
+                    del found[k:]
+                    if found[-1][0] <= clearance:
+                        break
+                radius += 1
+
+            found.sort(key=lambda item: item[0])
+            return found[:k]
+
+    def _scan(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_distance_km: Optional[float],
+    ) -> List[Tuple[float, Any, Any]]:
+        found = []
+        for key, (_, lat, lon, payload) in self._points.items():
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if max_distance_km is None or distance <= max_distance_km:
+                found.append((distance, key, payload))
+        found.sort(key=lambda item: item[0])
+        return found[:k]
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return ``(min_lat, max_lat, min_lon, max_lon)`` enclosing a radius around a point."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.9, abs(latitude) + dlat)))
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * max(cos_lat, 1e-6)))
+    return (
+        max(-90.0, latitude - dlat),
+        min(90.0, latitude + dlat),
+        longitude - dlon,
+        longitude + dlon,
+    )
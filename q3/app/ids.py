@@ -0,0 +1,179 @@
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import WorkerIdLease
+
+logger = logging.getLogger(__name__)
+
+# 41 bits of milliseconds since EPOCH_MS, 10 bits of worker id, 12 bits of sequence
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+_BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+class SnowflakeGenerator:
+    """Time-ordered 63-bit ids, unique per worker without any coordination.
+
+    Ids are strictly increasing within a generator. If the clock steps
+    backwards, or the sequence is exhausted within a millisecond, the
+    generator keeps counting from its last timestamp instead of blocking.
+    """
+
+    def __init__(self, worker_id: int, epoch_ms: int = EPOCH_MS):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000 - self.epoch_ms
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    self._last_ms += 1
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def decompose(self, snowflake_id: int) -> Tuple[int, int, int]:
+        """Split an id into ``(unix_ms, worker_id, sequence)``."""
+        return (
+            (snowflake_id >> (WORKER_BITS + SEQUENCE_BITS)) + self.epoch_ms,
+            (snowflake_id >> SEQUENCE_BITS) & MAX_WORKER_ID,
+            snowflake_id & MAX_SEQUENCE,
+        )
+
+def _base36(value: int, width: int) -> str:
+    chars = []
+    while value:
+        value, remainder = divmod(value, 36)
+        chars.append(_BASE36[remainder])
+    return "".join(reversed(chars)).rjust(width, "0")
+
+def lease_worker_id(db: Session, holder: str) -> Optional[int]:
+    """Claim the lowest free or lapsed worker id for ``holder``; None if every id is held."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=settings.worker_id_lease_seconds)
+    held = dict(db.query(WorkerIdLease.worker_id, WorkerIdLease.expires_at).all())
+    for worker_id in range(MAX_WORKER_ID + 1):
+        lapsed_at = held.get(worker_id)
+        try:
+            if lapsed_at is None:
+                db.add(WorkerIdLease(worker_id=worker_id, holder=holder, expires_at=expires_at))
+                db.commit()
+                return worker_id
+            if lapsed_at < now:
+                # Conditional on the expiry we read, so only one process takes over a lapsed id
+                claimed = db.query(WorkerIdLease).filter(
+                    WorkerIdLease.worker_id == worker_id,
+                    WorkerIdLease.expires_at == lapsed_at
+                ).update({"holder": holder, "expires_at": expires_at}, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return worker_id
+        except IntegrityError:
+            db.rollback()
+    return None
+
+def renew_worker_id(db: Session, worker_id: int, holder: str) -> bool:
+    """Extend ``holder``'s lease; False if another process has taken the id since."""
+    renewed = db.query(WorkerIdLease).filter(
+        WorkerIdLease.worker_id == worker_id,
+        WorkerIdLease.holder == holder
+    ).update(
+        {"expires_at": datetime.utcnow() + timedelta(seconds=settings.worker_id_lease_seconds)},
+        synchronize_session=False
+    )
+    db.commit()
+    return bool(renewed)
+
+# (worker_id, holder) of this process's lease
+_lease: Optional[Tuple[int, str]] = None
+
+def _current_worker_id() -> Tuple[int, Optional[float]]:
+    """This process's worker id, and the monotonic time to check it again at (None: never)."""
+    global _lease
+    if settings.worker_id is not None:
+        return settings.worker_id, None
+    
+    holder_prefix = f"{socket.gethostname()}:{os.getpid()}:"
+    db = SessionLocal()
+    try:
+        # A forked child must not keep its parent's lease
+        if _lease is not None and _lease[1].startswith(holder_prefix) and renew_worker_id(db, *_lease):
+            return _lease[0], time.monotonic() + settings.worker_id_lease_seconds / 2
+        holder = holder_prefix + secrets.token_hex(4)
+        worker_id = lease_worker_id(db, holder)
+        if worker_id is None:
+            raise RuntimeError(f"all {MAX_WORKER_ID + 1} worker ids are leased")
+        _lease = (worker_id, holder)
+        return worker_id, time.monotonic() + settings.worker_id_lease_seconds / 2
+    except Exception as e:
+        fallback = os.getpid() & MAX_WORKER_ID
+        logger.error(
+            "Could not lease a worker id (%s); using %d from the process id. Order and tracking "
+            "numbers can collide with other processes until a lease succeeds; set WORKER_ID "
+            "per process to avoid this.", e, fallback
+        )
+        return fallback, time.monotonic() + 60
+    finally:
+        db.close()
+
+_generator: Optional[SnowflakeGenerator] = None
+_generator_pid: Optional[int] = None
+_recheck_at: Optional[float] = None
+_generator_lock = threading.Lock()
+
+def _needs_refresh(pid: int) -> bool:
+    return (
+        _generator is None
+        or _generator_pid != pid
+        or (_recheck_at is not None and time.monotonic() >= _recheck_at)
+    )
+
+def get_generator() -> SnowflakeGenerator:
+    """Process-wide generator on this process's worker id, recreated after a fork or when the id changes."""
+    global _generator, _generator_pid, _recheck_at
+    pid = os.getpid()
+    if _needs_refresh(pid):
+        with _generator_lock:
+            if _needs_refresh(pid):
+                worker_id, _recheck_at = _current_worker_id()
+                if _generator is None or _generator_pid != pid or _generator.worker_id != worker_id:
+                    _generator = SnowflakeGenerator(worker_id)
+                    _generator_pid = pid
+    return _generator
+
+def format_order_number(snowflake_id: int, generator: SnowflakeGenerator) -> str:
+    """``ORD`` + UTC ``YYYYMMDDHHMMSS`` + 7 base36 chars (millisecond, worker, sequence)."""
+    unix_ms, worker_id, sequence = generator.decompose(snowflake_id)
+    seconds, millis = divmod(unix_ms, 1000)
+    timestamp = (_UNIX_EPOCH + timedelta(seconds=seconds)).strftime("%Y%m%d%H%M%S")
+    suffix = (((millis << WORKER_BITS) | worker_id) << SEQUENCE_BITS) | sequence
+    return f"ORD{timestamp}{_base36(suffix, 7)}"
+
+def format_tracking_number(snowflake_id: int, generator: SnowflakeGenerator) -> str:
+    """``TRK`` + UTC ``YYYYMMDD`` + 10 base36 chars (millisecond of day, worker, sequence)."""
+    unix_ms, worker_id, sequence = generator.decompose(snowflake_id)
+    days, millis_of_day = divmod(unix_ms, 86_400_000)
+    datestamp = (_UNIX_EPOCH + timedelta(days=days)).strftime("%Y%m%d")
+    suffix = (((millis_of_day << WORKER_BITS) | worker_id) << SEQUENCE_BITS) | sequence
+    return f"TRK{datestamp}{_base36(suffix, 10)}"
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from PIL import Image, ImageOps
+from app.config import settings
+from app.workers import register_worker_pool
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SIZES = {
+    "thumb": settings.preview_thumb_size,
+    "review": settings.preview_review_size,
+}
+PREVIEW_FORMATS = {
+    # name: (Pillow format, extension, media type)
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+PREVIEWABLE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Decoding and resizing run in a process pool
+image_pool = register_worker_pool("image", settings.image_workers)
+
+async def run_image_job(fn: Callable, *args):
+    """Run ``fn(*args)`` in the image pool, at most ``image_workers`` at a time."""
+    return await image_pool.run(fn, *args)
+
+def _save_atomically(image: Image.Image, path: str, pil_format: str, **options) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.part"
+    image.save(temp_path, pil_format, **options)
+    os.replace(temp_path, path)
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Flatten onto white so transparent areas do not turn black in JPEG."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+def normalize_image(source_path: str, destination: str, max_side: int, quality: int) -> Optional[int]:
+    """Write a downscaled, EXIF-free JPEG of an upload. Runs in a pool worker.
+
+    Orientation is applied to the pixels before the metadata is dropped.
+    Returns the new size in bytes, or None (writing nothing) when the result
+    would not be smaller than the source.
+    """
+    with Image.open(source_path) as image:
+        image.draft("RGB", (max_side, max_side))
+        image = _to_rgb(ImageOps.exif_transpose(image))
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        _save_atomically(image, destination, "JPEG", quality=quality, optimize=True, progressive=True)
+
+    size = os.path.getsize(destination)
+    if size >= os.path.getsize(source_path):
+        os.remove(destination)
+        return None
+    return size
+
+def render_previews(source_path: str, outputs: List[Tuple[int, str, str]], quality: int) -> int:
+    """Write downscaled renditions of an image. Runs in a pool worker.
+
+    ``outputs`` holds ``(max_side, pillow_format, destination)`` tuples. The
+    source is decoded once; JPEGs are decoded at reduced scale when the
+    largest rendition allows it.
+    """
+    largest = max(max_side for max_side, _, _ in outputs)
+    with Image.open(source_path) as image:
+        image.draft("RGB", (largest, largest))
+        image = _to_rgb(ImageOps.exif_transpose(image))
+        for max_side, pil_format, destination in outputs:
+            rendition = image.copy()
+            rendition.thumbnail((max_side, max_side), Image.LANCZOS)
+            _save_atomically(rendition, destination, pil_format, quality=quality)
+    return len(outputs)
+
+def preview_key(file_hash: Optional[str], file_path: str) -> str:
+    """Previews of content-addressed files are shared; older files are keyed by path."""
+    return file_hash or hashlib.sha256(file_path.encode()).hexdigest()
+
+def preview_path(key: str, size: str, image_format: str) -> str:
+    extension = PREVIEW_FORMATS[image_format][1]
+    return os.path.join(settings.upload_dir, "previews", key[:2], key[2:4], f"{key}_{size}{extension}")
+
+def remove_previews(key: str) -> None:
+    for size in PREVIEW_SIZES:
+        for image_format in PREVIEW_FORMATS:
+            try:
+                os.remove(preview_path(key, size, image_format))
+            except OSError:
+                pass
+
+def can_preview(file_key: Optional[str]) -> bool:
+    return bool(file_key) and os.path.splitext(file_key)[1].lower() in PREVIEWABLE_EXTENSIONS
+
+class PreviewPipeline:
+    """Generates every size/format rendition of an image once, in the image pool.
+
+    Concurrent requests for the same key share one job, so a preview asked
+    for while its background job is still running simply waits for it.
+    Renditions are a cache on local disk; any node can rebuild them from the
+    stored file.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _missing_outputs(self, key: str) -> List[Tuple[int, str, str]]:
+        outputs = []
+        for size, max_side in PREVIEW_SIZES.items():
+            for image_format, (pil_format, _, _) in PREVIEW_FORMATS.items():
+                destination = preview_path(key, size, image_format)
+                if not os.path.exists(destination):
+                    outputs.append((max_side, pil_format, destination))
+        return outputs
+
+    async def _render(self, backend, blob_key: str, outputs: List[Tuple[int, str, str]]) -> int:
+        source_path, temporary = await asyncio.to_thread(backend.checkout, blob_key)
+        try:
+            return await run_image_job(render_previews, source_path, outputs, settings.preview_quality)
+        finally:
+            if temporary:
+                os.remove(source_path)
+
+    async def ensure(self, key: str, backend, blob_key: str) -> None:
+        """Make sure all renditions for ``key`` exist, rendering them from ``blob_key`` in ``backend`` if needed."""
+        job = self._in_flight.get(key)
+        if job is None:
+            outputs = self._missing_outputs(key)
+            if not outputs:
+                return
+            job = asyncio.ensure_future(self._render(backend, blob_key, outputs))
+            self._in_flight[key] = job
+            job.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        await asyncio.shield(job)
+
+    async def generate_in_background(self, key: str, backend, blob_key: str) -> None:
+        """Post-upload hook; skipped when the backlog is full, since previews are also made on demand."""
+        if len(self._in_flight) >= settings.preview_max_pending:
+            return
+        try:
+            await self.ensure(key, backend, blob_key)
+        except Exception:
+            logger.exception("Preview generation failed for %s", blob_key)
+
+preview_pipeline = PreviewPipeline()
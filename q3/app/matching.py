@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Medicine
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STRENGTH_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(mcg|µg|ug|mg|g|ml|iu|units?|%)(?![a-z])")
+
+# unit: (canonical unit, factor)
+_STRENGTH_UNITS = {
+    "mcg": ("mg", 0.001), "µg": ("mg", 0.001), "ug": ("mg", 0.001),
+    "mg": ("mg", 1), "g": ("mg", 1000),
+    "ml": ("ml", 1),
+    "iu": ("iu", 1), "unit": ("iu", 1), "units": ("iu", 1),
+    "%": ("%", 1)
+}
+
+# Medicine attributes the matcher is compiled from
+_MATCHED_FIELDS = ("name", "generic_name", "brand_name", "strength", "dosage")
+
+def tokenize(text: Optional[str]) -> Tuple[str, ...]:
+    return tuple(_TOKEN_PATTERN.findall((text or "").lower()))
+
+def strength_tokens(text: Optional[str]) -> Set[str]:
+    """Canonical strengths mentioned in ``text``: "0.5 g" and "500mg" both give "500mg"."""
+    strengths = set()
+    for value, unit in _STRENGTH_PATTERN.findall((text or "").lower()):
+        canonical_unit, factor = _STRENGTH_UNITS[unit]
+        strengths.add(f"{float(value) * factor:g}{canonical_unit}")
+    return strengths
+
+class AhoCorasick:
+    """Aho-Corasick automaton over token sequences.
+
+    Patterns are tuples of tokens, so matches always fall on word
+    boundaries ("aspirin" never matches inside "aspirinate"). Every
+    occurrence of every pattern in a token sequence is found in one pass.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, Hashable]]] = [[]]
+
+    def add(self, pattern: Tuple[str, ...], value: Hashable) -> None:
+        if not pattern:
+            return
+        node = 0
+        for token in pattern:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append((len(pattern), value))
+
+    def build(self) -> "AhoCorasick":
+        """Compute failure links; call once after the last ``add``."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+        return self
+
+    def search(self, tokens: Iterable[str]) -> Iterator[Tuple[int, int, Hashable]]:
+        """Yield ``(start, end, value)`` for every pattern occurrence, ``end`` exclusive."""
+        node = 0
+        for position, token in enumerate(tokens):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for length, value in self._outputs[node]:
+                yield position + 1 - length, position + 1, value
+
+class CatalogMatcher:
+    """Resolves free-text prescription lines to catalog medicines.
+
+    The automaton is compiled from every medicine's name, generic name and
+    brand name, and rebuilt on next use after any of those (or a strength)
+    changes. For each line the longest name match wins; strengths in the
+    line ("500mg") then pick between SKUs sharing that name, preferring
+    ones in stock.
+    """
+
+    def __init__(self):
+        self._automaton: Optional[AhoCorasick] = None
+        self._strengths: Dict[int, Set[str]] = {}
+        self._generation = 0
+        self._built_generation = -1
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    def _needs_build(self) -> bool:
+        # Changes made by other processes are picked up after catalog_matcher_max_age
+        return (
+            self._built_generation != self._generation
+            or time.monotonic() - self._built_at > settings.catalog_matcher_max_age
+        )
+
+    def _ensure_built(self, db: Session) -> Tuple[AhoCorasick, Dict[int, Set[str]]]:
+        if self._needs_build():
+            with self._lock:
+                generation = self._generation
+                if self._needs_build():
+                    automaton = AhoCorasick()
+                    strengths = {}
+                    rows = db.query(
+                        Medicine.id, Medicine.name, Medicine.generic_name, Medicine.brand_name,
+                        Medicine.strength, Medicine.dosage
+                    ).all()
+                    for medicine_id, name, generic_name, brand_name, strength, dosage in rows:
+                        for label in {tokenize(name), tokenize(generic_name), tokenize(brand_name)}:
+                            automaton.add(label, medicine_id)
+                        strengths[medicine_id] = strength_tokens(" ".join(filter(None, (name, strength, dosage))))
+                    self._automaton, self._strengths = automaton.build(), strengths
+                    self._built_generation = generation
+                    self._built_at = time.monotonic()
+        return self._automaton, self._strengths
+
+    @staticmethod
+    def _name_candidates(automaton: AhoCorasick, tokens: Tuple[str, ...]) -> Set[int]:
+        """Medicines whose name, generic or brand forms the longest match in the line."""
+        best_length = 0
+        candidates: Set[int] = set()
+        for start, end, medicine_id in automaton.search(tokens):
+            length = end - start
+            if length > best_length:
+                best_length, candidates = length, {medicine_id}
+            elif length == best_length:
+                candidates.add(medicine_id)
+        return candidates
+
+    def resolve(self, db: Session, lines: List[str]) -> List[Tuple[Optional[Medicine], bool]]:
+        """Match each line to a medicine, in one pass over the text and one query.
+
+        Returns ``(medicine or None, strength_matched)`` per line, where
+        ``strength_matched`` says the line's strength agrees with the SKU
+        (True when the line names no strength).
+        """
+        automaton, strengths = self._ensure_built(db)
+        per_line = [
+            (self._name_candidates(automaton, tokenize(line)), strength_tokens(line))
+            for line in lines
+        ]
+
+        wanted = set().union(*(candidates for candidates, _ in per_line))
+        medicines = {
+            medicine.id: medicine
+            for medicine in db.query(Medicine).filter(Medicine.id.in_(wanted))
+        } if wanted else {}
+
+        resolved = []
+        for candidates, requested in per_line:
+            ranked = []
+            for medicine_id in candidates:
+                medicine = medicines.get(medicine_id)
+                if medicine is None:
+                    continue
+                strength_matched = not requested or bool(requested & strengths.get(medicine_id, set()))
+                in_stock = bool(medicine.is_available and (medicine.stock_quantity or 0) > 0)
+                ranked.append(((strength_matched, in_stock, -medicine_id), medicine, strength_matched))
+            if ranked:
+                _, medicine, strength_matched = max(ranked, key=lambda entry: entry[0])
+                resolved.append((medicine, strength_matched))
+            else:
+                resolved.append((None, False))
+        return resolved
+
+catalog_matcher = CatalogMatcher()
+
+@event.listens_for(Medicine, "after_insert")
+@event.listens_for(Medicine, "after_delete")
+def _medicine_added_or_removed(mapper, connection, target):
+    catalog_matcher.invalidate()
+
+@event.listens_for(Medicine, "after_update")
+def _medicine_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _MATCHED_FIELDS):
+        catalog_matcher.invalidate()
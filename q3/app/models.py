@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -26,6 +26,12 @@ class PrescriptionStatus(enum.Enum):
     VERIFIED = "verified"
     REJECTED = "rejected"
 
+class ExtractionStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -38,6 +44,7 @@ class User(Base):
     role = Column(Enum(UserRole), default=UserRole.USER)
     is_active = Column(Boolean, default=True)
     is_phone_verified = Column(Boolean, default=False)
+    token_version = Column(Integer, default=0)  # bumped to revoke every token issued so far
     
     # Medical profile
     age = Column(Integer)
@@ -56,9 +63,9 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    prescriptions = relationship("Prescription", back_populates="user")
+    prescriptions = relationship("Prescription", back_populates="user", foreign_keys="Prescription.user_id")
     cart_items = relationship("CartItem", back_populates="user")
-    orders = relationship("Order", back_populates="user")
+    orders = relationship("Order", back_populates="user", foreign_keys="Order.user_id")
 
 class Category(Base):
     __tablename__ = "categories"
@@ -121,6 +128,7 @@ class Prescription(Base):
     # File information
     file_path = Column(String)
     file_name = Column(String)
+    file_hash = Column(String, ForeignKey("stored_files.sha256"), index=True, nullable=True)
     
     # Verification
     status = Column(Enum(PrescriptionStatus), default=PrescriptionStatus.PENDING)
@@ -129,12 +137,80 @@ class Prescription(Base):
     
     # Extracted medicines
     extracted_medicines = Column(Text)  # JSON string of medicine names
+    coverage_recorded_at = Column(DateTime, nullable=True)  # None: verified before coverage was recorded (see app/coverage.py)
+    
+    # Verification queue lease (see app/queueing.py)
+    claimed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="prescriptions", foreign_keys=[user_id])
+    stored_file = relationship("StoredFile")
+    
+    __table_args__ = (
+        Index("ix_prescriptions_queue", "status", "created_at"),
+    )
+
+class PrescriptionMedicine(Base):
+    """A catalog medicine a verified prescription covers, written when the prescription is verified."""
+    __tablename__ = "prescription_medicines"
+    
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), primary_key=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), primary_key=True)
+    quantity = Column(Integer, nullable=True)  # units prescribed; NULL when the prescription gives no limit
+    
+    __table_args__ = (
+        # The primary key serves lookups by prescription; this one serves lookups by medicine
+        Index("ix_prescription_medicines_medicine", "medicine_id", "prescription_id"),
+    )
+
+class StoredFile(Base):
+    """A content-addressed upload, shared by every record that references the same bytes."""
+    __tablename__ = "stored_files"
+    
+    sha256 = Column(String, primary_key=True)
+    path = Column(String)  # storage key, e.g. ab/cd/abcd...ef.png
+    size = Column(Integer)
+    ref_count = Column(Integer, default=0)
+    
+    # Set when the upload was normalized: the stored file is a recompressed copy
+    original_size = Column(Integer)
+    original_path = Column(String, nullable=True)  # kept original, if configured
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ExtractionJob(Base):
+    """A request to read medicine names off a prescription with the configured OCR engine."""
+    __tablename__ = "extraction_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), index=True)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    status = Column(Enum(ExtractionStatus), default=ExtractionStatus.QUEUED)
+    engine = Column(String)
+    attempts = Column(Integer, default=0)
+    
+    # Results
+    extracted_text = Column(Text)
+    extracted_medicines = Column(Text)  # JSON list of medicine names
+    confidence = Column(Float)
+    error = Column(Text)
+    
+    # Lease held by the worker running the job; a lapsed lease puts it back in the queue
+    claimed_by = Column(Integer, nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_extraction_jobs_queue", "status", "created_at"),
+    )
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -183,15 +259,23 @@ class Order(Base):
     payment_status = Column(String, default="pending")
     
     # Tracking
-    tracking_number = Column(String)
+    tracking_number = Column(String, index=True)
     delivery_notes = Column(Text)
     
+    # Pharmacist work queue lease
+    claimed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="orders", foreign_keys=[user_id])
     order_items = relationship("OrderItem", back_populates="order")
+    
+    __table_args__ = (
+        Index("ix_orders_queue", "status", "is_emergency", "created_at"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -207,6 +291,60 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="order_items")
     medicine = relationship("Medicine", back_populates="order_items")
 
+class ArchivedOrder(Base):
+    """Delivered or cancelled orders moved out of ``orders`` once they age out; ids are preserved."""
+    __tablename__ = "orders_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    order_number = Column(String, unique=True, index=True)
+    
+    total_amount = Column(Float)
+    delivery_fee = Column(Float, default=0.0)
+    tax_amount = Column(Float, default=0.0)
+    discount_amount = Column(Float, default=0.0)
+    
+    status = Column(Enum(OrderStatus))
+    
+    delivery_address = Column(Text)
+    delivery_phone = Column(String)
+    estimated_delivery_time = Column(DateTime)
+    actual_delivery_time = Column(DateTime)
+    delivery_partner_id = Column(Integer, ForeignKey("users.id"))
+    
+    is_emergency = Column(Boolean, default=False)
+    
+    payment_method = Column(String)
+    payment_status = Column(String, default="pending")
+    
+    tracking_number = Column(String, index=True)
+    delivery_notes = Column(Text)
+    
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    order_items = relationship("ArchivedOrderItem", back_populates="order")
+    
+    __table_args__ = (
+        Index("ix_orders_archive_user_created", "user_id", "created_at"),
+    )
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"))
+    quantity = Column(Integer)
+    price = Column(Float)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=True)
+    
+    # Relationships
+    order = relationship("ArchivedOrder", back_populates="order_items")
+    medicine = relationship("Medicine")
+
 class DeliveryPartner(Base):
     __tablename__ = "delivery_partners"
     
@@ -235,4 +373,52 @@ class Pharmacy(Base):
     is_active = Column(Boolean, default=True)
     operating_hours = Column(Text)
     
-    created_at = Column(DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_pharmacies_lat_lon", "latitude", "longitude"),
+    )
+
+class OrderRollup(Base):
+    """Order counts and revenue per time bucket, status and emergency flag."""
+    __tablename__ = "order_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    status = Column(Enum(OrderStatus), nullable=False)
+    is_emergency = Column(Boolean, nullable=False)
+    order_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+    
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "status", "is_emergency", name="uq_order_rollups_key"),
+    )
+
+class CategoryRollup(Base):
+    """Units sold and item revenue per time bucket, category, status and emergency flag."""
+    __tablename__ = "category_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    category_id = Column(Integer, nullable=False)  # 0 for uncategorised medicines
+    status = Column(Enum(OrderStatus), nullable=False)
+    is_emergency = Column(Boolean, nullable=False)
+    item_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+    
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "category_id", "status", "is_emergency",
+            name="uq_category_rollups_key"
+        ),
+    )
+
+class WorkerIdLease(Base):
+    """Snowflake worker id held by one app process (see app/ids.py)."""
+    __tablename__ = "worker_id_leases"
+    
+    worker_id = Column(Integer, primary_key=True, autoincrement=False)
+    holder = Column(String, nullable=False)  # host:pid:nonce
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,31 @@
+from typing import Callable
+from fastapi import HTTPException, status
+from app.auth import get_password_hash, verify_password
+from app.config import settings
+from app.workers import WorkerPoolBusy, register_worker_pool
+
+# bcrypt costs a few hundred milliseconds of CPU per call by design. Run in the
+# request handler it stalls every other request on the worker, so register and
+# login hash in their own process pool. Once password_hash_max_queue callers
+# are waiting, further ones are turned away instead of piling up.
+password_pool = register_worker_pool(
+    "password", settings.password_hash_workers, settings.password_hash_max_queue
+) if settings.password_hash_workers > 0 else None
+
+async def _run(fn: Callable, *args):
+    if password_pool is None:
+        return fn(*args)
+    try:
+        return await password_pool.run(fn, *args)
+    except WorkerPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests in progress, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+async def hash_password(password: str) -> str:
+    return await _run(get_password_hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, plain_password, hashed_password)
@@ -0,0 +1,79 @@
+from typing import NamedTuple, Optional
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from app.cache import TTLCache
+from app.config import settings
+from app.models import User, UserRole
+
+# Access tokens carry the user's id, role, active flag and token_version, so
+# role checks need no user lookup. A token is only accepted while its version
+# matches the user's current token_version; changing a user's role, active
+# flag or password bumps the version, revoking every token issued before.
+# Current versions are kept in a small per-process map, updated as soon as a
+# change to a user commits in this process and re-read every token_version_ttl
+# seconds to pick up changes made by other processes.
+
+class Principal(NamedTuple):
+    """The authenticated caller, as stated by a verified access token."""
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+
+_DELETED = -1
+
+_token_versions = TTLCache(settings.token_version_ttl, maxsize=settings.token_version_cache_size)
+
+# Bumped on every committed change, so a lookup that raced with it does not cache the old version
+_generation = 0
+
+def current_token_version(db: Session, user_id: int) -> Optional[int]:
+    """The user's token_version, or None if the user no longer exists."""
+    version = _token_versions.get(user_id)
+    if version is None:
+        generation = _generation
+        row = db.query(User.token_version).filter(User.id == user_id).first()
+        version = (row.token_version or 0) if row else _DELETED
+        if generation == _generation:
+            _token_versions.set(user_id, version)
+    return None if version == _DELETED else version
+
+# Changes that invalidate tokens issued before them
+_REVOKING_FIELDS = ("role", "is_active", "hashed_password")
+
+# Users whose version changed are recorded in the session at flush, and their
+# map entries only dropped once it commits: a rolled back change does not
+# reject tokens that are still valid, and the next lookup reads the committed
+# version rather than trusting the instance's copy.
+_PENDING_VERSIONS = "pending_token_versions"
+
+def _pending_versions(target) -> dict:
+    return inspect(target).session.info.setdefault(_PENDING_VERSIONS, {})
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _REVOKING_FIELDS):
+        # Incremented by the UPDATE itself, since a cached user's token_version may be stale
+        target.token_version = func.coalesce(User.token_version, 0) + 1
+        _pending_versions(target)[target.id] = None
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _pending_versions(target)[target.id] = _DELETED
+
+@event.listens_for(Session, "after_commit")
+def _publish_token_versions(session):
+    global _generation
+    pending = session.info.pop(_PENDING_VERSIONS, None)
+    if pending:
+        _generation += 1
+        for user_id, version in pending.items():
+            if version is None:
+                _token_versions.pop(user_id)
+            else:
+                _token_versions.set(user_id, version)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_token_versions(session):
+    session.info.pop(_PENDING_VERSIONS, None)
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from typing import List, Sequence
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+# Work queues over any model with ``id``, ``claimed_by`` and ``claim_expires_at`` columns.
+# A claim is a lease: it lapses at ``claim_expires_at`` unless renewed, so work
+# held by a client that went away returns to the queue on its own.
+
+def claimable(model, now: datetime):
+    """Filter for rows nobody currently holds a live lease on."""
+    return or_(model.claim_expires_at.is_(None), model.claim_expires_at < now)
+
+def claim_held_by_other(record, claimant_id: int) -> bool:
+    return (
+        record.claimed_by is not None
+        and record.claimed_by != claimant_id
+        and record.claim_expires_at is not None
+        and record.claim_expires_at >= datetime.utcnow()
+    )
+
+def claim_batch(
+    db: Session,
+    model,
+    filters: Sequence,
+    order_by: Sequence,
+    claimant_id: int,
+    limit: int,
+    lease_seconds: int
+) -> List[int]:
+    """Lease up to ``limit`` rows matching ``filters`` to ``claimant_id``, in queue order.
+
+    Leases the claimant already holds are renewed and count towards ``limit``.
+    On Postgres candidates are locked with ``FOR UPDATE SKIP LOCKED`` so
+    concurrent claimants never wait on each other; elsewhere each row is taken
+    with a conditional UPDATE and rows lost to a concurrent claim are skipped.
+    Returns the ids now held, in queue order.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+
+    held = [
+        row_id for row_id, in db.query(model.id).filter(
+            *filters,
+            model.claimed_by == claimant_id,
+            model.claim_expires_at >= now
+        ).order_by(*order_by).limit(limit)
+    ]
+    wanted = limit - len(held)
+    claimed = []
+
+    if wanted > 0:
+        candidates = db.query(model.id).filter(*filters, claimable(model, now)).order_by(*order_by)
+        if db.get_bind().dialect.name == "postgresql":
+            claimed = [row_id for row_id, in candidates.limit(wanted).with_for_update(skip_locked=True)]
+            if claimed:
+                db.execute(
+                    update(model).where(model.id.in_(claimed))
+                    .values(claimed_by=claimant_id, claim_expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                )
+        else:
+            # Over-fetch so rows taken by a concurrent claimant can be skipped
+            for row_id, in candidates.limit(wanted * 2 + 5).all():
+                result = db.execute(
+                    update(model).where(model.id == row_id, *filters, claimable(model, now))
+                    .values(claimed_by=claimant_id, claim_expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    claimed.append(row_id)
+                    if len(claimed) == wanted:
+                        break
+
+    if held:
+        db.execute(
+            update(model).where(model.id.in_(held))
+            .values(claim_expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+
+    return held + claimed
+
+def release_claim(db: Session, model, row_id: int, claimant_id: int) -> bool:
+    """Give a leased row back to the queue. Returns False if ``claimant_id`` did not hold it."""
+    result = db.execute(
+        update(model).where(model.id == row_id, model.claimed_by == claimant_id)
+        .values(claimed_by=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return bool(result.rowcount)
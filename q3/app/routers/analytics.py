@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime, timedelta
+from app.database import get_db
+from app.models import OrderStatus as OrderStatusModel
+from app.schemas import (
+    RollupGranularity, OrderStatus, OrderAnalyticsResponse,
+    CategoryAnalyticsResponse, RollupRebuildResponse
+)
+from app.dependencies import get_admin_user
+from app.principals import Principal
+from app.config import settings
+from app.analytics import (
+    order_analytics, category_analytics, rebuild_rollups,
+    to_naive_utc
+)
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+def _resolve_range(granularity: RollupGranularity, start: Optional[datetime], end: Optional[datetime]):
+    """Default and validate a query range, returning naive UTC bounds."""
+    end = to_naive_utc(end) if end else datetime.utcnow()
+    if start:
+        start = to_naive_utc(start)
+    elif granularity == RollupGranularity.HOUR:
+        start = end - timedelta(hours=settings.analytics_default_hours)
+    else:
+        start = end - timedelta(days=settings.analytics_default_days)
+    
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    
+    step = timedelta(hours=1) if granularity == RollupGranularity.HOUR else timedelta(days=1)
+    if (end - start) / step > settings.analytics_max_buckets:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range too large: at most {settings.analytics_max_buckets} {granularity.value} buckets"
+        )
+    
+    return start, end
+
+@router.get("/orders", response_model=OrderAnalyticsResponse)
+async def get_order_analytics(
+    granularity: RollupGranularity = Query(RollupGranularity.DAY),
+    start: Optional[datetime] = Query(None, description="Range start (UTC)"),
+    end: Optional[datetime] = Query(None, description="Range end (UTC), defaults to now"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    is_emergency: Optional[bool] = Query(None),
+    current_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Order counts and revenue over time, from the hourly/daily rollups (admin only)."""
+    start, end = _resolve_range(granularity, start, end)
+    
+    return order_analytics(
+        db,
+        granularity.value,
+        start,
+        end,
+        OrderStatusModel(order_status.value) if order_status else None,
+        is_emergency
+    )
+
+@router.get("/categories", response_model=CategoryAnalyticsResponse)
+async def get_category_analytics(
+    granularity: RollupGranularity = Query(RollupGranularity.DAY),
+    start: Optional[datetime] = Query(None, description="Range start (UTC)"),
+    end: Optional[datetime] = Query(None, description="Range end (UTC), defaults to now"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    is_emergency: Optional[bool] = Query(None),
+    current_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Units sold and revenue per medicine category (admin only)."""
+    start, end = _resolve_range(granularity, start, end)
+    
+    return category_analytics(
+        db,
+        granularity.value,
+        start,
+        end,
+        OrderStatusModel(order_status.value) if order_status else None,
+        is_emergency
+    )
+
+@router.post("/rebuild", response_model=RollupRebuildResponse)
+async def rebuild_analytics(
+    current_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute all rollups from order history (admin only)."""
+    return rebuild_rollups(db)
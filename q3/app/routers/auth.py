@@ -9,10 +9,10 @@ from app.schemas import (
     PhoneVerification, TokenData
 )
 from app.auth import (
-    get_password_hash, verify_password, create_access_token,
-    create_token_response, generate_phone_verification_code,
+    create_access_token, create_token_response, token_claims, generate_phone_verification_code,
     is_valid_phone_number, sanitize_input
 )
+from app.passwords import hash_password, check_password
 from app.dependencies import get_current_user, get_current_active_user
 from app.config import settings
 
@@ -41,8 +41,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Invalid phone number format"
         )
     
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         username=sanitize_input(user_data.username),
         email=user_data.email,
@@ -62,7 +64,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": db_user.username}, expires_delta=access_token_expires
+        data=token_claims(db_user), expires_delta=access_token_expires
     )
     
     return create_token_response(db_user, access_token)
@@ -71,8 +73,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """User login endpoint."""
     user = db.query(User).filter(User.username == form_data.username).first()
+    # Hand the connection back to the pool while bcrypt runs
+    db.close()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await check_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -87,7 +91,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
     return create_token_response(user, access_token)
@@ -151,6 +155,12 @@ async def update_profile(
     if user_update.zip_code is not None:
         current_user.zip_code = sanitize_input(user_update.zip_code)
     
+    if user_update.latitude is not None:
+        current_user.latitude = user_update.latitude
+    
+    if user_update.longitude is not None:
+        current_user.longitude = user_update.longitude
+    
     db.commit()
     db.refresh(current_user)
     
@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
-from app.models import CartItem, User, Medicine, Prescription, PrescriptionStatus
+from app.models import CartItem, User, Medicine, PrescriptionStatus
 from app.schemas import CartItemCreate, CartItemUpdate, CartItemResponse, CartResponse
 from app.dependencies import get_current_user, get_verified_user
 from app.auth import calculate_tax_amount
+from app.coverage import prescription_coverage, cart_coverage
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -95,6 +96,12 @@ async def add_item_to_cart(
             detail=f"Only {medicine.stock_quantity} units available in stock"
         )
     
+    # Check if item already exists in cart
+    existing_item = db.query(CartItem).filter(
+        CartItem.user_id == current_user.id,
+        CartItem.medicine_id == item_data.medicine_id
+    ).first()
+    
     # Check prescription requirement
     if medicine.prescription_required:
         if not item_data.prescription_id:
@@ -103,29 +110,28 @@ async def add_item_to_cart(
                 detail="Prescription required for this medicine"
             )
         
-        # Verify prescription exists and is verified
-        prescription = db.query(Prescription).filter(
-            Prescription.id == item_data.prescription_id,
-            Prescription.user_id == current_user.id
-        ).first()
+        # Verify prescription exists, is verified and covers this medicine
+        coverage = prescription_coverage(db, current_user.id, item_data.prescription_id, medicine.id)
         
-        if not prescription:
+        if coverage.prescription_status is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Prescription not found"
             )
         
-        if prescription.status != PrescriptionStatus.VERIFIED:
+        if coverage.prescription_status != PrescriptionStatus.VERIFIED:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Prescription must be verified before adding to cart"
             )
-    
-    # Check if item already exists in cart
-    existing_item = db.query(CartItem).filter(
-        CartItem.user_id == current_user.id,
-        CartItem.medicine_id == item_data.medicine_id
-    ).first()
+        
+        requested_quantity = item_data.quantity + (existing_item.quantity if existing_item else 0)
+        problem = coverage.problem(requested_quantity)
+        if problem:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=problem
+            )
     
     if existing_item:
         # Update quantity
@@ -201,6 +207,17 @@ async def update_cart_item(
             detail=f"Only {medicine.stock_quantity} units available in stock"
         )
     
+    # Stay within the prescribed quantity
+    if medicine.prescription_required and cart_item.prescription_id:
+        problem = prescription_coverage(
+            db, current_user.id, cart_item.prescription_id, medicine.id
+        ).problem(item_update.quantity)
+        if problem:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=problem
+            )
+    
     # Update quantity
     cart_item.quantity = item_update.quantity
     
@@ -262,6 +279,7 @@ async def validate_prescription_medicines(
         CartItem.user_id == current_user.id
     ).all()
     
+    coverage = cart_coverage(db, current_user.id)
     validation_results = []
     total_issues = 0
     
@@ -287,20 +305,14 @@ async def validate_prescription_medicines(
                 result["issues"].append("Prescription required but not provided")
                 total_issues += 1
             else:
-                prescription = db.query(Prescription).filter(
-                    Prescription.id == item.prescription_id,
-                    Prescription.user_id == current_user.id
-                ).first()
+                item_coverage = coverage[item.id]
+                if item_coverage.prescription_status is not None:
+                    result["prescription_status"] = item_coverage.prescription_status.value
                 
-                if not prescription:
-                    result["issues"].append("Prescription not found")
+                problem = item_coverage.problem(item.quantity)
+                if problem:
+                    result["issues"].append(problem)
                     total_issues += 1
-                else:
-                    result["prescription_status"] = prescription.status.value
-                    
-                    if prescription.status != PrescriptionStatus.VERIFIED:
-                        result["issues"].append("Prescription not verified")
-                        total_issues += 1
         
         # Check stock availability
         if medicine.stock_quantity < item.quantity:
@@ -3,12 +3,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_
 from typing import List, Optional
 from app.database import get_db
-from app.models import Medicine, Category, User
+from app.models import Medicine, Category
 from app.schemas import (
     MedicineCreate, MedicineUpdate, MedicineResponse, MedicineSearch,
     CategoryCreate, CategoryResponse
 )
 from app.dependencies import get_current_user, get_admin_user, get_pharmacist_user
+from app.principals import Principal
 from app.auth import extract_medicine_alternatives, format_medicine_name
 
 router = APIRouter(prefix="/medicines", tags=["medicines"])
@@ -36,7 +37,7 @@ async def get_medicines(
 async def create_medicine(
     medicine_data: MedicineCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Add new medicine (admin only)."""
     # Check if category exists
@@ -93,7 +94,7 @@ async def update_medicine(
     medicine_id: int,
     medicine_update: MedicineUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Update medicine details (admin only)."""
     medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
@@ -163,7 +164,7 @@ async def update_medicine(
 async def delete_medicine(
     medicine_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Remove medicine (admin only)."""
     medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
@@ -278,7 +279,7 @@ async def update_medicine_stock(
     medicine_id: int,
     stock_quantity: int = Query(..., ge=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_pharmacist_user)
+    current_user: Principal = Depends(get_pharmacist_user)
 ):
     """Update medicine stock levels (pharmacist only)."""
     medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
@@ -323,7 +324,7 @@ async def get_categories(
 async def create_category(
     category_data: CategoryCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Create new category (admin only)."""
     # Check for duplicate category names
@@ -350,7 +351,7 @@ async def update_category(
     category_id: int,
     category_data: CategoryCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Update category (admin only)."""
     category = db.query(Category).filter(Category.id == category_id).first()
@@ -387,7 +388,7 @@ async def update_category(
 async def delete_category(
     category_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Delete category (admin only)."""
     category = db.query(Category).filter(Category.id == category_id).first()
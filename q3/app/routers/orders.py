@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional
 from datetime import datetime, timedelta
 from app.database import get_db
 from app.models import (
@@ -8,23 +9,41 @@ from app.models import (
     OrderStatus, DeliveryPartner, Pharmacy
 )
 from app.schemas import (
-    OrderCreate, OrderResponse, OrderStatusUpdate, 
+    OrderCreate, OrderResponse, OrderQueueEntry, OrderStatusUpdate, 
     DeliveryEstimate, DeliveryPartnerResponse, 
-    EmergencyDeliveryRequest, PharmacyResponse
+    EmergencyDeliveryRequest, PharmacyResponse,
+    DeliveryQuote, DeliveryQuoteBatchRequest, DeliveryQuoteBatchResponse,
+    RoutePlanResponse, LocationPingBatch, PartnerLocationResponse
 )
 from app.dependencies import (
     get_current_user, get_user_with_address, 
     get_delivery_partner, get_pharmacist_user
 )
+from app.principals import Principal
 from app.auth import (
     generate_order_number, generate_tracking_number,
-    calculate_delivery_fee, calculate_tax_amount, 
-    calculate_delivery_time, is_emergency_medicine
+    calculate_tax_amount
 )
+from app.config import settings
+from app.delivery import (
+    find_nearest_partners, find_nearby_pharmacies,
+    estimate_delivery, estimate_delivery_batch,
+    record_partner_pings, known_partner_ids, partner_id_for_user, get_partner_position
+)
+from app.routing import route_batcher, route_planning
+from app.archive import find_order, load_order_items, user_order_history
+from app.queueing import claim_batch, claim_held_by_other, release_claim
+from app.emergency import emergency_catalog
+from app.tracking import get_tracking, get_tracking_by_number, allow_tracking_lookup, PUBLIC_TRACKING_FIELDS
+from app.coverage import cart_coverage
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 delivery_router = APIRouter(prefix="/delivery", tags=["delivery"])
 
+# Orders a pharmacist still has to prepare, and the order they are worked in
+PHARMACY_QUEUE_STATUSES = (OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PROCESSING)
+PHARMACY_QUEUE_ORDER = (Order.is_emergency.desc(), Order.created_at.asc(), Order.id.asc())
+
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
@@ -43,6 +62,9 @@ async def create_order(
             detail="Cart is empty"
         )
     
+    # Prescription coverage for every cart item, in one query
+    coverage = cart_coverage(db, current_user.id)
+    
     # Calculate totals
     subtotal = 0.0
     order_items_data = []
@@ -62,6 +84,17 @@ async def create_order(
                 detail=f"Insufficient stock for {medicine.name}. Available: {medicine.stock_quantity}"
             )
         
+        if medicine.prescription_required:
+            problem = (
+                coverage[cart_item.id].problem(cart_item.quantity)
+                if cart_item.prescription_id else "Prescription required but not provided"
+            )
+            if problem:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"{medicine.name}: {problem}"
+                )
+        
         item_total = medicine.price * cart_item.quantity
         subtotal += item_total
         
@@ -72,15 +105,23 @@ async def create_order(
             "prescription_id": cart_item.prescription_id
         })
     
-    # Calculate fees
-    delivery_distance = 5.0  # Mock distance - in production, calculate from user location
-    delivery_fee = calculate_delivery_fee(delivery_distance, order_data.is_emergency)
+    # Calculate fees from the distance to the nearest serving pharmacy
+    delivery_quote = estimate_delivery(
+        db, current_user.latitude, current_user.longitude, order_data.is_emergency
+    )
+    
+    if delivery_quote is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No pharmacy currently delivers to your location"
+        )
+    
+    delivery_fee = delivery_quote["delivery_fee"]
     tax_amount = calculate_tax_amount(subtotal)
     total_amount = subtotal + delivery_fee + tax_amount
     
     # Calculate delivery time
-    estimated_delivery_minutes = calculate_delivery_time(delivery_distance, order_data.is_emergency)
-    estimated_delivery_time = datetime.utcnow() + timedelta(minutes=estimated_delivery_minutes)
+    estimated_delivery_time = datetime.utcnow() + timedelta(minutes=delivery_quote["estimated_time"])
     
     # Create order
     order = Order(
@@ -142,19 +183,62 @@ async def get_user_orders(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's orders with delivery status."""
-    orders = db.query(Order).filter(
-        Order.user_id == current_user.id
-    ).order_by(Order.created_at.desc()).all()
+    """Get user's orders with delivery status, including archived ones."""
+    return user_order_history(db, current_user.id)
+
+@router.get("/queue", response_model=List[OrderQueueEntry])
+async def get_order_queue(
+    limit: int = Query(5, ge=1, le=settings.max_queue_batch),
+    claim: bool = Query(True, description="Lease the returned orders to the caller"),
+    current_user: Principal = Depends(get_pharmacist_user),
+    db: Session = Depends(get_db)
+):
+    """Next orders to prepare, emergencies first (pharmacist only).
+    
+    Returned orders are leased to the caller for ORDER_CLAIM_LEASE_SECONDS so
+    other pharmacists pulling the queue do not get them; polling again renews
+    the lease. With claim=false the queue is only listed.
+    """
+    filters = [Order.status.in_(PHARMACY_QUEUE_STATUSES)]
+    
+    if claim:
+        order_ids = claim_batch(
+            db, Order, filters, PHARMACY_QUEUE_ORDER,
+            current_user.id, limit, settings.order_claim_lease_seconds
+        )
+        if not order_ids:
+            return []
+        query = db.query(Order).filter(Order.id.in_(order_ids))
+    else:
+        query = db.query(Order).filter(*filters)
+    
+    return query.options(
+        selectinload(Order.order_items).joinedload(OrderItem.medicine)
+    ).order_by(*PHARMACY_QUEUE_ORDER).limit(limit).all()
+
+@router.get("/track/{tracking_number}")
+async def track_order_by_number(
+    tracking_number: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Public order tracking by tracking number, without personal details."""
+    if not allow_tracking_lookup(request.client.host if request.client else "unknown"):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many tracking lookups, please retry in a minute",
+            headers={"Retry-After": "60"}
+        )
     
-    # Load order items with medicine details
-    for order in orders:
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        for item in order_items:
-            item.medicine = db.query(Medicine).filter(Medicine.id == item.medicine_id).first()
-        order.order_items = order_items
+    tracking = get_tracking_by_number(db, tracking_number)
+    
+    if not tracking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
     
-    return orders
+    return {field: tracking[field] for field in PUBLIC_TRACKING_FIELDS}
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
@@ -163,7 +247,7 @@ async def get_order(
     db: Session = Depends(get_db)
 ):
     """Get specific order details."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = find_order(db, order_id)
     
     if not order:
         raise HTTPException(
@@ -180,11 +264,7 @@ async def get_order(
         )
     
     # Load order items with medicine details
-    order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-    for item in order_items:
-        item.medicine = db.query(Medicine).filter(Medicine.id == item.medicine_id).first()
-    
-    order.order_items = order_items
+    order.order_items = load_order_items(db, order)
     
     return order
 
@@ -192,7 +272,7 @@ async def get_order(
 async def update_order_status(
     order_id: int,
     status_update: OrderStatusUpdate,
-    current_user: User = Depends(get_pharmacist_user),
+    current_user: Principal = Depends(get_pharmacist_user),
     db: Session = Depends(get_db)
 ):
     """Update order status (pharmacy/delivery partner)."""
@@ -204,18 +284,30 @@ async def update_order_status(
             detail="Order not found"
         )
     
+    if claim_held_by_other(order, current_user.id) and current_user.role.value != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order is claimed by another pharmacist"
+        )
+    
     # Update status
-    order.status = status_update.status
+    new_status = OrderStatus(status_update.status.value)
+    order.status = new_status
+    
+    # Leaving the pharmacy queue ends the claim
+    if new_status not in PHARMACY_QUEUE_STATUSES:
+        order.claimed_by = None
+        order.claim_expires_at = None
     
     if status_update.delivery_notes:
         order.delivery_notes = status_update.delivery_notes
     
     # Set delivery time if delivered
-    if status_update.status == OrderStatus.DELIVERED:
+    if new_status == OrderStatus.DELIVERED:
         order.actual_delivery_time = datetime.utcnow()
     
     # Assign delivery partner if status is out for delivery
-    if status_update.status == OrderStatus.OUT_FOR_DELIVERY:
+    if new_status == OrderStatus.OUT_FOR_DELIVERY:
         if current_user.role.value == "delivery_partner":
             order.delivery_partner_id = current_user.id
     
@@ -231,6 +323,24 @@ async def update_order_status(
     
     return order
 
+@router.post("/{order_id}/release")
+async def release_order(
+    order_id: int,
+    current_user: Principal = Depends(get_pharmacist_user),
+    db: Session = Depends(get_db)
+):
+    """Return a claimed order to the queue (pharmacist only)."""
+    if not release_claim(db, Order, order_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You do not hold a claim on this order"
+        )
+    
+    return {
+        "message": "Order returned to the queue",
+        "order_id": order_id
+    }
+
 @router.get("/{order_id}/track")
 async def track_order(
     order_id: int,
@@ -238,59 +348,27 @@ async def track_order(
     db: Session = Depends(get_db)
 ):
     """Real-time order tracking."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    tracking = get_tracking(db, order_id)
     
-    if not order:
+    if not tracking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
     # Check if user owns this order
-    if order.user_id != current_user.id:
+    if tracking["user_id"] != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to track this order"
         )
     
-    # Calculate progress percentage
-    status_progress = {
-        OrderStatus.PENDING: 10,
-        OrderStatus.CONFIRMED: 25,
-        OrderStatus.PROCESSING: 50,
-        OrderStatus.READY: 75,
-        OrderStatus.OUT_FOR_DELIVERY: 90,
-        OrderStatus.DELIVERED: 100,
-        OrderStatus.CANCELLED: 0
-    }
-    
-    # Get delivery partner info if assigned
-    delivery_partner = None
-    if order.delivery_partner_id:
-        partner_user = db.query(User).filter(User.id == order.delivery_partner_id).first()
-        if partner_user:
-            delivery_partner = {
-                "name": partner_user.full_name,
-                "phone": partner_user.phone
-            }
-    
-    return {
-        "order_id": order.id,
-        "order_number": order.order_number,
-        "status": order.status.value,
-        "progress_percentage": status_progress.get(order.status, 0),
-        "tracking_number": order.tracking_number,
-        "estimated_delivery_time": order.estimated_delivery_time,
-        "actual_delivery_time": order.actual_delivery_time,
-        "delivery_partner": delivery_partner,
-        "delivery_notes": order.delivery_notes,
-        "is_emergency": order.is_emergency
-    }
+    return {key: value for key, value in tracking.items() if key != "user_id"}
 
 @router.post("/{order_id}/delivery-proof")
 async def upload_delivery_proof(
     order_id: int,
-    current_user: User = Depends(get_delivery_partner),
+    current_user: Principal = Depends(get_delivery_partner),
     db: Session = Depends(get_db)
 ):
     """Upload delivery confirmation (delivery partner only)."""
@@ -325,56 +403,206 @@ async def upload_delivery_proof(
 # Delivery endpoints
 @delivery_router.get("/estimate", response_model=DeliveryEstimate)
 async def get_delivery_estimate(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get delivery time estimate."""
-    # Mock distance calculation - in production, use user's location
-    distance = 5.0
+    if latitude is None or longitude is None:
+        latitude = current_user.latitude
+        longitude = current_user.longitude
     
-    # Check if user has emergency medicines in cart
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    has_emergency_medicines = False
+    delivery_quote = estimate_delivery(db, latitude, longitude)
     
-    for item in cart_items:
-        medicine = db.query(Medicine).filter(Medicine.id == item.medicine_id).first()
-        if medicine and is_emergency_medicine(medicine.name):
-            has_emergency_medicines = True
-            break
+    if delivery_quote is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No pharmacy currently delivers to this location"
+        )
     
-    regular_time = calculate_delivery_time(distance, False)
-    emergency_time = calculate_delivery_time(distance, True)
+    # Check if user has emergency medicines in cart
+    catalog = emergency_catalog.ensure_loaded(db)
+    cart_medicine_ids = db.query(CartItem.medicine_id).filter(CartItem.user_id == current_user.id).all()
+    has_emergency_medicines = any(catalog.contains(medicine_id) for medicine_id, in cart_medicine_ids)
     
     return DeliveryEstimate(
-        estimated_time=regular_time,
-        delivery_fee=calculate_delivery_fee(distance, False),
-        is_emergency_available=has_emergency_medicines
+        estimated_time=delivery_quote["estimated_time"],
+        delivery_fee=delivery_quote["delivery_fee"],
+        is_emergency_available=has_emergency_medicines,
+        distance_km=delivery_quote["distance_km"],
+        pharmacy_id=delivery_quote["pharmacy_id"]
     )
 
+@delivery_router.post("/estimate/batch", response_model=DeliveryQuoteBatchResponse)
+async def get_delivery_estimates_batch(
+    batch_request: DeliveryQuoteBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Quote delivery fee and time for many addresses at once."""
+    if len(batch_request.locations) > settings.max_batch_quotes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.max_batch_quotes} locations can be quoted per request"
+        )
+    
+    estimates = estimate_delivery_batch(db, [
+        (location.latitude, location.longitude, location.is_emergency)
+        for location in batch_request.locations
+    ])
+    
+    quotes = []
+    for location, estimate in zip(batch_request.locations, estimates):
+        quotes.append(DeliveryQuote(
+            latitude=location.latitude,
+            longitude=location.longitude,
+            is_serviceable=estimate is not None,
+            **(estimate or {})
+        ))
+    
+    return DeliveryQuoteBatchResponse(quotes=quotes)
+
 @delivery_router.get("/partners", response_model=List[DeliveryPartnerResponse])
 async def get_delivery_partners(
+    order_id: Optional[int] = Query(None, description="Find partners near this order's delivery location"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(5, ge=1, le=settings.max_partner_results),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get available delivery partners."""
-    partners = db.query(DeliveryPartner).filter(
-        DeliveryPartner.is_available == True
-    ).limit(5).all()
-    
-    partner_responses = []
-    for partner in partners:
-        user = db.query(User).filter(User.id == partner.user_id).first()
-        if user:
-            partner_responses.append(DeliveryPartnerResponse(
-                id=partner.id,
-                user_id=partner.user_id,
-                vehicle_type=partner.vehicle_type,
-                is_available=partner.is_available,
-                rating=partner.rating,
-                distance=2.5  # Mock distance
-            ))
-    
-    return partner_responses
+    """Get the nearest available delivery partners."""
+    if latitude is None or longitude is None:
+        location_owner = current_user
+        
+        if order_id is not None:
+            order = db.query(Order).filter(Order.id == order_id).first()
+            
+            if not order:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Order not found"
+                )
+            
+            if (order.user_id != current_user.id and 
+                current_user.role.value not in ['pharmacist', 'admin', 'delivery_partner']):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Not authorized to view this order"
+                )
+            
+            location_owner = order.user
+        
+        latitude = location_owner.latitude
+        longitude = location_owner.longitude
+    
+    if latitude is None or longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Delivery location unknown. Please add latitude and longitude to your profile."
+        )
+    
+    nearest = find_nearest_partners(db, latitude, longitude, limit)
+    
+    return [
+        DeliveryPartnerResponse(**partner, distance=round(distance, 2))
+        for distance, partner in nearest
+    ]
+
+@delivery_router.post("/location")
+async def report_partner_location(
+    ping_batch: LocationPingBatch,
+    current_user: Principal = Depends(get_delivery_partner),
+    db: Session = Depends(get_db)
+):
+    """Ingest a batch of GPS pings (delivery partner, or admin gateway with partner_id)."""
+    if len(ping_batch.pings) > settings.max_location_pings:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.max_location_pings} pings can be sent per request"
+        )
+    
+    own_partner_id = None
+    if current_user.role.value == "delivery_partner":
+        own_partner_id = partner_id_for_user(db, current_user.id)
+        if own_partner_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Delivery partner profile not found"
+            )
+    
+    pings_by_partner = {}
+    for ping in ping_batch.pings:
+        partner_id = ping.partner_id if ping.partner_id is not None else own_partner_id
+        
+        if partner_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="partner_id is required for each ping"
+            )
+        
+        if own_partner_id is not None and partner_id != own_partner_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Cannot report location for another delivery partner"
+            )
+        
+        pings_by_partner.setdefault(partner_id, []).append(
+            (ping.recorded_at, ping.latitude, ping.longitude)
+        )
+    
+    unknown = set(pings_by_partner) - known_partner_ids(db, pings_by_partner)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown delivery partner ids: {sorted(unknown)}"
+        )
+    
+    partners_moved = sum(
+        record_partner_pings(partner_id, pings)
+        for partner_id, pings in pings_by_partner.items()
+    )
+    
+    return {
+        "accepted": len(ping_batch.pings),
+        "partners_moved": partners_moved
+    }
+
+@delivery_router.get("/partners/{partner_id}/location", response_model=PartnerLocationResponse)
+async def get_partner_location(
+    partner_id: int,
+    current_user: Principal = Depends(get_delivery_partner),
+    db: Session = Depends(get_db)
+):
+    """Get a delivery partner's live position."""
+    position = get_partner_position(db, partner_id)
+    
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Partner location not available"
+        )
+    
+    recorded_at, latitude, longitude = position
+    return PartnerLocationResponse(
+        partner_id=partner_id,
+        latitude=latitude,
+        longitude=longitude,
+        recorded_at=recorded_at
+    )
+
+@delivery_router.get("/routes", response_model=RoutePlanResponse)
+async def get_delivery_routes(
+    refresh: bool = Query(False, description="Replan now instead of returning the last plan"),
+    current_user: Principal = Depends(get_delivery_partner)
+):
+    """Get planned multi-stop routes for READY orders (delivery partner only)."""
+    if refresh or route_batcher.planned_at is None:
+        # Planning is CPU-bound; run it in a worker thread with its own session
+        await asyncio.to_thread(route_planning.run_once)
+    
+    return route_batcher.snapshot()
 
 @delivery_router.post("/emergency")
 async def create_emergency_delivery(
@@ -384,21 +612,9 @@ async def create_emergency_delivery(
 ):
     """Create emergency medicine delivery request."""
     # Check if medicines are available for emergency delivery
-    available_medicines = []
-    unavailable_medicines = []
-    
-    for medicine_name in emergency_request.medicine_names:
-        medicine = db.query(Medicine).filter(
-            Medicine.name.ilike(f"%{medicine_name}%")
-        ).first()
-        
-        if medicine and medicine.is_available and medicine.stock_quantity > 0:
-            if is_emergency_medicine(medicine.name):
-                available_medicines.append(medicine)
-            else:
-                unavailable_medicines.append(medicine_name)
-        else:
-            unavailable_medicines.append(medicine_name)
+    available_medicines, unavailable_medicines = emergency_catalog.ensure_loaded(db).resolve(
+        emergency_request.medicine_names
+    )
     
     if not available_medicines:
         raise HTTPException(
@@ -406,9 +622,17 @@ async def create_emergency_delivery(
             detail="No emergency medicines available"
         )
     
+    delivery_quote = estimate_delivery(db, current_user.latitude, current_user.longitude, True)
+    
+    if delivery_quote is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No pharmacy currently delivers to your location"
+        )
+    
     # Create emergency order
-    subtotal = sum(medicine.price for medicine in available_medicines)
-    delivery_fee = calculate_delivery_fee(5.0, True)  # Emergency delivery fee
+    subtotal = sum(medicine["price"] for medicine in available_medicines)
+    delivery_fee = delivery_quote["delivery_fee"]  # Emergency delivery fee
     tax_amount = calculate_tax_amount(subtotal)
     total_amount = subtotal + delivery_fee + tax_amount
     
@@ -421,7 +645,7 @@ async def create_emergency_delivery(
         status=OrderStatus.CONFIRMED,
         delivery_address=emergency_request.delivery_address,
         delivery_phone=emergency_request.delivery_phone,
-        estimated_delivery_time=datetime.utcnow() + timedelta(minutes=10),
+        estimated_delivery_time=datetime.utcnow() + timedelta(minutes=delivery_quote["estimated_time"]),
         is_emergency=True,
         payment_method="cash_on_delivery",
         tracking_number=generate_tracking_number(),
@@ -436,9 +660,9 @@ async def create_emergency_delivery(
     for medicine in available_medicines:
         order_item = OrderItem(
             order_id=order.id,
-            medicine_id=medicine.id,
+            medicine_id=medicine["id"],
             quantity=1,
-            price=medicine.price
+            price=medicine["price"]
         )
         db.add(order_item)
     
@@ -448,7 +672,7 @@ async def create_emergency_delivery(
         "order_id": order.id,
         "order_number": order.order_number,
         "estimated_delivery_time": order.estimated_delivery_time,
-        "available_medicines": [m.name for m in available_medicines],
+        "available_medicines": [m["name"] for m in available_medicines],
         "unavailable_medicines": unavailable_medicines,
         "total_amount": total_amount,
         "tracking_number": order.tracking_number
@@ -456,16 +680,29 @@ async def create_emergency_delivery(
 
 @delivery_router.get("/nearby-pharmacies", response_model=List[PharmacyResponse])
 async def get_nearby_pharmacies(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(settings.pharmacy_search_radius_km, gt=0, le=100),
+    limit: int = Query(5, ge=1, le=50),
+    open_now: bool = Query(False, description="Only pharmacies open right now"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Find nearby pharmacies with stock."""
-    pharmacies = db.query(Pharmacy).filter(
-        Pharmacy.is_active == True
-    ).limit(5).all()
+    """Find nearby pharmacies sorted by distance."""
+    if latitude is None or longitude is None:
+        latitude = current_user.latitude
+        longitude = current_user.longitude
+    
+    if latitude is None or longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Delivery location unknown. Please add latitude and longitude to your profile."
+        )
+    
+    nearby = find_nearby_pharmacies(db, latitude, longitude, radius_km, limit, open_now)
     
     pharmacy_responses = []
-    for pharmacy in pharmacies:
+    for distance, pharmacy, is_open in nearby:
         pharmacy_responses.append(PharmacyResponse(
             id=pharmacy.id,
             name=pharmacy.name,
@@ -474,7 +711,8 @@ async def get_nearby_pharmacies(
             email=pharmacy.email,
             is_active=pharmacy.is_active,
             operating_hours=pharmacy.operating_hours,
-            distance=2.5  # Mock distance
+            distance=round(distance, 2),
+            is_open=is_open
         ))
     
     return pharmacy_responses 
\ No newline at end of file
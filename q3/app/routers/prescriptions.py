@@ -1,23 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, File, UploadFile, Form, Query, Request
+from fastapi.responses import FileResponse
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import os
 import json
 from datetime import datetime
 from app.database import get_db
-from app.models import Prescription, User, Medicine, PrescriptionStatus
-from app.schemas import PrescriptionCreate, PrescriptionResponse, PrescriptionVerify
+from app.models import Prescription, User, Medicine, PrescriptionStatus, ExtractionJob
+from app.schemas import (
+    PrescriptionCreate, PrescriptionResponse, PrescriptionVerify,
+    PrescriptionQueuePage, PreviewSize, PreviewFormat,
+    ExtractionJobResponse, ExtractionBatchResponse
+)
 from app.dependencies import get_current_user, get_pharmacist_user
+from app.principals import Principal
 from app.config import settings
 from app.auth import sanitize_input
+from app.matching import catalog_matcher
+from app.coverage import set_prescription_medicines, clear_prescription_medicines, matched_medicines
+from app.queueing import claim_batch, claimable, claim_held_by_other, release_claim
+from app.storage import store_upload, release_file, file_location
+from app.storage_backends import get_storage_backend
+from app.downloads import stored_file_response
+from app.extraction import (
+    submit_extraction, submit_pending_extractions, latest_extraction, dispatch_extractions
+)
+from app.imaging import (
+    preview_pipeline, preview_key, preview_path, can_preview, PREVIEW_FORMATS
+)
 
 router = APIRouter(prefix="/prescriptions", tags=["prescriptions"])
 
+# Verification queue order; served by ix_prescriptions_queue (status, created_at)
+PRESCRIPTION_QUEUE_ORDER = (Prescription.created_at.asc(), Prescription.id.asc())
+
 # Ensure upload directory exists
 os.makedirs(settings.upload_dir, exist_ok=True)
 
 @router.post("/upload", response_model=PrescriptionResponse)
 async def upload_prescription(
+    background_tasks: BackgroundTasks,
     doctor_name: str = Form(...),
     hospital_name: Optional[str] = Form(None),
     prescription_date: str = Form(...),
@@ -36,14 +60,6 @@ async def upload_prescription(
             detail="Invalid file type. Only JPG, PNG, and PDF files are allowed."
         )
     
-    # Validate file size
-    file_content = await file.read()
-    if len(file_content) > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File too large. Maximum size is 10MB."
-        )
-    
     # Parse prescription date
     try:
         prescription_date_obj = datetime.strptime(prescription_date, "%Y-%m-%d")
@@ -53,15 +69,11 @@ async def upload_prescription(
             detail="Invalid date format. Use YYYY-MM-DD."
         )
     
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"prescription_{current_user.id}_{timestamp}{file_extension}"
-    file_path = os.path.join(settings.upload_dir, filename)
-    
-    # Save file
+    # Stream file into content-addressed storage; identical files are stored once
     try:
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        stored_file = await store_upload(db, file, file_extension)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -74,15 +86,30 @@ async def upload_prescription(
         doctor_name=sanitize_input(doctor_name),
         hospital_name=sanitize_input(hospital_name) if hospital_name else None,
         prescription_date=prescription_date_obj,
-        file_path=file_path,
+        file_path=stored_file.path,
         file_name=file.filename,
+        file_hash=stored_file.sha256,
         status=PrescriptionStatus.PENDING
     )
     
-    db.add(db_prescription)
-    db.commit()
+    try:
+        db.add(db_prescription)
+        db.commit()
+    except Exception:
+        db.rollback()
+        await asyncio.to_thread(release_file, db, stored_file.sha256)
+        raise
     db.refresh(db_prescription)
     
+    # Render previews for pharmacists once the response is sent
+    if can_preview(stored_file.path):
+        background_tasks.add_task(
+            preview_pipeline.generate_in_background,
+            preview_key(stored_file.sha256, stored_file.path),
+            get_storage_backend(),
+            stored_file.path
+        )
+    
     return db_prescription
 
 @router.get("/", response_model=List[PrescriptionResponse])
@@ -124,11 +151,106 @@ async def get_prescription(
     
     return prescription
 
+@router.get("/{prescription_id}/preview")
+async def get_prescription_preview(
+    prescription_id: int,
+    size: PreviewSize = Query(PreviewSize.REVIEW),
+    image_format: PreviewFormat = Query(PreviewFormat.WEBP, alias="format"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Downscaled JPEG/WebP rendition of a prescription image, generated on first use if needed."""
+    prescription = db.query(Prescription).filter(
+        Prescription.id == prescription_id
+    ).first()
+    
+    if not prescription:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Prescription not found"
+        )
+    
+    # Check if user owns this prescription or is a pharmacist
+    if (prescription.user_id != current_user.id and 
+        current_user.role.value not in ['pharmacist', 'admin']):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this prescription"
+        )
+    
+    backend, file_key = file_location(prescription)
+    if not can_preview(file_key):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Previews are only available for JPG and PNG prescriptions"
+        )
+    
+    key = preview_key(prescription.file_hash, prescription.file_path)
+    path = preview_path(key, size.value, image_format.value)
+    
+    if not os.path.exists(path):
+        try:
+            await preview_pipeline.ensure(key, backend, file_key)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Prescription image could not be processed"
+            )
+    
+    return FileResponse(
+        path,
+        media_type=PREVIEW_FORMATS[image_format.value][2],
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+@router.get("/{prescription_id}/file")
+async def get_prescription_file(
+    prescription_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download the prescription file (owner, pharmacist or admin)."""
+    prescription = db.query(Prescription).filter(
+        Prescription.id == prescription_id
+    ).first()
+    
+    if not prescription:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Prescription not found"
+        )
+    
+    # Check if user owns this prescription or is a pharmacist
+    if (prescription.user_id != current_user.id and 
+        current_user.role.value not in ['pharmacist', 'admin']):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this prescription"
+        )
+    
+    # Content-addressed files never change, so their hash is a strong ETag
+    backend, file_key = file_location(prescription)
+    response = await stored_file_response(
+        request,
+        backend,
+        file_key,
+        prescription.file_name or os.path.basename(file_key),
+        etag=prescription.file_hash
+    )
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Prescription file not found"
+        )
+    
+    return response
+
 @router.put("/{prescription_id}/verify", response_model=PrescriptionResponse)
 async def verify_prescription(
     prescription_id: int,
     verification_data: PrescriptionVerify,
-    current_user: User = Depends(get_pharmacist_user),
+    current_user: Principal = Depends(get_pharmacist_user),
     db: Session = Depends(get_db)
 ):
     """Verify prescription (pharmacist only)."""
@@ -142,14 +264,44 @@ async def verify_prescription(
             detail="Prescription not found"
         )
     
+    if claim_held_by_other(prescription, current_user.id) and current_user.role.value != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Prescription is claimed by another pharmacist"
+        )
+    
+    if verification_data.medicines:
+        medicine_ids = {line.medicine_id for line in verification_data.medicines}
+        known_ids = {medicine_id for (medicine_id,) in db.query(Medicine.id).filter(Medicine.id.in_(medicine_ids))}
+        if medicine_ids - known_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown medicine ids: {sorted(medicine_ids - known_ids)}"
+            )
+    
     # Update prescription status
-    prescription.status = verification_data.status
+    prescription.status = PrescriptionStatus(verification_data.status.value)
     prescription.verified_by = current_user.id
+    
+    # Leaving the verification queue ends the claim
+    if prescription.status != PrescriptionStatus.PENDING:
+        prescription.claimed_by = None
+        prescription.claim_expires_at = None
     prescription.verification_notes = sanitize_input(verification_data.verification_notes) if verification_data.verification_notes else None
     
     if verification_data.extracted_medicines:
         prescription.extracted_medicines = verification_data.extracted_medicines
     
+    # Record the catalog medicines a verified prescription covers, for cart checks
+    if prescription.status == PrescriptionStatus.VERIFIED:
+        if verification_data.medicines is not None:
+            prescribed = [(line.medicine_id, line.quantity) for line in verification_data.medicines]
+        else:
+            prescribed = matched_medicines(db, prescription.extracted_medicines)
+        set_prescription_medicines(db, prescription, prescribed)
+    else:
+        clear_prescription_medicines(db, prescription.id)
+    
     db.commit()
     db.refresh(prescription)
     
@@ -192,14 +344,10 @@ async def get_prescription_medicines(
         # Parse extracted medicines JSON
         medicine_names = json.loads(prescription.extracted_medicines)
         
-        # Find medicines in database
+        # Match every line against the catalog in one pass
         medicines = []
-        for medicine_name in medicine_names:
-            # Try to find exact match first
-            medicine = db.query(Medicine).filter(
-                Medicine.name.ilike(f"%{medicine_name}%")
-            ).first()
-            
+        resolved = catalog_matcher.resolve(db, [str(name) for name in medicine_names])
+        for medicine_name, (medicine, strength_matched) in zip(medicine_names, resolved):
             if medicine:
                 medicines.append({
                     "id": medicine.id,
@@ -209,7 +357,9 @@ async def get_prescription_medicines(
                     "price": medicine.price,
                     "stock_quantity": medicine.stock_quantity,
                     "prescription_required": medicine.prescription_required,
-                    "is_available": medicine.is_available
+                    "is_available": medicine.is_available,
+                    "requested_name": medicine_name,
+                    "strength_matched": strength_matched
                 })
             else:
                 # Medicine not found in database
@@ -239,13 +389,18 @@ async def get_prescription_medicines(
             detail="Invalid medicine data format"
         )
 
-@router.post("/{prescription_id}/extract-medicines")
+@router.post(
+    "/{prescription_id}/extract-medicines",
+    response_model=ExtractionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def extract_medicines_from_prescription(
     prescription_id: int,
-    current_user: User = Depends(get_pharmacist_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_pharmacist_user),
     db: Session = Depends(get_db)
 ):
-    """Extract medicines from prescription (pharmacist only)."""
+    """Queue OCR extraction of medicines (pharmacist only); poll GET /{id}/extraction for the result."""
     prescription = db.query(Prescription).filter(
         Prescription.id == prescription_id
     ).first()
@@ -256,43 +411,120 @@ async def extract_medicines_from_prescription(
             detail="Prescription not found"
         )
     
-    # Mock OCR/AI extraction - in production, use actual OCR service
-    # This would typically involve image processing and AI/ML to extract medicine names
-    mock_extracted_medicines = [
-        "Paracetamol 500mg",
-        "Ibuprofen 400mg",
-        "Amoxicillin 250mg"
-    ]
-    
-    # Save extracted medicines
-    prescription.extracted_medicines = json.dumps(mock_extracted_medicines)
-    prescription.status = PrescriptionStatus.VERIFIED
-    prescription.verified_by = current_user.id
-    prescription.verification_notes = "Medicines extracted automatically"
+    job = submit_extraction(db, prescription.id, current_user.id)
+    background_tasks.add_task(dispatch_extractions)
     
-    db.commit()
-    db.refresh(prescription)
+    return job
+
+@router.get("/{prescription_id}/extraction", response_model=ExtractionJobResponse)
+async def get_prescription_extraction(
+    prescription_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status and result of the latest extraction job for a prescription."""
+    prescription = db.query(Prescription).filter(
+        Prescription.id == prescription_id
+    ).first()
     
-    return {
-        "prescription_id": prescription_id,
-        "extracted_medicines": mock_extracted_medicines,
-        "status": prescription.status.value,
-        "message": "Medicines extracted successfully"
-    }
+    if not prescription:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Prescription not found"
+        )
+    
+    # Check if user owns this prescription or is a pharmacist
+    if (prescription.user_id != current_user.id and 
+        current_user.role.value not in ['pharmacist', 'admin']):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this prescription"
+        )
+    
+    job = latest_extraction(db, prescription_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No extraction has been requested for this prescription"
+        )
+    
+    return job
+
+@router.post(
+    "/pending/extract",
+    response_model=ExtractionBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def extract_pending_prescriptions(
+    background_tasks: BackgroundTasks,
+    limit: int = Query(50, ge=1, le=settings.max_extraction_batch),
+    current_user: Principal = Depends(get_pharmacist_user),
+    db: Session = Depends(get_db)
+):
+    """Queue extraction for the oldest pending prescriptions not yet processed (pharmacist only)."""
+    jobs = submit_pending_extractions(db, current_user.id, limit)
+    if jobs:
+        background_tasks.add_task(dispatch_extractions)
+    
+    return {"submitted": len(jobs), "jobs": jobs}
 
-@router.get("/pending/verify")
+@router.get("/pending/verify", response_model=PrescriptionQueuePage)
 async def get_pending_prescriptions(
-    current_user: User = Depends(get_pharmacist_user),
+    limit: int = Query(10, ge=1, le=settings.max_prescription_queue_batch),
+    offset: int = Query(0, ge=0, description="Only used with claim=false"),
+    claim: bool = Query(True, description="Lease the returned prescriptions to the caller"),
+    current_user: Principal = Depends(get_pharmacist_user),
     db: Session = Depends(get_db)
 ):
-    """Get pending prescriptions for verification (pharmacist only)."""
-    pending_prescriptions = db.query(Prescription).filter(
-        Prescription.status == PrescriptionStatus.PENDING
-    ).order_by(Prescription.created_at.asc()).all()
+    """Pending prescriptions to verify, oldest first (pharmacist only).
+    
+    Returned prescriptions are leased to the caller for
+    PRESCRIPTION_CLAIM_LEASE_SECONDS and hidden from other pharmacists until
+    the lease lapses; polling again renews it. With claim=false the queue is
+    only listed, a page at a time, without prescriptions others hold.
+    """
+    filters = [Prescription.status == PrescriptionStatus.PENDING]
+    
+    if claim:
+        prescription_ids = claim_batch(
+            db, Prescription, filters, PRESCRIPTION_QUEUE_ORDER,
+            current_user.id, limit, settings.prescription_claim_lease_seconds
+        )
+        pending_prescriptions = db.query(Prescription).filter(
+            Prescription.id.in_(prescription_ids)
+        ).order_by(*PRESCRIPTION_QUEUE_ORDER).all() if prescription_ids else []
+    else:
+        visible = or_(
+            claimable(Prescription, datetime.utcnow()),
+            Prescription.claimed_by == current_user.id
+        )
+        pending_prescriptions = db.query(Prescription).filter(
+            *filters, visible
+        ).order_by(*PRESCRIPTION_QUEUE_ORDER).offset(offset).limit(limit).all()
+    
+    total_pending = db.query(func.count(Prescription.id)).filter(*filters).scalar()
     
     return {
         "pending_prescriptions": pending_prescriptions,
-        "total_pending": len(pending_prescriptions)
+        "total_pending": total_pending
+    }
+
+@router.post("/{prescription_id}/release")
+async def release_prescription(
+    prescription_id: int,
+    current_user: Principal = Depends(get_pharmacist_user),
+    db: Session = Depends(get_db)
+):
+    """Return a claimed prescription to the verification queue (pharmacist only)."""
+    if not release_claim(db, Prescription, prescription_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You do not hold a claim on this prescription"
+        )
+    
+    return {
+        "message": "Prescription returned to the queue",
+        "prescription_id": prescription_id
     }
 
 @router.delete("/{prescription_id}")
@@ -319,15 +551,25 @@ async def delete_prescription(
             detail="Not authorized to delete this prescription"
         )
     
-    # Delete file from storage
-    try:
-        if prescription.file_path and os.path.exists(prescription.file_path):
-            os.remove(prescription.file_path)
-    except Exception:
-        pass  # File deletion failed, but continue with database deletion
+    file_hash = prescription.file_hash
+    legacy_file_path = prescription.file_path if not file_hash else None
     
     # Delete from database
+    db.query(ExtractionJob).filter(
+        ExtractionJob.prescription_id == prescription.id
+    ).delete(synchronize_session=False)
+    clear_prescription_medicines(db, prescription.id)
     db.delete(prescription)
     db.commit()
     
+    # Release the stored file; it is removed with its last reference
+    if file_hash:
+        await asyncio.to_thread(release_file, db, file_hash)
+    else:
+        try:
+            if legacy_file_path and os.path.exists(legacy_file_path):
+                os.remove(legacy_file_path)
+        except Exception:
+            pass  # File deletion failed, but the record is already gone
+    
     return {"message": "Prescription deleted successfully"} 
\ No newline at end of file
@@ -0,0 +1,219 @@
+import math
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from app.background import register_periodic_task
+from app.config import settings
+from app.delivery import nearest_serving_pharmacy
+from app.geo import GridIndex, haversine_km
+from app.models import Order, OrderStatus, Pharmacy, User
+
+Point = Tuple[float, float]
+
+def _distance_matrix(points: Sequence[Point]) -> List[List[float]]:
+    size = len(points)
+    matrix = [[0.0] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            distance = haversine_km(points[i][0], points[i][1], points[j][0], points[j][1])
+            matrix[i][j] = matrix[j][i] = distance
+    return matrix
+
+def nearest_neighbour_path(matrix: List[List[float]], start: int = 0) -> List[int]:
+    """Greedy open path visiting every node, starting at ``start``."""
+    unvisited = set(range(len(matrix)))
+    unvisited.discard(start)
+    path = [start]
+    current = start
+    while unvisited:
+        current = min(unvisited, key=lambda node: matrix[current][node])
+        unvisited.discard(current)
+        path.append(current)
+    return path
+
+def two_opt(matrix: List[List[float]], path: List[int], max_passes: int = 10) -> List[int]:
+    """Improve an open path with a fixed start by reversing segments while it helps."""
+    path = list(path)
+    last = len(path) - 1
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, last):
+            a, b = path[i - 1], path[i]
+            for j in range(i + 1, last + 1):
+                c = path[j]
+                if j == last:
+                    delta = matrix[a][c] - matrix[a][b]
+                else:
+                    d = path[j + 1]
+                    delta = matrix[a][c] + matrix[b][d] - matrix[a][b] - matrix[c][d]
+                if delta < -1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    b = path[i]
+                    improved = True
+        if not improved:
+            break
+    return path
+
+def build_route(origin: Point, stops: Sequence[Point], max_passes: int = 10) -> Tuple[List[int], List[float]]:
+    """Order ``stops`` for a trip leaving ``origin``.
+
+    Returns the visiting order as indexes into ``stops`` and the length of
+    each leg in kilometres.
+    """
+    matrix = _distance_matrix([origin] + list(stops))
+    path = two_opt(matrix, nearest_neighbour_path(matrix), max_passes)
+    legs = [matrix[path[i]][path[i + 1]] for i in range(len(path) - 1)]
+    return [node - 1 for node in path[1:]], legs
+
+def _density_cell_size(stops: Sequence[Point], points_per_cell: int = 4) -> float:
+    """Grid cell size giving roughly ``points_per_cell`` stops per occupied cell."""
+    latitudes = [stop[0] for stop in stops]
+    longitudes = [stop[1] for stop in stops]
+    area = (max(latitudes) - min(latitudes)) * (max(longitudes) - min(longitudes))
+    return max(0.0005, math.sqrt(area * points_per_cell / len(stops)))
+
+def cluster_stops(
+    stops: Sequence[Point],
+    max_stops: int,
+    radius_km: float,
+    cell_size_deg: Optional[float] = None
+) -> List[List[int]]:
+    """Greedily group stops by proximity.
+
+    Stops are taken as seeds in the given order (callers pass oldest first);
+    each seed claims up to ``max_stops - 1`` unassigned neighbours within
+    ``radius_km``.
+    """
+    if not stops:
+        return []
+    index = GridIndex(cell_size_deg=cell_size_deg or _density_cell_size(stops))
+    for position, (latitude, longitude) in enumerate(stops):
+        index.upsert(position, latitude, longitude)
+
+    groups = []
+    for seed, (latitude, longitude) in enumerate(stops):
+        if seed not in index:
+            continue
+        index.remove(seed)
+        group = [seed]
+        if max_stops > 1:
+            for _, neighbour, _ in index.nearest(latitude, longitude, max_stops - 1, radius_km):
+                index.remove(neighbour)
+                group.append(neighbour)
+        groups.append(group)
+    return groups
+
+def plan_routes(
+    origin: Point,
+    stops: Sequence[Point],
+    max_stops: int,
+    radius_km: float,
+    max_passes: int = 10
+) -> List[Tuple[List[int], List[float]]]:
+    """Cluster stops served from one origin and build a multi-stop route per cluster."""
+    routes = []
+    for group in cluster_stops(stops, max_stops, radius_km):
+        order, legs = build_route(origin, [stops[i] for i in group], max_passes)
+        routes.append(([group[i] for i in order], legs))
+    return routes
+
+class RouteBatcher:
+    """Periodically groups READY orders into multi-stop delivery routes.
+
+    Emergency orders are never batched; each gets its own single-stop route
+    listed ahead of the batched ones.
+    """
+
+    def __init__(self):
+        self.routes: List[dict] = []
+        self.unroutable_order_ids: List[int] = []
+        self.planned_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        # Held for a whole replan, so concurrent refreshes queue instead of all planning at once
+        self._planning = threading.Lock()
+
+    def plan(self, db: Session) -> List[dict]:
+        """Rebuild the route plan from the current READY orders."""
+        with self._planning:
+            return self._plan(db)
+
+    def _plan(self, db: Session) -> List[dict]:
+        rows = db.query(Order, User.latitude, User.longitude).join(
+            User, Order.user_id == User.id
+        ).filter(
+            Order.status == OrderStatus.READY,
+            Order.delivery_partner_id.is_(None)
+        ).order_by(Order.created_at.asc()).all()
+
+        pharmacies = {
+            pharmacy.id: (pharmacy.latitude, pharmacy.longitude)
+            for pharmacy in db.query(Pharmacy).filter(Pharmacy.is_active == True).all()
+        }
+
+        emergency = []
+        unroutable = []
+        by_pharmacy: Dict[int, List[Tuple[Order, Point]]] = {}
+        for order, latitude, longitude in rows:
+            serving = None
+            if latitude is not None and longitude is not None:
+                serving = nearest_serving_pharmacy(db, latitude, longitude)
+            if serving is None or serving["pharmacy_id"] not in pharmacies:
+                unroutable.append(order.id)
+            elif order.is_emergency:
+                emergency.append((serving["pharmacy_id"], order, (latitude, longitude)))
+            else:
+                by_pharmacy.setdefault(serving["pharmacy_id"], []).append((order, (latitude, longitude)))
+
+        routes = []
+        for pharmacy_id, order, point in emergency:
+            leg = haversine_km(*pharmacies[pharmacy_id], *point)
+            routes.append(self._route(len(routes) + 1, pharmacy_id, True, [(order, point)], [leg]))
+
+        for pharmacy_id, entries in by_pharmacy.items():
+            planned = plan_routes(
+                pharmacies[pharmacy_id],
+                [point for _, point in entries],
+                settings.route_max_stops,
+                settings.route_cluster_radius_km,
+                settings.route_two_opt_passes
+            )
+            for visit_order, legs in planned:
+                routes.append(self._route(
+                    len(routes) + 1, pharmacy_id, False, [entries[i] for i in visit_order], legs
+                ))
+
+        with self._lock:
+            self.routes = routes
+            self.unroutable_order_ids = unroutable
+            self.planned_at = datetime.utcnow()
+        return routes
+
+    def _route(self, number: int, pharmacy_id: int, is_emergency: bool, entries, legs) -> dict:
+        return {
+            "route_id": f"R{number}",
+            "pharmacy_id": pharmacy_id,
+            "is_emergency": is_emergency,
+            "total_distance_km": round(sum(legs), 2),
+            "stops": [
+                {
+                    "order_id": order.id,
+                    "order_number": order.order_number,
+                    "latitude": point[0],
+                    "longitude": point[1],
+                    "leg_distance_km": round(leg, 2)
+                }
+                for (order, point), leg in zip(entries, legs)
+            ]
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "planned_at": self.planned_at,
+                "routes": list(self.routes),
+                "unroutable_order_ids": list(self.unroutable_order_ids)
+            }
+
+route_batcher = RouteBatcher()
+route_planning = register_periodic_task("route_batching", route_batcher.plan, settings.route_batch_interval_seconds)
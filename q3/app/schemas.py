@@ -52,6 +52,8 @@ class UserUpdate(BaseModel):
     city: Optional[str] = None
     state: Optional[str] = None
     zip_code: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class UserResponse(UserBase):
     id: int
@@ -62,6 +64,8 @@ class UserResponse(UserBase):
     city: Optional[str] = None
     state: Optional[str] = None
     zip_code: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
@@ -80,6 +84,11 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    # Claims of tokens issued since token versions were added; None on older tokens
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    token_version: Optional[int] = None
 
 # Medicine schemas
 class CategoryBase(BaseModel):
@@ -162,6 +171,7 @@ class PrescriptionResponse(BaseModel):
     prescription_date: datetime
     file_path: Optional[str] = None
     file_name: Optional[str] = None
+    file_hash: Optional[str] = None
     status: PrescriptionStatus
     verification_notes: Optional[str] = None
     extracted_medicines: Optional[str] = None
@@ -171,10 +181,59 @@ class PrescriptionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PrescriptionQueueEntry(PrescriptionResponse):
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+
+class PrescriptionQueuePage(BaseModel):
+    pending_prescriptions: List[PrescriptionQueueEntry]
+    total_pending: int
+
+class PreviewSize(str, Enum):
+    THUMB = "thumb"
+    REVIEW = "review"
+
+class PreviewFormat(str, Enum):
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+class PrescribedMedicine(BaseModel):
+    medicine_id: int
+    quantity: Optional[int] = Field(None, gt=0)
+
 class PrescriptionVerify(BaseModel):
     status: PrescriptionStatus
     verification_notes: Optional[str] = None
     extracted_medicines: Optional[str] = None
+    # Catalog medicines the prescription covers; matched from extracted_medicines when omitted
+    medicines: Optional[List[PrescribedMedicine]] = None
+
+class ExtractionStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ExtractionJobResponse(BaseModel):
+    id: int
+    prescription_id: int
+    status: ExtractionStatus
+    engine: Optional[str] = None
+    attempts: int
+    extracted_text: Optional[str] = None
+    extracted_medicines: Optional[str] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ExtractionBatchResponse(BaseModel):
+    submitted: int
+    jobs: List[ExtractionJobResponse]
 
 # Cart schemas
 class CartItemCreate(BaseModel):
@@ -244,6 +303,10 @@ class OrderResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderQueueEntry(OrderResponse):
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
     delivery_notes: Optional[str] = None
@@ -253,6 +316,29 @@ class DeliveryEstimate(BaseModel):
     estimated_time: int  # minutes
     delivery_fee: float
     is_emergency_available: bool
+    distance_km: Optional[float] = None
+    pharmacy_id: Optional[int] = None
+
+class DeliveryLocation(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    is_emergency: bool = False
+
+class DeliveryQuoteBatchRequest(BaseModel):
+    locations: List[DeliveryLocation] = Field(..., min_length=1)
+
+class DeliveryQuote(BaseModel):
+    latitude: float
+    longitude: float
+    is_serviceable: bool
+    geocell: Optional[str] = None
+    pharmacy_id: Optional[int] = None
+    distance_km: Optional[float] = None
+    delivery_fee: Optional[float] = None
+    estimated_time: Optional[int] = None  # minutes
+
+class DeliveryQuoteBatchResponse(BaseModel):
+    quotes: List[DeliveryQuote]
 
 class DeliveryPartnerResponse(BaseModel):
     id: int
@@ -265,6 +351,40 @@ class DeliveryPartnerResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    recorded_at: Optional[datetime] = None
+    partner_id: Optional[int] = None  # admin gateways only; partners report for themselves
+
+class LocationPingBatch(BaseModel):
+    pings: List[LocationPing] = Field(..., min_length=1)
+
+class PartnerLocationResponse(BaseModel):
+    partner_id: int
+    latitude: float
+    longitude: float
+    recorded_at: Optional[datetime] = None
+
+class DeliveryRouteStop(BaseModel):
+    order_id: int
+    order_number: str
+    latitude: float
+    longitude: float
+    leg_distance_km: float
+
+class DeliveryRoute(BaseModel):
+    route_id: str
+    pharmacy_id: int
+    is_emergency: bool
+    total_distance_km: float
+    stops: List[DeliveryRouteStop]
+
+class RoutePlanResponse(BaseModel):
+    planned_at: Optional[datetime] = None
+    routes: List[DeliveryRoute]
+    unroutable_order_ids: List[int]
+
 class EmergencyDeliveryRequest(BaseModel):
     medicine_names: List[str]
     urgent_notes: str
@@ -280,10 +400,55 @@ class PharmacyResponse(BaseModel):
     is_active: bool
     operating_hours: Optional[str] = None
     distance: Optional[float] = None
+    is_open: Optional[bool] = None
 
     class Config:
         from_attributes = True
 
 class PhoneVerification(BaseModel):
     phone: str
-    verification_code: str 
\ No newline at end of file
+    verification_code: str 
+
+# Analytics schemas
+class RollupGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+class AnalyticsBucket(BaseModel):
+    bucket_start: datetime
+    order_count: int
+    revenue: float
+
+class StatusBreakdown(BaseModel):
+    status: OrderStatus
+    order_count: int
+    revenue: float
+
+class OrderAnalyticsResponse(BaseModel):
+    granularity: RollupGranularity
+    start: datetime
+    end: datetime
+    total_orders: int
+    total_revenue: float
+    emergency_orders: int
+    emergency_revenue: float
+    cancelled_orders: int = 0
+    cancelled_revenue: float = 0.0
+    series: List[AnalyticsBucket]
+    by_status: List[StatusBreakdown]
+
+class CategoryBreakdown(BaseModel):
+    category_id: Optional[int] = None
+    category_name: str
+    item_count: int
+    revenue: float
+
+class CategoryAnalyticsResponse(BaseModel):
+    granularity: RollupGranularity
+    start: datetime
+    end: datetime
+    categories: List[CategoryBreakdown]
+
+class RollupRebuildResponse(BaseModel):
+    order_rollups: int
+    category_rollups: int
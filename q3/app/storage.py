@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import logging
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional, Tuple
+from fastapi import UploadFile
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.imaging import normalize_image, remove_previews, run_image_job
+from app.models import Prescription, StoredFile
+from app.storage_backends import StorageBackend, get_storage_backend, legacy_files
+from app.uploads import discard_temp, stream_to_temp
+
+logger = logging.getLogger(__name__)
+
+# Uploads are stored once per distinct content, under the key ab/cd/<sha256><ext>
+# in the configured storage backend. Two levels of 256 shards keep every
+# directory small even at millions of files. Normalized uploads are stored as
+# <sha256 of the upload>.jpg; kept originals go under originals/ with the same layout.
+
+_TEMP_DIR = ".incoming"
+
+def content_path(sha256: str, extension: str) -> str:
+    """Sharded storage key of a blob."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+def file_location(prescription: Prescription) -> Tuple[StorageBackend, str]:
+    """Backend and key holding a prescription's file."""
+    if prescription.file_hash and prescription.stored_file is not None:
+        return get_storage_backend(), prescription.stored_file.path
+    return legacy_files, prescription.file_path
+
+@contextmanager
+def local_copy(backend: StorageBackend, key: str) -> Iterator[str]:
+    """Path of the file on local disk for the duration of the block, downloading it if needed."""
+    path, temporary = backend.checkout(key)
+    try:
+        yield path
+    finally:
+        if temporary and os.path.exists(path):
+            os.remove(path)
+
+@asynccontextmanager
+async def local_copy_async(backend: StorageBackend, key: str) -> AsyncIterator[str]:
+    path, temporary = await asyncio.to_thread(backend.checkout, key)
+    try:
+        yield path
+    finally:
+        if temporary:
+            await discard_temp(path)
+
+_ORIGINALS_DIR = "originals"
+NORMALIZABLE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Upload normalization since this process started, reported on /health
+_normalization_totals = {"normalized": 0, "bytes_saved": 0, "failed": 0}
+
+def normalization_stats() -> dict:
+    return dict(_normalization_totals)
+
+def _add_reference(db: Session, sha256: str) -> bool:
+    """Take a reference to an existing blob; False if there is none."""
+    added = db.query(StoredFile).filter(StoredFile.sha256 == sha256).update(
+        {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False
+    )
+    db.commit()
+    return bool(added)
+
+def _acquire(db: Session, blob: StoredFile) -> StoredFile:
+    """Add a reference to a blob, creating its row on first use."""
+    if not _add_reference(db, blob.sha256):
+        try:
+            with db.begin_nested():
+                db.add(blob)
+        except IntegrityError:
+            # Another upload of the same content created the row first
+            _add_reference(db, blob.sha256)
+        db.commit()
+    return db.query(StoredFile).filter(StoredFile.sha256 == blob.sha256).one()
+
+async def _normalize(temp_path: str) -> Optional[Tuple[str, int]]:
+    """Recompress an image upload in the image pool.
+
+    Returns ``(normalized_temp_path, size)``, or None if the upload is kept
+    as-is because it cannot be decoded or would not get smaller.
+    """
+    normalized_path = f"{temp_path}.jpg"
+    try:
+        size = await run_image_job(
+            normalize_image, temp_path, normalized_path,
+            settings.normalize_max_dimension, settings.normalize_quality
+        )
+    except Exception as e:
+        logger.warning("Upload normalization failed for %s: %s", temp_path, e)
+        _normalization_totals["failed"] += 1
+        size = None
+    if size is None:
+        await discard_temp(normalized_path)
+        return None
+    return normalized_path, size
+
+async def _place(temp_path: str, key: str) -> None:
+    await asyncio.to_thread(get_storage_backend().put, temp_path, key, True)
+
+async def store_upload(db: Session, upload: UploadFile, extension: str) -> StoredFile:
+    """Store an upload by content and take a reference to it.
+
+    Identical content uploaded again only bumps ``ref_count``. New JPG/PNG
+    content is normalized first when ``normalize_uploads`` is on; the blob
+    keeps the hash of the uploaded bytes so re-uploads still deduplicate.
+    Files are (re)placed after the reference is committed. ``release_file``
+    deletes files before committing the row's removal, so that commit, and
+    with it the deletion, happens before this upload can recreate the row.
+    """
+    temp_path, size, sha256 = await stream_to_temp(upload, os.path.join(settings.upload_dir, _TEMP_DIR))
+    normalized = None
+    try:
+        if _add_reference(db, sha256):
+            await discard_temp(temp_path)
+            return db.query(StoredFile).filter(StoredFile.sha256 == sha256).one()
+
+        if settings.normalize_uploads and extension in NORMALIZABLE_EXTENSIONS:
+            normalized = await _normalize(temp_path)
+
+        blob = StoredFile(sha256=sha256, path=content_path(sha256, extension), size=size, ref_count=1)
+        if normalized:
+            blob.path = content_path(sha256, ".jpg")
+            blob.size = normalized[1]
+            blob.original_size = size
+            if settings.keep_original_uploads:
+                blob.original_path = f"{_ORIGINALS_DIR}/{content_path(sha256, extension)}"
+        stored = _acquire(db, blob)
+
+        try:
+            # A concurrent upload of the same content may have stored it differently
+            if stored.path == blob.path:
+                if normalized:
+                    await _place(normalized[0], stored.path)
+                    normalized = None
+                    if stored.original_path:
+                        await _place(temp_path, stored.original_path)
+                else:
+                    await _place(temp_path, stored.path)
+        except BaseException:
+            # Give back the reference taken above, so a failed upload does not pin the blob
+            await asyncio.to_thread(release_file, db, sha256)
+            raise
+    finally:
+        await discard_temp(temp_path)
+        if normalized:
+            await discard_temp(normalized[0])
+
+    if stored.original_size and stored.path == blob.path:
+        saved = stored.original_size - stored.size
+        _normalization_totals["normalized"] += 1
+        _normalization_totals["bytes_saved"] += saved
+        logger.info(
+            "Normalized upload %s: %d -> %d bytes (%d%% saved)",
+            sha256[:12], stored.original_size, stored.size, saved * 100 // stored.original_size
+        )
+    return stored
+
+def release_file(db: Session, sha256: str) -> bool:
+    """Drop a reference to a blob, deleting the blob with its last reference.
+
+    Blocking (the storage backend deletes the files); async callers use
+    asyncio.to_thread. Returns True if the file itself was removed. The files are deleted while
+    the transaction that removes the row still holds its write lock, so an
+    upload of the same content cannot re-acquire the row and place the file
+    until the deletion is done.
+    """
+    stored = db.query(StoredFile).filter(StoredFile.sha256 == sha256).first()
+    if stored is None:
+        return False
+    keys = [stored.path, stored.original_path]
+
+    try:
+        db.query(StoredFile).filter(StoredFile.sha256 == sha256).update(
+            {StoredFile.ref_count: StoredFile.ref_count - 1}, synchronize_session=False
+        )
+        removed = db.query(StoredFile).filter(
+            StoredFile.sha256 == sha256, StoredFile.ref_count <= 0
+        ).delete(synchronize_session=False)
+        if removed:
+            backend = get_storage_backend()
+            for key in filter(None, keys):
+                try:
+                    backend.delete(key)
+                except Exception:
+                    logger.exception("Failed to delete stored file %s", key)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if removed:
+        remove_previews(sha256)
+    return bool(removed)
+
+def ingest_local_file(db: Session, path: str, backend: StorageBackend) -> StoredFile:
+    """Add an existing local file to content-addressed storage in ``backend`` and take a reference."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(settings.upload_chunk_size), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    if _add_reference(db, sha256):
+        return db.query(StoredFile).filter(StoredFile.sha256 == sha256).one()
+
+    key = content_path(sha256, os.path.splitext(path)[1].lower())
+    if not backend.exists(key):
+        backend.put(path, key)
+    return _acquire(db, StoredFile(sha256=sha256, path=key, size=os.path.getsize(path), ref_count=1))
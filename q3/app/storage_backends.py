@@ -0,0 +1,248 @@
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from mimetypes import guess_type
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+from app.config import settings
+
+# Backends store blobs under keys: relative, "/"-separated paths such as
+# ab/cd/<sha256>.png. Methods are blocking; async callers use asyncio.to_thread.
+
+_SKIPPED_LOCAL_DIRS = {".incoming", "previews"}
+
+class StorageBackend(ABC):
+    """Interface for where uploaded files live."""
+
+    name = "base"
+
+    @abstractmethod
+    def put(self, local_path: str, key: str, move: bool = False) -> None:
+        """Store the file at ``local_path`` under ``key``; with ``move`` the local file is consumed."""
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove ``key``; missing keys are ignored."""
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def checkout(self, key: str) -> Tuple[str, bool]:
+        """Local path holding the file, and whether it is a temporary copy the caller must remove."""
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of the stored file itself, for backends that keep files on local disk."""
+        return None
+
+    def download_url(self, key: str, filename: str) -> Optional[str]:
+        """Short-lived URL clients can fetch the file from directly, if the backend has one."""
+        return None
+
+    @abstractmethod
+    def keys(self) -> Iterator[str]:
+        ...
+
+class LocalStorageBackend(StorageBackend):
+    """Files under a directory on this node's disk."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put(self, local_path: str, key: str, move: bool = False) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if move:
+            os.replace(local_path, path)
+            return
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            shutil.copyfile(local_path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def checkout(self, key: str) -> Tuple[str, bool]:
+        path = self._path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        return path, False
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def keys(self) -> Iterator[str]:
+        for directory, subdirectories, filenames in os.walk(self.root):
+            if directory == self.root:
+                subdirectories[:] = [name for name in subdirectories if name not in _SKIPPED_LOCAL_DIRS]
+            for filename in filenames:
+                if not filename.endswith(".part"):
+                    relative_path = os.path.relpath(os.path.join(directory, filename), self.root)
+                    yield relative_path.replace(os.sep, "/")
+
+class S3StorageBackend(StorageBackend):
+    """Objects in an S3-compatible bucket (AWS, MinIO, ...).
+
+    Files larger than ``part_size`` are sent with a multipart upload, one
+    part in memory at a time, and the upload is aborted if any part fails.
+    Credentials come from the usual AWS environment/config chain. Pass
+    ``client`` to use a preconfigured boto3 client (e.g. under moto).
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        client=None,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024,
+        url_ttl: int = 300
+    ):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("The s3 storage backend needs boto3: pip install boto3")
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+        if not bucket:
+            raise RuntimeError("The s3 storage backend needs S3_BUCKET")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # S3's minimum for all but the last part
+        self.url_ttl = url_ttl
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def put(self, local_path: str, key: str, move: bool = False) -> None:
+        object_key = self._object_key(key)
+        content_type = guess_type(key)[0] or "application/octet-stream"
+
+        with open(local_path, "rb") as source:
+            if os.fstat(source.fileno()).st_size <= self.part_size:
+                self.client.put_object(Bucket=self.bucket, Key=object_key, Body=source, ContentType=content_type)
+            else:
+                upload_id = self.client.create_multipart_upload(
+                    Bucket=self.bucket, Key=object_key, ContentType=content_type
+                )["UploadId"]
+                try:
+                    parts = []
+                    for part_number, chunk in enumerate(iter(lambda: source.read(self.part_size), b""), 1):
+                        result = self.client.upload_part(
+                            Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                            PartNumber=part_number, Body=chunk
+                        )
+                        parts.append({"PartNumber": part_number, "ETag": result["ETag"]})
+                    self.client.complete_multipart_upload(
+                        Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                        MultipartUpload={"Parts": parts}
+                    )
+                except BaseException:
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+                    raise
+
+        if move:
+            os.remove(local_path)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def checkout(self, key: str) -> Tuple[str, bool]:
+        directory = os.path.join(settings.upload_dir, ".incoming")
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f"{uuid.uuid4().hex}{os.path.splitext(key)[1]}")
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"]
+            with open(temp_path, "wb") as out:
+                for chunk in body.iter_chunks(settings.upload_chunk_size):
+                    out.write(chunk)
+        except BaseException as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if isinstance(e, self.client.exceptions.NoSuchKey):
+                raise FileNotFoundError(key) from e
+            raise
+        return temp_path, True
+
+    def download_url(self, key: str, filename: str) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+                "ResponseContentDisposition": f"inline; filename*=utf-8''{quote(filename)}",
+                "ResponseContentType": guess_type(key)[0] or "application/octet-stream"
+            },
+            ExpiresIn=self.url_ttl
+        )
+
+    def keys(self) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):]
+
+def create_backend(name: str) -> StorageBackend:
+    if name == "local":
+        return LocalStorageBackend(settings.upload_dir)
+    if name == "s3":
+        return S3StorageBackend(
+            settings.s3_bucket,
+            prefix=settings.s3_prefix,
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            part_size=settings.s3_part_size,
+            url_ttl=settings.s3_url_ttl
+        )
+    raise ValueError(f"Unknown storage backend: {name}")
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+def get_storage_backend() -> StorageBackend:
+    """The configured backend (``STORAGE_BACKEND``), created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(settings.storage_backend)
+    return _backend
+
+# Uploads from before content-addressed storage keep the path they were saved
+# at, absolute or relative to the working directory, until they are migrated.
+legacy_files = LocalStorageBackend("")
@@ -0,0 +1,130 @@
+import time
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.archive import AnyOrder, find_order, find_order_by_tracking_number
+from app.cache import TTLCache
+from app.config import settings
+from app.models import Order, OrderStatus, User
+
+STATUS_PROGRESS = {
+    OrderStatus.PENDING: 10,
+    OrderStatus.CONFIRMED: 25,
+    OrderStatus.PROCESSING: 50,
+    OrderStatus.READY: 75,
+    OrderStatus.OUT_FOR_DELIVERY: 90,
+    OrderStatus.DELIVERED: 100,
+    OrderStatus.CANCELLED: 0
+}
+
+# Fields safe to show to anyone holding the tracking number
+PUBLIC_TRACKING_FIELDS = (
+    "order_number", "status", "progress_percentage", "tracking_number",
+    "estimated_delivery_time", "actual_delivery_time", "is_emergency"
+)
+
+# Entries are stored under ("id", order_id) and ("number", tracking_number)
+_tracking_cache = TTLCache(settings.tracking_cache_ttl, maxsize=settings.tracking_cache_size)
+
+# Public lookups per (client, minute), so tracking numbers cannot be guessed at speed
+_lookup_counts = TTLCache(60, maxsize=100000)
+
+def allow_tracking_lookup(client: str) -> bool:
+    """Count a public lookup by ``client``; False once it is over the per-minute limit."""
+    key = (client, int(time.time() // 60))
+    count = _lookup_counts.get(key, 0) + 1
+    _lookup_counts.set(key, count)
+    return count <= settings.tracking_lookup_rate_limit
+
+def _tracking_payload(db: Session, order: AnyOrder) -> dict:
+    delivery_partner = None
+    if order.delivery_partner_id:
+        partner_user = db.query(User.full_name, User.phone).filter(
+            User.id == order.delivery_partner_id
+        ).first()
+        if partner_user:
+            delivery_partner = {
+                "name": partner_user.full_name,
+                "phone": partner_user.phone
+            }
+
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "order_number": order.order_number,
+        "status": order.status.value,
+        "progress_percentage": STATUS_PROGRESS.get(order.status, 0),
+        "tracking_number": order.tracking_number,
+        "estimated_delivery_time": order.estimated_delivery_time,
+        "actual_delivery_time": order.actual_delivery_time,
+        "delivery_partner": delivery_partner,
+        "delivery_notes": order.delivery_notes,
+        "is_emergency": order.is_emergency
+    }
+
+# Bumped on every invalidation, so a lookup that raced with a change does not cache the old order
+_generation = 0
+
+def _cache_payload(payload: dict, generation: int) -> dict:
+    if generation == _generation:
+        _tracking_cache.set(("id", payload["order_id"]), payload)
+        if payload["tracking_number"]:
+            _tracking_cache.set(("number", payload["tracking_number"]), payload)
+    return payload
+
+def get_tracking(db: Session, order_id: int) -> Optional[dict]:
+    """Tracking payload for an order (hot or archived), cached for ``tracking_cache_ttl`` seconds.
+
+    The returned dict is shared with the cache and must not be modified.
+    """
+    payload = _tracking_cache.get(("id", order_id))
+    if payload is None:
+        generation = _generation
+        order = find_order(db, order_id)
+        if order is None:
+            return None
+        payload = _cache_payload(_tracking_payload(db, order), generation)
+    return payload
+
+def get_tracking_by_number(db: Session, tracking_number: str) -> Optional[dict]:
+    """Like ``get_tracking``, looked up by tracking number."""
+    payload = _tracking_cache.get(("number", tracking_number))
+    if payload is None:
+        generation = _generation
+        order = find_order_by_tracking_number(db, tracking_number)
+        if order is None:
+            return None
+        payload = _cache_payload(_tracking_payload(db, order), generation)
+    return payload
+
+def invalidate_tracking(order_id: int, tracking_number: Optional[str] = None) -> None:
+    global _generation
+    _generation += 1
+    cached = _tracking_cache.pop(("id", order_id))
+    if cached is not None and not tracking_number:
+        tracking_number = cached["tracking_number"]
+    if tracking_number:
+        _tracking_cache.pop(("number", tracking_number))
+
+# Orders changed in a session are dropped from the cache when it commits, not
+# at flush: until then other sessions still read, and could re-cache, the old row.
+_CHANGED_ORDERS = "tracking_changed_orders"
+
+@event.listens_for(Order, "after_update")
+@event.listens_for(Order, "after_delete")
+def _order_changed(mapper, connection, target):
+    state = inspect(target)
+    if state.session is None:
+        return
+    changed = state.session.info.setdefault(_CHANGED_ORDERS, {})
+    changed[target.id] = state.dict.get("tracking_number")
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_orders(session):
+    changed = session.info.pop(_CHANGED_ORDERS, None)
+    for order_id, tracking_number in (changed or {}).items():
+        invalidate_tracking(order_id, tracking_number)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_orders(session):
+    session.info.pop(_CHANGED_ORDERS, None)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import uuid
+from typing import Iterable, Tuple
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile, status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+def too_large_detail(max_bytes: int) -> str:
+    return f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB."
+
+class UploadSizeLimitMiddleware:
+    """Caps request bodies on upload routes before they are parsed.
+
+    A declared ``Content-Length`` over ``max_body_size`` is answered with 413
+    without reading the body. Bodies that do not declare a length (or
+    understate it) are counted as they arrive and aborted with 413 as soon
+    as they pass the limit, so the multipart parser never spools more than
+    ``max_body_size`` bytes.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str], max_body_size: int, max_file_size: int):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body_size = max_body_size
+        self.detail = too_large_detail(max_file_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body_size:
+                    response = JSONResponse(
+                        {"detail": self.detail},
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self.detail
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def stream_to_temp(
+    upload: UploadFile,
+    directory: str,
+    max_bytes: int = settings.max_file_size,
+    chunk_size: int = settings.upload_chunk_size
+) -> Tuple[str, int, str]:
+    """Stream ``upload`` into a temporary file in ``directory``.
+
+    Returns ``(temp_path, size, sha256 hex digest)``; the caller renames the
+    file into place or removes it. Raises 413 as soon as more than
+    ``max_bytes`` have been read, leaving nothing behind.
+    """
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=too_large_detail(max_bytes)
+                    )
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        await discard_temp(temp_path)
+        raise
+
+    return temp_path, size, digest.hexdigest()
+
+async def discard_temp(temp_path: str) -> None:
+    try:
+        await aiofiles.os.remove(temp_path)
+    except OSError:
+        pass
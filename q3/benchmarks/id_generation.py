@@ -0,0 +1,73 @@
+"""Benchmark order/tracking number generation and check uniqueness across processes.
+
+Run from the q3 directory:
+
+    python benchmarks/id_generation.py [--count 200000] [--processes 8]
+
+Reports single-process throughput for the Snowflake generator against the
+previous timestamp + random suffix scheme, then has several processes
+generate order and tracking numbers concurrently and fails if any value
+repeats or any worker's ids are not strictly increasing.
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import string
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.ids import SnowflakeGenerator, format_order_number, format_tracking_number  # noqa: E402
+
+def legacy_order_number():
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    suffix = "".join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(4))
+    return f"ORD{timestamp}{suffix}"
+
+def time_it(label, fn, count):
+    started = time.perf_counter()
+    values = [fn() for _ in range(count)]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {count / elapsed:>12,.0f} ids/s  {len(values) - len(set(values)):>6} duplicates")
+
+def generate(worker_id, count):
+    generator = SnowflakeGenerator(worker_id)
+    ids = [generator.next_id() for _ in range(count)]
+    return (
+        worker_id,
+        all(a < b for a, b in zip(ids, ids[1:])),
+        [format_order_number(i, generator) for i in ids],
+        [format_tracking_number(i, generator) for i in ids],
+    )
+
+def check_multiprocess(processes, count):
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(generate, [(worker_id, count) for worker_id in range(processes)])
+
+    order_numbers = set()
+    tracking_numbers = set()
+    for worker_id, monotonic, orders, trackings in results:
+        assert monotonic, f"worker {worker_id} produced non-increasing ids"
+        order_numbers.update(orders)
+        tracking_numbers.update(trackings)
+
+    expected = processes * count
+    assert len(order_numbers) == expected, f"{expected - len(order_numbers)} duplicate order numbers"
+    assert len(tracking_numbers) == expected, f"{expected - len(tracking_numbers)} duplicate tracking numbers"
+    print(f"{processes} processes x {count:,} ids: all order and tracking numbers unique, per-worker monotonic")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--processes", type=int, default=8)
+    args = parser.parse_args()
+
+    generator = SnowflakeGenerator(1)
+    time_it("legacy ORD + random suffix", legacy_order_number, args.count)
+    time_it("snowflake id", generator.next_id, args.count)
+    time_it("snowflake order number", lambda: format_order_number(generator.next_id(), generator), args.count)
+    time_it("snowflake tracking number", lambda: format_tracking_number(generator.next_id(), generator), args.count)
+    check_multiprocess(args.processes, args.count)
@@ -0,0 +1,147 @@
+"""Measure latency of an unrelated endpoint while the app handles a burst of logins.
+
+Run from the q3 directory (works for the q1 and q2 apps too):
+
+    python benchmarks/login_storm.py [--app q3|q1|q2] [--logins 200] [--concurrency 32] [--workers 2]
+
+Starts the app under uvicorn twice on a scratch SQLite database, first
+hashing passwords inline on the event loop (PASSWORD_HASH_WORKERS=0), then
+in a pool of --workers (processes in q3, threads in q1 and q2). Each run
+probes a cheap endpoint every few milliseconds before and during the storm and
+reports its p50/p99/max, the login throughput, and the hashing metrics the app
+exposes on /health.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app: (directory, ASGI app, probe path, credentials)
+APPS = {
+    "q3": ("q3", "main:app", "/health", ("admin", "admin123")),
+    "q1": ("q1", "app.main:app", "/", ("stormuser", "Storm!pass1")),
+    "q2": ("q2", "app.main:app", "/", ("stormuser", "Storm!pass1")),
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return "no samples"
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    return f"p50 {pick(0.5):7.1f}ms  p99 {pick(0.99):7.1f}ms  max {ordered[-1] * 1000:7.1f}ms  (n={len(ordered)})"
+
+async def login(client, app_name, username, password, index):
+    # A distinct client address per request keeps q2's per-IP login limit out of the way
+    headers = {"X-Forwarded-For": f"10.0.{index // 250}.{index % 250 + 1}"}
+    if app_name == "q3":
+        return await client.post("/auth/login", data={"username": username, "password": password}, headers=headers)
+    return await client.post("/auth/login", json={"username": username, "password": password}, headers=headers)
+
+async def probe(client, path, samples, stop, interval):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+async def measure(app_name, base_url, args):
+    _, _, probe_path, (username, password) = APPS[app_name]
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        if app_name != "q3":
+            response = await client.post("/auth/register", json={
+                "username": username, "email": f"{username}@example.com", "password": password
+            }, headers={"X-Forwarded-For": "10.1.0.1"})
+            response.raise_for_status()
+
+        idle, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, probe_path, idle, stop, args.probe_interval))
+        await asyncio.sleep(1)
+        stop.set()
+        await task
+
+        during, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, probe_path, during, stop, args.probe_interval))
+        slots = asyncio.Semaphore(args.concurrency)
+        statuses = {}
+
+        async def one(index):
+            async with slots:
+                try:
+                    outcome = (await login(client, app_name, username, password, index)).status_code
+                except httpx.TransportError as e:
+                    outcome = type(e).__name__
+                statuses[outcome] = statuses.get(outcome, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await task
+
+        health = (await client.get("/health")).json()
+
+    print(f"  probe {probe_path} idle:         {percentiles(idle)}")
+    print(f"  probe {probe_path} during storm: {percentiles(during)}")
+    print(f"  {args.logins} logins in {elapsed:.1f}s ({args.logins / elapsed:.1f}/s), responses {statuses}")
+    metrics = health.get("password_hashing") or health.get("worker_pools", {}).get("password")
+    if metrics:
+        print(f"  hashing metrics: {metrics}")
+
+def run(app_name, workers, args):
+    directory, asgi_app, _, _ = APPS[app_name]
+    port = free_port()
+    scratch = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{scratch}/bench.db",
+        UPLOAD_DIR=os.path.join(scratch, "uploads"),
+        PASSWORD_HASH_WORKERS=str(workers),
+        PASSWORD_HASH_MAX_QUEUE=str(args.logins),
+        LOGIN_RATE_LIMIT=str(args.logins * 10),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", asgi_app, "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(ROOT, directory), env=env
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(200):
+            try:
+                httpx.get(base_url + APPS[app_name][2], timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise SystemExit("server did not start")
+        label = "inline on the event loop" if workers == 0 else f"pool of {workers} workers"
+        print(f"{app_name}: password hashing {label}")
+        asyncio.run(measure(app_name, base_url, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=sorted(APPS), default="q3")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    run(args.app, 0, args)
+    run(args.app, args.workers, args)
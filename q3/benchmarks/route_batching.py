@@ -0,0 +1,67 @@
+"""Benchmark route batching on synthetic READY order sets.
+
+Run from the q3 directory:
+
+    python benchmarks/route_batching.py [--sizes 1000 2000 5000 10000]
+
+Stops are scattered uniformly within ``--spread-km`` of a single pharmacy.
+For each size the script reports planning time, route count and the total
+distance driven compared with dispatching every order on its own
+(a return trip per order).
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.geo import KM_PER_DEGREE, haversine_km  # noqa: E402
+from app.routing import plan_routes  # noqa: E402
+
+ORIGIN = (40.7128, -74.0060)
+
+def synthetic_stops(count, spread_km, seed):
+    rng = random.Random(seed)
+    stops = []
+    for _ in range(count):
+        distance = spread_km * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        dlat = distance * math.cos(bearing) / KM_PER_DEGREE
+        dlon = distance * math.sin(bearing) / (KM_PER_DEGREE * math.cos(math.radians(ORIGIN[0])))
+        stops.append((ORIGIN[0] + dlat, ORIGIN[1] + dlon))
+    return stops
+
+def run(sizes, spread_km, max_stops, radius_km, passes, seed):
+    print(f"{'stops':>7} {'routes':>7} {'plan ms':>9} {'batched km':>11} {'single km':>10} {'saving':>7}")
+    for size in sizes:
+        stops = synthetic_stops(size, spread_km, seed)
+        started = time.perf_counter()
+        routes = plan_routes(ORIGIN, stops, max_stops, radius_km, passes)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        assert sorted(i for visit, _ in routes for i in visit) == list(range(size))
+
+        # Each route returns to the pharmacy from its last stop
+        batched = sum(
+            sum(legs) + haversine_km(*stops[visit[-1]], *ORIGIN)
+            for visit, legs in routes
+        )
+        single = sum(2 * haversine_km(*ORIGIN, *stop) for stop in stops)
+        print(
+            f"{size:>7} {len(routes):>7} {elapsed_ms:>9.1f} {batched:>11.1f} "
+            f"{single:>10.1f} {1 - batched / single:>7.1%}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--spread-km", type=float, default=8.0)
+    parser.add_argument("--max-stops", type=int, default=6)
+    parser.add_argument("--radius-km", type=float, default=3.0)
+    parser.add_argument("--passes", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.sizes, args.spread_km, args.max_stops, args.radius_km, args.passes, args.seed)
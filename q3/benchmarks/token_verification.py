@@ -0,0 +1,110 @@
+"""Measure the per-request cost of the authentication dependencies.
+
+Run from the q3 directory (works for the q1 and q2 apps too):
+
+    python benchmarks/token_verification.py [--app q3|q1|q2] [--requests 20000]
+
+Runs each step in a fresh process on a scratch SQLite database, first with
+the decoded-token cache disabled (TOKEN_CACHE_SIZE=0), then enabled, and
+reports the mean and p99 cost in microseconds of verify_token alone, of
+get_current_principal (token plus revocation check, what role-checked routes
+pay) and of get_current_user (the above plus the cached user lookup), each
+with a database session opened and closed per call as get_db does.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def summary(samples):
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered) * 1e6
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6
+    return f"mean {mean:7.1f}us  p99 {p99:7.1f}us"
+
+def time_calls(fn, count):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def child(count):
+    """Runs inside the app directory, configured through the environment."""
+    sys.path.insert(0, os.getcwd())
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.database import SessionLocal, engine
+    from app.models import Base, User, UserRole
+    from app.auth import create_access_token, token_claims, verify_token
+    from app.dependencies import get_current_principal, get_current_user
+    from app.auth import decoded_tokens
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(username="benchuser", email="benchuser@example.com", hashed_password="x", role=UserRole.ADMIN)
+    db.add(user)
+    db.commit()
+    token = create_access_token(data=token_claims(user))
+    db.close()
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    unused = HTTPException(status_code=401)
+
+    def principal():
+        session = SessionLocal()
+        try:
+            return get_current_principal(credentials, session)
+        finally:
+            session.close()
+
+    def current_user():
+        session = SessionLocal()
+        try:
+            return get_current_user(get_current_principal(credentials, session), session)
+        finally:
+            session.close()
+
+    # Warm the version map and user cache, so both runs measure steady state
+    current_user()
+    for label, fn in (
+        ("verify_token", lambda: verify_token(token, unused)),
+        ("get_current_principal", principal),
+        ("get_current_user", current_user),
+    ):
+        print(f"  {label:<22} {summary(time_calls(fn, count))}")
+    print(f"  token cache: {decoded_tokens.stats()}")
+
+def run(app_name, cache_size, args):
+    scratch = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{scratch}/bench.db",
+        UPLOAD_DIR=os.path.join(scratch, "uploads"),
+        TOKEN_CACHE_SIZE=str(cache_size),
+    )
+    label = "disabled" if cache_size == 0 else f"enabled ({cache_size} tokens)"
+    print(f"{app_name}: decoded-token cache {label}", flush=True)
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests)],
+        cwd=os.path.join(ROOT, app_name), env=env, check=True
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=["q1", "q2", "q3"], default="q3")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests)
+    else:
+        run(args.app, 0, args)
+        run(args.app, args.cache_size, args)
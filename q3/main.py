@@ -5,11 +5,17 @@ from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
 from app.database import create_tables, get_db
 from app.config import settings
-from app.routers import auth, medicines, prescriptions, cart, orders
+from app.routers import auth, medicines, prescriptions, cart, orders, analytics
 from app.routers.medicines import categories_router
 from app.routers.orders import delivery_router
 from app.models import User, Category, Medicine
 from app.dependencies import get_current_user
+from app.background import periodic_tasks
+from app.uploads import UploadSizeLimitMiddleware
+from app.workers import worker_pools
+from app.user_cache import user_cache
+from app.auth import decoded_tokens
+from app.storage import normalization_stats
 import os
 
 # Create FastAPI app
@@ -19,6 +25,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reject oversized uploads before the multipart body is parsed
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=["/prescriptions/upload"],
+    max_body_size=settings.max_file_size + settings.max_upload_overhead,
+    max_file_size=settings.max_file_size
+)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -33,6 +47,7 @@ app.include_router(prescriptions.router)
 app.include_router(cart.router)
 app.include_router(orders.router)
 app.include_router(delivery_router)
+app.include_router(analytics.router)
 
 # Create database tables on startup
 @app.on_event("startup")
@@ -41,6 +56,20 @@ def startup_event():
     # Create sample data if needed
     create_sample_data()
 
+@app.on_event("startup")
+async def start_background_jobs():
+    for pool in worker_pools:
+        pool.start()
+    for task in periodic_tasks:
+        task.start()
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for task in periodic_tasks:
+        await task.stop()
+    for pool in worker_pools:
+        pool.shutdown()
+
 def create_sample_data():
     """Create sample data for demo purposes."""
     from sqlalchemy.orm import Session
@@ -219,7 +248,11 @@ async def health_check():
     return {
         "status": "healthy",
         "app_name": settings.app_name,
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "worker_pools": {pool.name: pool.stats() for pool in worker_pools},
+        "user_cache": user_cache.stats(),
+        "token_cache": decoded_tokens.stats(),
+        "upload_normalization": normalization_stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""Copy uploaded prescription files from one storage backend to another.
+
+Run from the q3 directory, with the target backend's settings (S3_BUCKET,
+S3_ENDPOINT_URL, AWS credentials, ...) in the environment:
+
+    python scripts/migrate_storage.py --to s3 [--from local] [--delete-source] [--dry-run]
+
+Prescriptions uploaded before content-addressed storage are hashed and
+adopted into the source backend first, so every file ends up in the target.
+Files already present in the target are skipped, so the command can be
+re-run after an interruption. Switch STORAGE_BACKEND to the target once it
+reports no failures; a final run with --delete-source frees the old copies.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.database import SessionLocal  # noqa: E402
+from app.models import Prescription, StoredFile  # noqa: E402
+from app.storage import ingest_local_file, local_copy  # noqa: E402
+from app.storage_backends import create_backend, legacy_files  # noqa: E402
+
+def adopt_legacy_files(db, backend, dry_run, delete_source):
+    """Move pre-content-addressed uploads into ``backend``, linking them to their prescriptions."""
+    adopted = missing = 0
+    prescriptions = db.query(Prescription).filter(
+        Prescription.file_hash.is_(None), Prescription.file_path.isnot(None)
+    ).all()
+    for prescription in prescriptions:
+        path = prescription.file_path
+        if not legacy_files.exists(path):
+            print(f"  missing legacy file for prescription {prescription.id}: {path}")
+            missing += 1
+            continue
+        if not dry_run:
+            stored = ingest_local_file(db, path, backend)
+            prescription.file_hash = stored.sha256
+            prescription.file_path = stored.path
+            db.commit()
+            if delete_source:
+                legacy_files.delete(path)
+        adopted += 1
+    return adopted, missing
+
+def copy_blobs(db, source, target, dry_run, delete_source):
+    copied = skipped = failed = copied_bytes = 0
+    keys = []
+    for path, original_path in db.query(StoredFile.path, StoredFile.original_path).order_by(StoredFile.sha256):
+        keys.extend(key for key in (path, original_path) if key)
+
+    for index, key in enumerate(keys, 1):
+        try:
+            if target.exists(key):
+                skipped += 1
+            elif dry_run:
+                copied += 1
+            else:
+                with local_copy(source, key) as path:
+                    copied_bytes += os.path.getsize(path)
+                    target.put(path, key)
+                copied += 1
+        except Exception as e:
+            print(f"  failed {key}: {e}")
+            failed += 1
+        if index % 500 == 0:
+            print(f"  {index}/{len(keys)} files checked")
+
+    if delete_source and not dry_run and not failed:
+        for key in keys:
+            source.delete(key)
+    return copied, skipped, failed, copied_bytes
+
+def run(source_name, target_name, dry_run, delete_source):
+    if source_name == target_name:
+        sys.exit("Source and target backends are the same")
+    source = create_backend(source_name)
+    target = create_backend(target_name)
+
+    db = SessionLocal()
+    try:
+        # Adopt into the backend still serving traffic; the copy below takes them along
+        adopted, missing = adopt_legacy_files(db, source, dry_run, delete_source)
+        print(f"Legacy uploads: {adopted} adopted into {source_name}, {missing} missing on disk")
+
+        copied, skipped, failed, copied_bytes = copy_blobs(db, source, target, dry_run, delete_source)
+        print(
+            f"Stored files: {copied} copied ({copied_bytes / (1024 * 1024):.1f}MB), "
+            f"{skipped} already in {target_name}, {failed} failed"
+        )
+    finally:
+        db.close()
+
+    if dry_run:
+        print("Dry run: nothing was changed")
+    elif failed:
+        print("Some files failed; re-run before switching STORAGE_BACKEND. Source files were kept.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="source", default="local", choices=["local", "s3"])
+    parser.add_argument("--to", dest="target", required=True, choices=["local", "s3"])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--delete-source", action="store_true", help="Remove source copies after a clean run")
+    args = parser.parse_args()
+    run(args.source, args.target, args.dry_run, args.delete_source)
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its settings at import time, so point it at a scratch database first
+_scratch = tempfile.mkdtemp(prefix="quickmed-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/test.db"
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch, "uploads")
+
+Q3_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, Q3_DIR)
+# Static files and templates are mounted relative to the working directory
+os.chdir(Q3_DIR)
+
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def login(client):
+    """Log in and return the bearer headers for the new token."""
+    def login(username: str, password: str) -> dict:
+        response = client.post("/auth/login", data={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
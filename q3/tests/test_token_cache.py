@@ -0,0 +1,53 @@
+import hashlib
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import create_access_token, decoded_tokens, verify_token
+
+CREDENTIALS_EXCEPTION = HTTPException(status_code=401, detail="Could not validate credentials")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    decoded_tokens.clear()
+    yield
+    decoded_tokens.clear()
+
+
+def _token(expires_delta: timedelta) -> str:
+    return create_access_token({"sub": "cached", "uid": 1, "role": "user", "active": True, "ver": 0}, expires_delta)
+
+
+def test_cache_is_keyed_by_digest():
+    token = _token(timedelta(minutes=5))
+
+    token_data = verify_token(token, CREDENTIALS_EXCEPTION)
+
+    assert decoded_tokens.get(token) is None
+    assert decoded_tokens.get(hashlib.sha256(token.encode()).digest()) == token_data
+    assert verify_token(token, CREDENTIALS_EXCEPTION) is token_data
+
+
+def test_cached_token_is_not_served_after_exp():
+    token = _token(timedelta(seconds=2))
+    digest = hashlib.sha256(token.encode()).digest()
+    assert verify_token(token, CREDENTIALS_EXCEPTION).username == "cached"
+    assert decoded_tokens.get(digest) is not None
+
+    # exp has whole-second precision and python-jose compares it to whole seconds
+    time.sleep(3.1)
+
+    assert decoded_tokens.get(digest) is None
+    with pytest.raises(HTTPException):
+        verify_token(token, CREDENTIALS_EXCEPTION)
+
+
+def test_expired_token_is_not_cached():
+    token = _token(timedelta(seconds=-1))
+
+    with pytest.raises(HTTPException):
+        verify_token(token, CREDENTIALS_EXCEPTION)
+    assert len(decoded_tokens) == 0
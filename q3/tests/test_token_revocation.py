@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+from app.auth import get_password_hash
+from app.models import User, UserRole
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture
+def user(db):
+    suffix = uuid.uuid4().hex[:8]
+    user = User(
+        username=f"user-{suffix}",
+        email=f"{suffix}@example.com",
+        phone=f"+1555{int(suffix, 16) % 10**7:07d}",
+        full_name="Test User",
+        hashed_password=get_password_hash(PASSWORD),
+        role=UserRole.USER,
+        is_active=True,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _update(db, user_id: int, **values):
+    user = db.get(User, user_id)
+    for field, value in values.items():
+        setattr(user, field, value)
+    db.commit()
+
+
+@pytest.mark.parametrize("values", [
+    {"role": UserRole.PHARMACIST},
+    {"hashed_password": get_password_hash("another123")},
+    {"is_active": False},
+], ids=["role", "password", "active"])
+def test_change_revokes_issued_tokens(client, db, user, login, values):
+    headers = login(user.username, PASSWORD)
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    _update(db, user.id, **values)
+
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_profile_change_keeps_tokens(client, db, user, login):
+    headers = login(user.username, PASSWORD)
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    _update(db, user.id, full_name="Renamed User")
+
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+
+def test_rolled_back_change_keeps_tokens(client, db, user, login):
+    headers = login(user.username, PASSWORD)
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    db.get(User, user.id).role = UserRole.ADMIN
+    db.flush()
+    db.rollback()
+
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+
+def test_new_token_works_after_revocation(client, db, user, login):
+    headers = login(user.username, PASSWORD)
+    _update(db, user.id, role=UserRole.PHARMACIST)
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    headers = login(user.username, PASSWORD)
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["role"] == UserRole.PHARMACIST.value
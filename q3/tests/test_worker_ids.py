@@ -0,0 +1,63 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.ids import SnowflakeGenerator, format_order_number, format_tracking_number, lease_worker_id, renew_worker_id
+from app.models import WorkerIdLease
+
+
+@pytest.fixture
+def holders(db):
+    names = [f"test:{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    yield names
+    db.query(WorkerIdLease).filter(WorkerIdLease.holder.in_(names)).delete(synchronize_session=False)
+    db.commit()
+
+
+def test_two_leases_get_distinct_worker_ids(db, holders):
+    first = lease_worker_id(db, holders[0])
+    second = lease_worker_id(db, holders[1])
+
+    assert first is not None and second is not None
+    assert first != second
+    assert renew_worker_id(db, first, holders[0])
+    assert not renew_worker_id(db, first, holders[1])
+
+
+def test_lapsed_lease_is_taken_over_once(db, holders):
+    worker_id = lease_worker_id(db, holders[0])
+    db.query(WorkerIdLease).filter(WorkerIdLease.worker_id == worker_id).update(
+        {"expires_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert lease_worker_id(db, holders[1]) == worker_id
+    assert not renew_worker_id(db, worker_id, holders[0])
+    assert lease_worker_id(db, holders[2]) != worker_id
+
+
+def test_leased_workers_generate_unique_ids(db, holders):
+    generators = [SnowflakeGenerator(lease_worker_id(db, holder)) for holder in holders[:2]]
+    generated = [[] for _ in generators]
+
+    def generate(generator, into):
+        for _ in range(20000):
+            into.append(generator.next_id())
+
+    threads = [
+        threading.Thread(target=generate, args=(generator, into))
+        for generator, into in zip(generators, generated) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [snowflake_id for into in generated for snowflake_id in into]
+    assert len(set(ids)) == len(ids) == 80000
+    for generator, into in zip(generators, generated):
+        assert {generator.decompose(snowflake_id)[1] for snowflake_id in into} == {generator.worker_id}
+        assert len({format_order_number(snowflake_id, generator) for snowflake_id in into}) == len(into)
+        assert len({format_tracking_number(snowflake_id, generator) for snowflake_id in into}) == len(into)